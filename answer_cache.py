@@ -0,0 +1,128 @@
+"""Cache of AI answers to repeated questions, matched on their content words"""
+import re
+import time
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CONTRACTIONS = {"what's": "what is", "whats": "what is", "who's": "who is", "whos": "who is",
+                "where's": "where is", "wheres": "where is", "how's": "how is", "it's": "it is",
+                "what're": "what are", "how're": "how are"}
+FILLER_WORDS = {"please", "um", "uh", "hey", "ok", "okay"}
+# Ignored when matching questions: "what is the capital of france" asks "what capital of france"
+FUNCTION_WORDS = {"a", "an", "the", "is", "are", "was", "were", "be", "do", "does", "did"}
+
+def normalize_question(text: str) -> str:
+    """Lowercase, drop punctuation and filler words, expand common contractions"""
+    text = unicodedata.normalize("NFKC", text).lower().replace("’", "'")
+    words = re.sub(r"[^\w\s']", " ", text).split()
+    return " ".join(CONTRACTIONS.get(word, word) for word in words if word not in FILLER_WORDS)
+
+def content_words(normalized: str) -> tuple:
+    """The words of a normalized question that carry its meaning, in order"""
+    return tuple(word for word in normalized.split() if word not in FUNCTION_WORDS)
+
+REFERENCE_WORDS = re.compile(r"\b(it|its|he|she|him|her|his|they|them|their|that|this|those|these|there|then)\b")
+
+def refers_back(question: str) -> bool:
+    """True for follow-ups like 'how tall is it' whose answer depends on the conversation"""
+    return bool(REFERENCE_WORDS.search(normalize_question(question)))
+
+@dataclass
+class CachedAnswer:
+    question: str  # Normalized, as first asked
+    answer: str
+    sentences: List[str]  # As spoken, so every sentence hits the TTS cache again
+    expires: float
+    hits: int = 0
+
+class AnswerCache:
+    """Bounded LRU cache of answers keyed on the content words of the question
+
+    Questions match when they have the same content words in the same
+    order, so differences in filler words, punctuation, contractions and
+    articles are absorbed ("What's the capital of France?" is "what is
+    capital of france"), while a question about a different entity or
+    with its words swapped is not ("population of Chile" is not
+    "population of China", "5 miles to km" is not "5 km to miles").
+    Entries expire after their TTL. Questions matching a denylist pattern
+    (time, weather, news...) are never cached.
+    """
+
+    def __init__(self, capacity: int = 256, ttl: float = 86400, denylist: Iterable[str] = (),
+                 clock: Callable[[], float] = time.monotonic):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.denylist = [re.compile(pattern) for pattern in denylist]
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+        self._clock = clock
+        self._entries: "OrderedDict[str, CachedAnswer]" = OrderedDict()  # content key -> entry, LRU first
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(question: str) -> str:
+        return " ".join(content_words(normalize_question(question)))
+
+    def cacheable(self, question: str) -> bool:
+        normalized = normalize_question(question)
+        return bool(content_words(normalized)) and not any(p.search(normalized) for p in self.denylist)
+
+    def get(self, question: str) -> Optional[CachedAnswer]:
+        """Return the cached answer for question or a rephrasing of it"""
+        if not self.cacheable(question):
+            self.bypassed += 1
+            return None
+        key = self.key(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires <= self._clock():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            entry.hits += 1
+            return entry
+
+    def put(self, question: str, answer: str, sentences: Optional[List[str]] = None,
+            ttl: Optional[float] = None) -> None:
+        if not answer or not self.cacheable(question):
+            return
+        key = self.key(question)
+        entry = CachedAnswer(normalize_question(question), answer, list(sentences or [answer]),
+                             self._clock() + (self.ttl if ttl is None else ttl))
+        with self._lock:
+            self._entries.pop(key, None)
+            if len(self._entries) >= self.capacity:
+                self._evict()
+            self._entries[key] = entry
+
+    def _evict(self) -> None:
+        """Make room: expired entries first, otherwise the least recently used"""
+        now = self._clock()
+        expired = [key for key, entry in self._entries.items() if entry.expires <= now]
+        for key in expired or [next(iter(self._entries))]:
+            del self._entries[key]
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
@@ -0,0 +1,293 @@
+"""Shared microphone capture engine feeding a single-writer ring buffer"""
+import time
+import threading
+import logging
+import numpy as np
+import sounddevice as sd
+from multiprocessing import shared_memory
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class RingBuffer:
+    """Fixed-size int16 ring buffer with one writer and any number of readers
+
+    The writer (the audio callback) never takes a blocking lock: it copies the
+    block into place and then publishes it by advancing ``written``, the total
+    number of frames ever written. Readers keep their own absolute positions.
+    """
+
+    def __init__(self, capacity: int, channels: int, dtype: str = 'int16'):
+        self.capacity = capacity
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        self._data = np.zeros((capacity, channels), dtype=dtype)
+        self._written = 0
+        self.overruns = 0  # Reads that found their audio already overwritten, over all readers
+        self._cond = threading.Condition()
+        self._demand = threading.Event()  # Set whenever a reader waits for more audio
+
+    @property
+    def written(self) -> int:
+        return self._written
+
+    def write(self, block: np.ndarray) -> None:
+        """Append a block of frames, overwriting the oldest audio"""
+        count = len(block)
+        if count > self.capacity:
+            block = block[-self.capacity:]
+            self._written += count - self.capacity
+            count = self.capacity
+        start = self._written % self.capacity
+        first = min(count, self.capacity - start)
+        self._data[start:start + first] = block[:first]
+        if first < count:
+            self._data[:count - first] = block[first:]
+        self._written += count
+        # Wake readers without ever blocking the audio thread
+        if self._cond.acquire(blocking=False):
+            try:
+                self._cond.notify_all()
+            finally:
+                self._cond.release()
+
+    def read_into(self, position: int, out: np.ndarray) -> None:
+        """Copy frames starting at an absolute position into out"""
+        count = len(out)
+        start = position % self.capacity
+        first = min(count, self.capacity - start)
+        out[:first] = self._data[start:start + first]
+        if first < count:
+            out[first:] = self._data[:count - first]
+
+    def wait(self, timeout: float) -> None:
+        with self._cond:
+            self._demand.set()
+            self._cond.wait(timeout)
+
+    def wait_for_demand(self, timeout: float) -> bool:
+        """Block until a reader waits for more audio, for sources that run ahead of real time"""
+        if self._demand.wait(timeout):
+            self._demand.clear()
+            return True
+        return False
+
+    def notify(self) -> None:
+        """Wake waiting readers, taking the lock even if that blocks (never from the audio callback)"""
+        with self._cond:
+            self._cond.notify_all()
+
+    def reader(self, position: Optional[int] = None) -> "RingReader":
+        return RingReader(self, self.written if position is None else position)
+
+class SharedRingBuffer(RingBuffer):
+    """RingBuffer in a shared memory block, written in one process and read in others
+
+    The block holds the written counter followed by the audio, so readers in
+    any process see the same absolute positions. Readers in the writing
+    process are woken as usual; elsewhere they poll every RingReader wait.
+    Created without a name it owns (and on close unlinks) a new block,
+    otherwise it attaches to an existing one.
+    """
+
+    HEADER_BYTES = 64
+
+    def __init__(self, capacity: int, channels: int, dtype: str = 'int16', name: Optional[str] = None):
+        size = self.HEADER_BYTES + capacity * channels * np.dtype(dtype).itemsize
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        self.capacity = capacity
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        self._counter = np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf)
+        self._data = np.ndarray((capacity, channels), dtype=dtype, buffer=self.shm.buf,
+                                offset=self.HEADER_BYTES)
+        if self.owner:
+            self._counter[0] = 0
+        self.overruns = 0
+        self._cond = threading.Condition()
+        self._demand = threading.Event()
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def written(self) -> int:
+        return int(self._counter[0])
+
+    def write(self, block: np.ndarray) -> None:
+        """Append a block of frames; the counter is published after the audio"""
+        written = int(self._counter[0])
+        count = len(block)
+        if count > self.capacity:
+            block = block[-self.capacity:]
+            written += count - self.capacity
+            count = self.capacity
+        start = written % self.capacity
+        first = min(count, self.capacity - start)
+        self._data[start:start + first] = block[:first]
+        if first < count:
+            self._data[:count - first] = block[first:]
+        self._counter[0] = written + count
+        if self._cond.acquire(blocking=False):
+            try:
+                self._cond.notify_all()
+            finally:
+                self._cond.release()
+
+    def close(self) -> None:
+        self._counter = self._data = None  # The block cannot be closed while views exist
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+class RingReader:
+    """Independent cursor into a RingBuffer"""
+
+    def __init__(self, ring: RingBuffer, position: int):
+        self.ring = ring
+        self.position = max(position, ring.written - ring.capacity, 0)
+        self.overruns = 0
+
+    @property
+    def available(self) -> int:
+        return self.ring.written - self.position
+
+    def seek_to_latest(self) -> None:
+        self.position = self.ring.written
+
+    def read(self, frames: int, timeout: Optional[float] = None,
+             out: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        """Block until frames are available and return a copy of them
+
+        Returns None when timeout expires first. Audio that was overwritten
+        before it could be read is skipped and counted as an overrun. out,
+        a (frames, channels) array, is filled and returned instead of a new one.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        poll = 0.01
+        while self.available < frames:
+            if deadline is None:
+                self.ring.wait(poll)
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            self.ring.wait(min(poll, remaining))
+
+        oldest = self.ring.written - self.ring.capacity
+        if self.position < oldest:
+            self.overruns += 1
+            self.ring.overruns += 1
+            logger.warning(f"Capture reader overrun, skipped {oldest - self.position} frames")
+            self.position = oldest
+
+        if out is None:
+            out = np.empty((frames, self.ring.channels), dtype=self.ring.dtype)
+        self.ring.read_into(self.position, out)
+        self.position += frames
+        return out
+
+class SoundDeviceSource:
+    """Live input from a sounddevice InputStream
+
+    A capture source delivers (frames, channels) blocks to the engine's
+    callback from its own thread; virtual_audio.WavFileSource replays a file
+    through the same interface.
+    """
+
+    def __init__(self, device=None):
+        self.device = device
+        self._stream: Optional[sd.InputStream] = None
+
+    @property
+    def name(self) -> str:
+        try:
+            return sd.query_devices(self.device, kind='input')['name']
+        except Exception:
+            return 'default'
+
+    @property
+    def latency(self) -> float:
+        """Seconds from the microphone to the capture callback, as reported by the stream"""
+        return float(getattr(self._stream, "latency", 0.0) or 0.0)
+
+    def start(self, engine: "CaptureEngine", callback: Callable) -> None:
+        self._stream = sd.InputStream(
+            samplerate=engine.sample_rate,
+            channels=engine.channels,
+            dtype=engine.dtype,
+            blocksize=engine.frame_length,
+            device=self.device,
+            callback=callback
+        )
+        self._stream.start()
+
+    def stop(self) -> None:
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+class CaptureEngine:
+    """One long-lived input stream that writes small frames into a RingBuffer"""
+
+    def __init__(self, sample_rate: int, channels: int, frame_length: int,
+                 ring_seconds: float, dtype: str = 'int16', device=None, source=None,
+                 ring: Optional[RingBuffer] = None):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.frame_length = frame_length
+        self.dtype = dtype
+        self.device = device
+        self.source = source if source is not None else SoundDeviceSource(device)
+        self.ring = ring if ring is not None else RingBuffer(int(ring_seconds * sample_rate), channels, dtype)
+        self.overflows = 0  # Input xruns: audio the device dropped before the callback ran
+        self.underflows = 0
+        self._started = False
+
+    @property
+    def device_name(self) -> str:
+        """Name of the input device, used to key per-device settings"""
+        return self.source.name
+
+    @property
+    def latency(self) -> float:
+        """Input latency of the source; files have none"""
+        return getattr(self.source, "latency", 0.0)
+
+    def _callback(self, indata, frames, time_info, status) -> None:
+        """Real-time path: counts xruns and copies into the preallocated ring, nothing else"""
+        if status:
+            self.overflows += status.input_overflow
+            self.underflows += status.input_underflow
+        self.ring.write(indata)
+
+    def start(self) -> None:
+        if self._started:
+            return
+        self.source.start(self, self._callback)
+        self._started = True
+        logger.debug(f"Capture engine started on {self.device_name} ({self.frame_length} frames per block)")
+
+    def stop(self) -> None:
+        if self._started:
+            self.source.stop()
+            self._started = False
+
+    def __enter__(self) -> "CaptureEngine":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def stats(self) -> Dict[str, float]:
+        return {"overflows": self.overflows, "underflows": self.underflows,
+                "reader_overruns": self.ring.overruns}
+
+    def reader(self, preroll: float = 0.0, position: Optional[int] = None) -> RingReader:
+        """Reader starting preroll seconds before position (default: now)"""
+        start = self.ring.written if position is None else position
+        return self.ring.reader(start - int(preroll * self.sample_rate))
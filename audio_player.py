@@ -0,0 +1,299 @@
+"""Long-lived in-process audio output with pre-decoded clips"""
+import os
+import wave
+import logging
+import tempfile
+import threading
+import subprocess
+import numpy as np
+import sounddevice as sd
+from collections import deque
+from typing import Callable, Dict, Optional, Tuple
+
+try:
+    import miniaudio  # Optional: decodes MP3 in-process instead of via mpg321
+except ImportError:
+    miniaudio = None
+
+logger = logging.getLogger(__name__)
+
+def read_wav(path: str) -> Tuple[np.ndarray, int]:
+    """Read a 16-bit WAV file as float32 (frames, channels)"""
+    with wave.open(path, 'rb') as wf:
+        if wf.getsampwidth() != 2:
+            raise ValueError(f"Only 16-bit WAV files are supported: {path}")
+        data = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+        return data.reshape(-1, wf.getnchannels()).astype(np.float32) / 32768.0, wf.getframerate()
+
+def decode_audio(path: str) -> Tuple[np.ndarray, int]:
+    """Decode a WAV or MP3 file to float32 (frames, channels) and its sample rate"""
+    if path.lower().endswith('.wav'):
+        return read_wav(path)
+    if miniaudio is not None:
+        decoded = miniaudio.decode_file(path, output_format=miniaudio.SampleFormat.SIGNED16)
+        data = np.frombuffer(decoded.samples, dtype=np.int16).reshape(-1, decoded.nchannels)
+        return data.astype(np.float32) / 32768.0, decoded.sample_rate
+    # Fall back to a one-off mpg321 decode to WAV; playback itself stays in-process
+    fd, wav_path = tempfile.mkstemp(suffix='.wav')
+    os.close(fd)
+    try:
+        subprocess.run(["mpg321", "-q", "-w", wav_path, path],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        return read_wav(wav_path)
+    finally:
+        os.unlink(wav_path)
+
+def convert(data: np.ndarray, rate: int, target_rate: int, target_channels: int) -> np.ndarray:
+    """Resample (linear) and channel-map audio to the player's output format"""
+    if rate != target_rate and len(data):
+        length = int(round(len(data) * target_rate / rate))
+        positions = np.linspace(0, len(data) - 1, length)
+        data = np.stack([np.interp(positions, np.arange(len(data)), data[:, c])
+                         for c in range(data.shape[1])], axis=1)
+    if data.shape[1] == 1 and target_channels > 1:
+        data = np.repeat(data, target_channels, axis=1)
+    elif data.shape[1] > target_channels:
+        data = data[:, :target_channels]
+    return np.ascontiguousarray(data, dtype=np.float32)
+
+class MixScratch:
+    """Buffers preallocated for the output callback, so mixing never allocates arrays"""
+
+    def __init__(self, frames: int, channels: int):
+        self.samples = np.zeros((frames, channels), dtype=np.float32)
+        self.ramp = np.zeros(frames, dtype=np.float32)
+        self.steps = np.arange(1, frames + 1, dtype=np.float32)
+
+class Voice:
+    """One sound being played by the AudioPlayer"""
+
+    def __init__(self, clip: Optional[np.ndarray], sample_rate: int,
+                 loop: bool = False, gain: float = 1.0, fade_in: float = 0.0):
+        self.clip = clip
+        self.sample_rate = sample_rate
+        self.loop = loop
+        self.position = 0
+        self.gain = 0.0 if fade_in else gain
+        self.target_gain = gain
+        self.fade_step = gain / (fade_in * sample_rate) if fade_in else 0.0
+        self.finished = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.finished.is_set()
+
+    def fade_to(self, gain: float, duration: float) -> None:
+        self.target_gain = gain
+        samples = max(duration * self.sample_rate, 1)
+        self.fade_step = abs(gain - self.gain) / samples
+
+    def stop(self, fade_out: float = 0.0) -> None:
+        if fade_out:
+            self.fade_to(0.0, fade_out)
+        else:
+            self.finished.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self.finished.wait(timeout)
+
+    def _next_clip(self) -> bool:
+        """Called when the current clip ran out; returns False when the voice is done"""
+        if self.loop and self.clip is not None and len(self.clip):
+            self.position = 0
+            return True
+        return False
+
+    def _gain_ramp(self, ramp: np.ndarray, steps: np.ndarray) -> bool:
+        """Fill ramp with per-sample gains while fading; False when the gain is constant"""
+        if self.fade_step == 0 or self.gain == self.target_gain:
+            return False
+        direction = 1.0 if self.target_gain > self.gain else -1.0
+        np.multiply(steps[:len(ramp)], direction * self.fade_step, out=ramp)
+        ramp += self.gain
+        if direction > 0:
+            np.minimum(ramp, self.target_gain, out=ramp)
+        else:
+            np.maximum(ramp, self.target_gain, out=ramp)
+        self.gain = float(ramp[-1])
+        return True
+
+    def mix_into(self, out: np.ndarray, scratch: MixScratch) -> None:
+        """Add this voice's next len(out) frames to out (runs in the output callback)"""
+        written = 0
+        frames = len(out)
+        while written < frames and not self.done:
+            if self.clip is None or self.position >= len(self.clip):
+                if not self._next_clip():
+                    # Idle and silent: stopped while waiting for a clip, or nothing more to play
+                    if not self._keep_alive() or self.target_gain <= 0.0:
+                        self.finished.set()
+                    return
+                continue
+            count = min(frames - written, len(self.clip) - self.position)
+            chunk = self.clip[self.position:self.position + count]
+            work = scratch.samples[:count]
+            ramp = scratch.ramp[:count]
+            if self._gain_ramp(ramp, scratch.steps):
+                np.multiply(chunk, ramp[:, None], out=work)
+            else:
+                np.multiply(chunk, self.gain, out=work)
+            out[written:written + count] += work
+            self.position += count
+            written += count
+            if self.gain <= 0.0 and self.target_gain <= 0.0:
+                self.finished.set()
+
+    def _keep_alive(self) -> bool:
+        return False
+
+class ClipQueue(Voice):
+    """Plays clips back-to-back without gaps as they are appended
+
+    Stays alive (silent) while empty until close() is called, so clips that
+    are still being synthesized start in the first block after they arrive.
+    """
+
+    def __init__(self, sample_rate: int, gain: float = 1.0):
+        super().__init__(None, sample_rate, gain=gain)
+        self._clips: deque = deque()
+        self._closed = False
+
+    def append(self, clip: np.ndarray) -> None:
+        self._clips.append(clip)
+
+    def close(self) -> None:
+        self._closed = True
+
+    def stop(self, fade_out: float = 0.0) -> None:
+        self.close()  # Nothing appended after a stop is played
+        super().stop(fade_out)
+
+    def _next_clip(self) -> bool:
+        if self._clips:
+            self.clip = self._clips.popleft()
+            self.position = 0
+            return True
+        self.clip = None
+        return False
+
+    def _keep_alive(self) -> bool:
+        return not self._closed
+
+class AudioPlayer:
+    """One output stream that mixes any number of pre-decoded voices
+
+    Decoding happens once per file (see load), and the stream stays open, so
+    starting a sound only costs the next audio block (blocksize / sample_rate).
+    """
+
+    def __init__(self, sample_rate: int = 48000, channels: int = 2,
+                 blocksize: int = 256, device=None):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.blocksize = blocksize
+        self.device = device
+        self.underflows = 0  # Output xruns: the callback did not deliver in time
+        self.overflows = 0
+        self.volume = 1.0  # Master gain, applied after mixing
+        self.muted = False
+        self.tap: Optional[Callable[[np.ndarray], None]] = None  # Sees every output block (echo reference)
+        self._clips: Dict[str, np.ndarray] = {}
+        self._voices: Tuple[Voice, ...] = ()
+        self._scratch = MixScratch(blocksize or 4096, channels)
+        self._lock = threading.Lock()
+        self._stream: Optional[sd.OutputStream] = None
+
+    def start(self) -> None:
+        if self._stream is not None:
+            return
+        self._stream = sd.OutputStream(
+            samplerate=self.sample_rate,
+            channels=self.channels,
+            dtype='float32',
+            blocksize=self.blocksize,
+            latency='low',
+            device=self.device,
+            callback=self._callback
+        )
+        self._stream.start()
+        logger.debug(f"Audio player started ({self.blocksize / self.sample_rate * 1000:.1f} ms blocks)")
+
+    def stop(self) -> None:
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+    @property
+    def latency(self) -> float:
+        """Seconds from the output callback to the speaker, as reported by the stream"""
+        return float(getattr(self._stream, "latency", 0.0) or 0.0)
+
+    def _callback(self, outdata, frames, time_info, status) -> None:
+        """Real-time path: no locks, logging, I/O or array allocation
+
+        Finished voices are skipped here and pruned by the next _add().
+        """
+        if status:
+            self.underflows += status.output_underflow
+            self.overflows += status.output_overflow
+        scratch = self._scratch
+        if frames > len(scratch.ramp):
+            scratch = self._scratch = MixScratch(frames, self.channels)  # Only if the host changes block size
+        outdata.fill(0)
+        for voice in self._voices:  # Swapped atomically by other threads, never mutated
+            voice.mix_into(outdata, scratch)
+        if self.muted:
+            outdata.fill(0)
+        elif self.volume != 1.0:
+            outdata *= self.volume
+        np.clip(outdata, -1.0, 1.0, out=outdata)
+        if self.tap is not None:
+            self.tap(outdata)
+
+    def _add(self, voice: Voice) -> Voice:
+        with self._lock:
+            self._voices = tuple(v for v in self._voices if not v.done) + (voice,)
+        return voice
+
+    def stats(self) -> Dict[str, float]:
+        return {"underflows": self.underflows, "overflows": self.overflows,
+                "voices": sum(not voice.done for voice in self._voices)}
+
+    def prepare(self, data: np.ndarray, rate: int) -> np.ndarray:
+        """Convert decoded float or int16 PCM to the output format"""
+        if data.dtype == np.int16:
+            data = data.astype(np.float32) / 32768.0
+        if data.ndim == 1:
+            data = data[:, None]
+        return convert(data, rate, self.sample_rate, self.channels)
+
+    def load(self, path: str, cache: bool = True) -> np.ndarray:
+        """Decode a file to output-format PCM, keeping it in memory if cache is set"""
+        clip = self._clips.get(path)
+        if clip is None:
+            clip = self.prepare(*decode_audio(path))
+            if cache:
+                self._clips[path] = clip
+        return clip
+
+    def play(self, clip: np.ndarray, loop: bool = False, gain: float = 1.0,
+             fade_in: float = 0.0) -> Voice:
+        return self._add(Voice(clip, self.sample_rate, loop=loop, gain=gain, fade_in=fade_in))
+
+    def loop(self, clip: np.ndarray, gain: float = 1.0, fade_in: float = 0.0) -> Voice:
+        return self.play(clip, loop=True, gain=gain, fade_in=fade_in)
+
+    def queue(self, gain: float = 1.0) -> ClipQueue:
+        """Start a gapless queue that clips can be appended to as they are produced"""
+        return self._add(ClipQueue(self.sample_rate, gain=gain))
+
+    def crossfade(self, current: Optional[Voice], clip: np.ndarray, duration: float = 0.05) -> Voice:
+        """Fade current out while clip fades in over duration seconds"""
+        if current is not None:
+            current.stop(fade_out=duration)
+        return self.play(clip, fade_in=duration)
+
+    def stop_all(self, fade_out: float = 0.0) -> None:
+        for voice in self._voices:
+            voice.stop(fade_out)
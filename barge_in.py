@@ -0,0 +1,188 @@
+"""Barge-in: wake word detection while a reply plays, with echo suppression"""
+import logging
+import threading
+import numpy as np
+from typing import Callable, Optional
+from audio_capture import CaptureEngine, RingBuffer
+
+logger = logging.getLogger(__name__)
+
+EPSILON = 1e-10
+
+class ReferenceTap:
+    """Keeps the last second or so of the player's mixed output as mono float32
+
+    Installed as AudioPlayer.tap, so write() runs in the output callback; it
+    only averages the channels into a scratch block and copies that into a
+    preallocated ring. The ring's positions count output frames, so the
+    reference for a microphone frame is found by how long ago it was
+    captured (see around).
+    """
+
+    def __init__(self, sample_rate: int, seconds: float = 1.0, max_block: int = 4096):
+        self.sample_rate = sample_rate
+        self.ring = RingBuffer(int(sample_rate * seconds), 1, 'float32')
+        self._mono = np.zeros((max_block, 1), dtype=np.float32)
+
+    def write(self, outdata: np.ndarray) -> None:
+        frames, channels = outdata.shape
+        if frames > len(self._mono):
+            self._mono = np.zeros((frames, 1), dtype=np.float32)
+        mono = self._mono[:frames]
+        np.sum(outdata, axis=1, keepdims=True, out=mono)
+        mono *= 1.0 / channels
+        self.ring.write(mono)
+
+    def around(self, age: float, samples: int, target_rate: int) -> np.ndarray:
+        """Output centred on what was written age seconds ago, resampled to target_rate
+
+        Returns samples values. A window reaching past the newest output is
+        moved back to end there; output already overwritten reads as silence.
+        """
+        count = min(int(round(samples * self.sample_rate / target_rate)), self.ring.capacity)
+        out = np.zeros((count, 1), dtype=np.float32)
+        written = self.ring.written
+        end = min(written - int(age * self.sample_rate) + count // 2, written)
+        start = end - count
+        if start >= max(written - self.ring.capacity, 0):
+            self.ring.read_into(start, out)
+        out = out[:, 0]
+        factor = self.sample_rate // target_rate
+        if factor * target_rate == self.sample_rate and factor > 1:
+            return out[:len(out) // factor * factor].reshape(-1, factor).mean(axis=1)
+        positions = np.linspace(0, len(out) - 1, samples)
+        return np.interp(positions, np.arange(len(out)), out).astype(np.float32)
+
+class EchoSuppressor:
+    """Spectral echo suppression against the known loudspeaker signal
+
+    For each microphone frame the reference spectrum is the per-bin maximum
+    over a window of output around the same moment, which tolerates the
+    block-sized jitter of that alignment and some error in the delay. A
+    per-bin coupling estimate tracks how much of the reference reaches the
+    microphone: it follows the |mic| / |ref| ratio down quickly and up
+    slowly, so speech over the reply does not inflate it.
+    The estimated echo is subtracted from the magnitude, keeping the phase.
+    """
+
+    def __init__(self, frame_length: int, over_subtraction: float = 1.5,
+                 floor: float = 0.05, reference_threshold: float = 1e-4):
+        self.frame_length = frame_length
+        self.over_subtraction = over_subtraction
+        self.floor = floor
+        self.reference_threshold = reference_threshold
+        self.coupling = np.ones(frame_length // 2 + 1, dtype=np.float32)
+
+    def _reference_spectrum(self, reference: np.ndarray) -> np.ndarray:
+        hop = self.frame_length // 2
+        count = max((len(reference) - self.frame_length) // hop + 1, 1)
+        if len(reference) < self.frame_length:
+            reference = np.pad(reference, (0, self.frame_length - len(reference)))
+        index = np.arange(self.frame_length)[None, :] + hop * np.arange(count)[:, None]
+        return np.abs(np.fft.rfft(reference[index], axis=1)).max(axis=0)
+
+    def process(self, mic: np.ndarray, reference: np.ndarray) -> np.ndarray:
+        """Suppress echo in one int16 mono frame; reference is float32 at the mic rate"""
+        if not len(reference) or np.mean(reference ** 2) < self.reference_threshold ** 2:
+            return mic  # Nothing is playing
+        spectrum = np.fft.rfft(mic.astype(np.float32) / 32768.0)
+        magnitude = np.abs(spectrum) + EPSILON
+        ref = self._reference_spectrum(reference) + EPSILON
+        ratio = magnitude / ref
+        self.coupling = np.where(ratio < self.coupling,
+                                 0.7 * self.coupling + 0.3 * ratio,
+                                 0.995 * self.coupling + 0.005 * ratio).astype(np.float32)
+        gain = np.maximum(1.0 - self.over_subtraction * self.coupling * ref / magnitude, self.floor)
+        cleaned = np.fft.irfft(spectrum * gain, n=len(mic)) * 32768.0
+        return np.clip(cleaned, -32768, 32767).astype(np.int16)
+
+class BargeInMonitor:
+    """Runs the wake word detector on live capture while a reply is being spoken
+
+    start(on_detect) begins listening from the current capture position;
+    a detection stops every playing voice at once (within one output block),
+    calls on_detect (e.g. TurnPipeline.cancel) and stores the capture
+    position, which take() hands to the next turn in place of a fresh wake.
+
+    The echo reference for a microphone frame is the output that was
+    playing when it was captured: its age in the capture ring plus
+    echo_delay_ms, the time from the player's callback to the speaker and
+    from the microphone to the capture callback. None uses the latencies
+    the two streams report.
+    """
+
+    def __init__(self, porcupine, engine: CaptureEngine, player=None,
+                 echo_window_ms: float = 120, suppress_echo: bool = True,
+                 echo_delay_ms: Optional[float] = None):
+        self.porcupine = porcupine
+        self.engine = engine
+        self.player = player
+        self.echo_window = int(engine.sample_rate * echo_window_ms / 1000)
+        self.echo_delay_ms = echo_delay_ms
+        self.tap: Optional[ReferenceTap] = None
+        self.suppressor: Optional[EchoSuppressor] = None
+        if player is not None and suppress_echo:
+            self.tap = ReferenceTap(player.sample_rate)
+            self.suppressor = EchoSuppressor(porcupine.frame_length)
+            player.tap = self.tap.write
+        self.detections = 0
+        self._echo_delay = 0.0
+        self._position: Optional[int] = None
+        self._on_detect: Optional[Callable[[], None]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, on_detect: Optional[Callable[[], None]] = None) -> None:
+        if self._thread is not None:
+            return
+        self._on_detect = on_detect
+        self._stop.clear()
+        if self.echo_delay_ms is not None:
+            self._echo_delay = self.echo_delay_ms / 1000
+        elif self.player is not None:
+            self._echo_delay = self.player.latency + getattr(self.engine, "latency", 0.0)
+        self._thread = threading.Thread(target=self._run, args=(self.engine.reader(),),
+                                        name="barge-in", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            if thread is not threading.current_thread():
+                thread.join(timeout=1.0)
+
+    @property
+    def interrupted(self) -> bool:
+        return self._position is not None
+
+    def take(self) -> Optional[int]:
+        """Capture position of a barge-in since the last call, or None"""
+        position, self._position = self._position, None
+        return position
+
+    def _run(self, reader) -> None:
+        frame_length = self.porcupine.frame_length
+        rate = self.engine.sample_rate
+        while not self._stop.is_set():
+            frame = reader.read(frame_length, timeout=0.1)
+            if frame is None:
+                continue
+            mono = frame[:, 0]
+            if self.suppressor is not None:
+                # How long ago the middle of this frame reached the microphone, by the capture ring
+                age = (self.engine.ring.written - reader.position + frame_length / 2) / rate
+                reference = self.tap.around(age + self._echo_delay, self.echo_window, rate)
+                mono = self.suppressor.process(mono, reference)
+            if self.porcupine.process(mono) >= 0:
+                self._detected(reader.position)
+                return
+
+    def _detected(self, position: int) -> None:
+        logger.info("Wake word during playback, interrupting")
+        self.detections += 1
+        self._position = position
+        if self.player is not None:
+            self.player.stop_all(fade_out=0.005)
+        if self._on_detect:
+            self._on_detect()
@@ -0,0 +1,162 @@
+"""Batch measurement of the capture path on recorded sessions
+
+Replays WAV captures (recorded with voxMate.py --record-session) through the
+real capture engine, wake listener and VAD endpointer, by default as fast as
+they can be processed, and reports per file and in total:
+
+  - wakes per audio hour; with labels, false wakes per hour and missed wakes
+  - endpoint latency: capture time from the labelled end of speech to the endpoint
+  - CPU seconds per audio hour, of the whole process and of the listening thread
+
+    python3 benchmarks/replay_sessions.py sessions/*.wav
+    python3 benchmarks/replay_sessions.py session.wav --labels session.json --speed 1
+
+Labels are a JSON list of {"wake": seconds, "speech_end": seconds}: when each
+wake word ends, and (optionally) when the request after it ends. Every wake
+more than --tolerance seconds from a labelled one is a false wake.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import numpy as np
+from dotenv import load_dotenv
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # voxMate paths are relative to the repository root
+
+import voxMate
+from vad import VoiceActivityDetector
+from virtual_audio import WavFileSource
+from wake import WakeProfiler
+
+def replay(path: str, access_key: str, speed: float) -> Dict:
+    """Listen to one file like the main loop does: wake word, then record to the endpoint"""
+    source = WavFileSource(path, speed)
+    wakes: List[float] = []
+    endpoints: List[float] = []
+    start_wall, start_cpu, start_thread = time.perf_counter(), time.process_time(), time.thread_time()
+
+    with voxMate.audio_wake_stream(access_key, source=source) as (porcupine, engine):
+        rate = engine.sample_rate
+        vad = VoiceActivityDetector(sample_rate=rate, frame_ms=voxMate.VAD_FRAME_MS,
+                                    margin_db=voxMate.VAD_MARGIN_DB)
+        ambient = engine.reader(position=0).read(int(voxMate.VAD_CALIBRATION_SECONDS * rate), timeout=5.0)
+        if ambient is not None:
+            vad.calibrate(ambient)
+        listener = voxMate.create_wake_listener(porcupine, engine)
+        listener.profiler = WakeProfiler(window=0)  # Totals are rolled up every 32 frames
+        recording = voxMate.PCMBuffer()
+        reader = engine.reader(position=0)
+        while True:
+            position = listener.listen(reader, stop=source.finished, timeout=0.5)
+            if position is None:
+                break
+            wakes.append(position / rate)
+            reader = engine.reader(position=position)
+            try:
+                voxMate.AudioProcessor.record_audio(reader, vad, recording)
+            except RuntimeError:
+                break  # The file ended mid-request
+            endpoints.append(reader.position / rate)
+        wake = listener.profiler.stats()
+        skip_ratio = 1 - wake["processed_total"] / wake["frames_total"] if wake["frames_total"] else 0.0
+
+    return {"file": path, "audio_seconds": source.position / rate, "wakes": wakes, "endpoints": endpoints,
+            "wall_seconds": time.perf_counter() - start_wall,
+            "cpu_seconds": time.process_time() - start_cpu,
+            "listen_cpu_seconds": time.thread_time() - start_thread,
+            "wake_skip_ratio": round(skip_ratio, 3)}
+
+def score(result: Dict, labels: Optional[List[Dict]], tolerance: float) -> Dict:
+    """Match wakes with labels and work out the per-hour rates and endpoint latencies"""
+    hours = result["audio_seconds"] / 3600
+    summary = {"file": result["file"], "audio_hours": round(hours, 3),
+               "speed": round(result["audio_seconds"] / result["wall_seconds"], 1),
+               "wakes": len(result["wakes"]),
+               "wakes_per_hour": round(len(result["wakes"]) / hours, 2) if hours else None,
+               "cpu_per_audio_hour": round(result["cpu_seconds"] / hours, 1) if hours else None,
+               "listen_cpu_per_audio_hour": round(result["listen_cpu_seconds"] / hours, 1) if hours else None,
+               "wake_skip_ratio": result["wake_skip_ratio"]}
+    if labels is None:
+        return summary
+
+    unmatched = list(labels)
+    false_wakes = 0
+    latencies = []
+    for wake, endpoint in zip(result["wakes"], result["endpoints"] + [None] * len(result["wakes"])):
+        label = min(unmatched, key=lambda l: abs(l["wake"] - wake), default=None)
+        if label is None or abs(label["wake"] - wake) > tolerance:
+            false_wakes += 1
+            continue
+        unmatched.remove(label)
+        if endpoint is not None and label.get("speech_end") is not None:
+            latencies.append(endpoint - label["speech_end"])
+    summary.update(false_wakes=false_wakes, missed_wakes=len(unmatched),
+                   false_wakes_per_hour=round(false_wakes / hours, 2) if hours else None,
+                   endpoint_latencies=latencies)
+    return summary
+
+def print_report(summaries: List[Dict]) -> None:
+    print(f"\n{'file':<32}{'hours':>7}{'speed':>7}{'wakes/h':>9}{'false/h':>9}{'missed':>8}"
+          f"{'cpu s/h':>9}{'gated':>7}")
+    for s in summaries:
+        print(f"{os.path.basename(s['file'])[:31]:<32}{s['audio_hours']:>7}{s['speed']:>6}x"
+              f"{s['wakes_per_hour'] or 0:>9}{s.get('false_wakes_per_hour', '-'):>9}"
+              f"{s.get('missed_wakes', '-'):>8}{s['cpu_per_audio_hour'] or 0:>9}"
+              f"{s['wake_skip_ratio'] * 100:>6.0f}%")
+    hours = sum(s["audio_hours"] for s in summaries)
+    if not hours:
+        return
+    cpu = sum(s["cpu_per_audio_hour"] * s["audio_hours"] for s in summaries) / hours
+    listen = sum(s["listen_cpu_per_audio_hour"] * s["audio_hours"] for s in summaries) / hours
+    print(f"\nTotal: {hours:.2f} audio hours, {sum(s['wakes'] for s in summaries) / hours:.2f} wakes/h, "
+          f"{cpu:.1f} CPU s per audio hour ({listen:.1f} s in the listening thread)")
+    if any("false_wakes" in s for s in summaries):
+        print(f"False wakes: {sum(s.get('false_wakes', 0) for s in summaries) / hours:.2f}/h, "
+              f"missed: {sum(s.get('missed_wakes', 0) for s in summaries)}")
+    latencies = [l for s in summaries for l in s.get("endpoint_latencies", [])]
+    if latencies:
+        p50, p95 = np.percentile(latencies, [50, 95])
+        print(f"Endpoint latency: p50 {p50:.3f}s, p95 {p95:.3f}s over {len(latencies)} requests")
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Replay recorded sessions through the wake word and endpointer")
+    parser.add_argument("sessions", nargs="+", help="WAV files at the capture sample rate")
+    parser.add_argument("--labels", nargs="*", default=[],
+                        help="label files in session order, by default <session>.json next to each session")
+    parser.add_argument("--speed", type=float, default=0.0, help="1 = real time, 0 = as fast as processed")
+    parser.add_argument("--tolerance", type=float, default=1.0, help="seconds a wake may be from its label")
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    load_dotenv(voxMate.ENV_PATH)
+    access_key = os.getenv("PORCUPINE_API_KEY")
+    if not access_key:
+        print("PORCUPINE_API_KEY is not set")
+        return 1
+
+    summaries = []
+    for i, path in enumerate(args.sessions):
+        label_path = args.labels[i] if i < len(args.labels) else os.path.splitext(path)[0] + ".json"
+        labels = None
+        if os.path.exists(label_path):
+            with open(label_path) as f:
+                labels = json.load(f)
+        summaries.append(score(replay(path, access_key, args.speed), labels, args.tolerance))
+
+    print_report(summaries)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summaries, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
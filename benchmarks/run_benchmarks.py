@@ -0,0 +1,238 @@
+"""End-to-end offline benchmark of the voxMate turn stages
+
+Replays WAV fixtures through the real AIService code against the local stub
+API (benchmarks/stub_server.py) and a stub TTS engine, then reports latency
+distributions per stage and turn throughput. Baselines are stored in
+benchmarks/baselines.json; a run that is slower than the baseline by more
+than the tolerance exits non-zero.
+
+    python3 benchmarks/run_benchmarks.py                   # compare with baseline
+    python3 benchmarks/run_benchmarks.py --save-baseline   # record a new baseline
+"""
+import os
+import sys
+import json
+import time
+import wave
+import argparse
+import tempfile
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT)  # voxMate paths are relative to the repository root
+
+import voxMate
+from metrics import LatencyHistogram
+from stub_server import StubConfig, StubServer
+from tts_backends import GTTSBackend
+from tts_cache import TTSCache
+
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baselines.json')
+DEFAULT_FIXTURES = [os.path.join('audio', 'recording.wav')]
+TTS_FIXTURE = os.path.join('audio', 'py_test.mp3')
+
+class StubTTSBackend(GTTSBackend):
+    """Returns a fixture MP3 after a fixed delay instead of calling Google"""
+    name = "stub-tts"
+
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+        with open(TTS_FIXTURE, 'rb') as f:
+            self._audio = f.read()
+
+    def synthesize(self, text: str) -> bytes:
+        time.sleep(self.latency)
+        return self._audio
+
+class ColdTTSCache(TTSCache):
+    """Never hits, so every turn pays for synthesis like a fresh reply would"""
+
+    def get(self, key: str):
+        with self._lock:
+            self.misses += 1
+        return None
+
+def load_fixture(path: str) -> "voxMate.PCMBuffer":
+    with wave.open(path, 'rb') as wf:
+        data = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+        data = data.reshape(-1, wf.getnchannels())
+        buffer = voxMate.PCMBuffer(max_seconds=len(data) / wf.getframerate() + 1,
+                                   channels=wf.getnchannels(), sample_rate=wf.getframerate())
+    buffer.append(data)
+    return buffer
+
+def make_service(base_url: str, tts_latency: float, cache_dir: str, cache: bool,
+                 upload_format: str = voxMate.UPLOAD_FORMAT, rooms: int = 1) -> "voxMate.AIService":
+    os.environ["API_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    os.environ.setdefault("PORCUPINE_API_KEY", "stub")
+    voxMate.STT_BACKEND = "whisper"
+    voxMate.TTS_BACKEND = "gtts"
+    voxMate.TTS_LOCAL_FALLBACK = False
+    voxMate.TTS_CACHE_DIR = cache_dir
+    voxMate.UPLOAD_FORMAT = upload_format
+    service = voxMate.AIService(rooms=rooms)
+    service.gtts = StubTTSBackend(tts_latency)
+    if not cache:
+        service.tts_cache = ColdTTSCache(cache_dir, voxMate.TTS_CACHE_MAX_MB * 1024 * 1024)
+        service.answers = None
+    return service
+
+class Recorder:
+    """Thread-safe collection of per-stage histograms"""
+
+    def __init__(self):
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.uploads: List[tuple] = []  # (bytes sent, raw WAV bytes)
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.histograms.setdefault(stage, LatencyHistogram(window=100000)).observe(seconds)
+
+    def upload(self, sent: int, raw: int) -> None:
+        with self._lock:
+            self.uploads.append((sent, raw))
+
+def run_turn(service, buffer, recorder: Recorder) -> None:
+    """One turn: STT, streamed LLM and TTS of the first sentence, as the pipeline does"""
+    start = time.perf_counter()
+    transcript = service.stt.transcribe(buffer)
+    stt_done = time.perf_counter()
+    recorder.observe("stt", stt_done - start)
+    upload = service.stt.last_upload
+    if upload:
+        recorder.upload(upload.size, upload.raw_bytes)
+
+    first_token = None
+    first_audio = None
+
+    def on_token():
+        nonlocal first_token
+        if first_token is None:
+            first_token = time.perf_counter()
+
+    for sentence in service.generate_response_stream(transcript, on_token=on_token):
+        if first_audio is None:
+            sentence_ready = time.perf_counter()
+            recorder.observe("llm_first_sentence", sentence_ready - stt_done)
+            service._synthesize(sentence)
+            first_audio = time.perf_counter()
+            recorder.observe("tts_first_clip", first_audio - sentence_ready)
+    end = time.perf_counter()
+    if first_token is not None:
+        recorder.observe("llm_first_token", first_token - stt_done)
+    recorder.observe("llm_stream_total", end - stt_done)
+    if first_audio is not None:
+        recorder.observe("turn_to_first_audio", first_audio - start)
+    recorder.observe("turn", end - start)
+
+def benchmark(args) -> Dict[str, dict]:
+    config = StubConfig(stt_latency=args.stt_latency, chat_latency=args.chat_latency,
+                        token_interval=args.token_interval, jitter=args.jitter, seed=args.seed)
+    fixtures = [load_fixture(path) for path in args.fixtures]
+    recorder = Recorder()
+
+    with StubServer(config) as server, tempfile.TemporaryDirectory() as cache_dir:
+        service = make_service(server.base_url, args.tts_latency, cache_dir, args.cache,
+                               args.upload_format, rooms=args.concurrency)
+        # Warm up: connection setup and lazy imports should not count
+        run_turn(service, fixtures[0], Recorder())
+
+        # Each concurrent worker is a separate room sharing the service, as with --rooms
+        rooms = iter([service.for_room(voxMate.AudioProcessor) for _ in range(args.concurrency)])
+        worker = threading.local()
+
+        def room_turn(buffer) -> None:
+            if not hasattr(worker, "service"):
+                worker.service = next(rooms)
+            run_turn(worker.service, buffer, recorder)
+
+        turns = [fixtures[i % len(fixtures)] for i in range(args.iterations)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            list(executor.map(room_turn, turns))
+        elapsed = time.perf_counter() - start
+
+    results = {stage: h.summary() for stage, h in sorted(recorder.histograms.items())}
+    results["throughput"] = {"turns_per_second": round(args.iterations / elapsed, 3),
+                             "concurrency": args.concurrency}
+    if recorder.uploads:
+        sent, raw = np.mean(recorder.uploads, axis=0)
+        results["upload"] = {"bytes_sent": int(sent), "raw_bytes": int(raw)}
+    return results
+
+def print_report(results: Dict[str, dict]) -> None:
+    print(f"\n{'stage':<22}{'p50':>9}{'p95':>9}{'p99':>9}{'count':>8}")
+    for stage, summary in results.items():
+        if "p50" not in summary:
+            continue
+        print(f"{stage:<22}{summary['p50']:>9.3f}{summary['p95']:>9.3f}"
+              f"{summary['p99']:>9.3f}{summary['count']:>8}")
+    throughput = results["throughput"]
+    print(f"\nThroughput: {throughput['turns_per_second']} turns/s "
+          f"at concurrency {throughput['concurrency']}")
+    if "upload" in results:
+        upload = results["upload"]
+        print(f"Upload: {upload['bytes_sent'] / 1024:.1f} KB per turn "
+              f"(raw WAV {upload['raw_bytes'] / 1024:.1f} KB)")
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """Stages whose p50 or p95 regressed by more than tolerance"""
+    regressions = []
+    for stage, summary in results.items():
+        reference = baseline.get(stage)
+        if "p50" not in summary or not reference:
+            continue
+        for key in ("p50", "p95"):
+            if summary[key] > reference[key] * (1 + tolerance):
+                regressions.append(f"{stage} {key}: {summary[key]:.3f}s vs baseline {reference[key]:.3f}s")
+    if "throughput" in baseline:
+        current = results["throughput"]["turns_per_second"]
+        reference = baseline["throughput"]["turns_per_second"]
+        if current < reference * (1 - tolerance):
+            regressions.append(f"throughput: {current} vs baseline {reference} turns/s")
+    return regressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline voxMate turn benchmark")
+    parser.add_argument("fixtures", nargs="*", default=DEFAULT_FIXTURES, help="WAV files to replay")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--stt-latency", type=float, default=StubConfig.stt_latency)
+    parser.add_argument("--chat-latency", type=float, default=StubConfig.chat_latency)
+    parser.add_argument("--token-interval", type=float, default=StubConfig.token_interval)
+    parser.add_argument("--tts-latency", type=float, default=0.2)
+    parser.add_argument("--upload-format", default=voxMate.UPLOAD_FORMAT, choices=["flac", "opus", "wav"])
+    parser.add_argument("--jitter", type=float, default=StubConfig.jitter)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--cache", action="store_true", help="let the answer and TTS caches serve repeated questions")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    results = benchmark(args)
+    print_report(results)
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline saved to {BASELINE_PATH}")
+        return 0
+    if not os.path.exists(BASELINE_PATH):
+        print("\nNo baseline yet, run with --save-baseline")
+        return 0
+    with open(BASELINE_PATH) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""Local OpenAI-compatible stub for the transcription and chat endpoints
+
+Serves POST .../audio/transcriptions and POST .../chat/completions (streaming
+and non-streaming) with configurable latency and jitter, so the real
+AIService code can be benchmarked without network access.
+
+Run standalone: python3 benchmarks/stub_server.py --port 8765
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+DEFAULT_TRANSCRIPT = "What is the tallest mountain in the world?"
+DEFAULT_REPLY = ("Mount Everest is the tallest mountain in the world. "
+                 "It stands at about eight thousand eight hundred and forty nine metres. "
+                 "It sits on the border between Nepal and China.")
+
+@dataclass
+class StubConfig:
+    stt_latency: float = 0.25  # Seconds before a transcription response
+    stt_per_mb: float = 0.5  # Extra seconds per MB uploaded, models a slow uplink
+    chat_latency: float = 0.30  # Seconds to first token / full response
+    token_interval: float = 0.02  # Seconds between streamed tokens
+    jitter: float = 0.2  # Relative jitter applied to every delay
+    transcript: str = DEFAULT_TRANSCRIPT
+    reply: str = DEFAULT_REPLY
+    seed: Optional[int] = None
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+    config = StubConfig()
+    rng = random.Random()
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionResetError:
+            pass  # Client closed a pooled connection while it was idle
+
+    def _sleep(self, seconds: float) -> None:
+        jitter = self.config.jitter
+        time.sleep(max(seconds * (1 + self.rng.uniform(-jitter, jitter)), 0))
+
+    def _send(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.endswith("/models"):  # Used to pre-warm and keep connections alive
+            payload = {"object": "list", "data": [{"id": "stub", "object": "model", "owned_by": "stub"}]}
+            self._send(200, json.dumps(payload).encode(), "application/json")
+        else:
+            self._send(404, b'{"error": {"message": "not found"}}', "application/json")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        try:
+            if self.path.endswith("/audio/transcriptions"):
+                self._transcription(body)
+            elif self.path.endswith("/chat/completions"):
+                self._chat(json.loads(body or b"{}"))
+            else:
+                self._send(404, b'{"error": {"message": "not found"}}', "application/json")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # Client gave up, e.g. a losing hedged request
+
+    def _transcription(self, body: bytes) -> None:
+        self._sleep(self.config.stt_latency + self.config.stt_per_mb * len(body) / 1e6)
+        text = self.config.transcript
+        if b'name="response_format"\r\n\r\ntext' in body:
+            self._send(200, text.encode(), "text/plain")
+        elif b'name="response_format"\r\n\r\nverbose_json' in body:
+            duration = max(len(body) / 32000, 0.5)
+            payload = {
+                "text": text, "language": "english", "duration": duration,
+                "segments": [{"id": 0, "start": 0.0, "end": duration, "text": text,
+                              "avg_logprob": -0.2, "no_speech_prob": 0.01,
+                              "compression_ratio": 1.2}]
+            }
+            self._send(200, json.dumps(payload).encode(), "application/json")
+        else:
+            self._send(200, json.dumps({"text": text}).encode(), "application/json")
+
+    def _chat(self, request: dict) -> None:
+        words = self.config.reply.split(" ")
+        words = words[:max(int(request.get("max_tokens") or len(words)), 1)]
+        model = request.get("model", "stub")
+        if not request.get("stream"):
+            self._sleep(self.config.chat_latency + self.config.token_interval * len(words))
+            payload = {
+                "id": "stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": " ".join(words)}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(words), "total_tokens": len(words)}
+            }
+            self._send(200, json.dumps(payload).encode(), "application/json")
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self._sleep(self.config.chat_latency)
+        for index, word in enumerate(words):
+            if index:
+                self._sleep(self.config.token_interval)
+            delta = {"role": "assistant", "content": word} if not index else {"content": f" {word}"}
+            self._chunk({"id": "stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                         "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+        self._chunk({"id": "stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _chunk(self, payload: dict) -> None:
+        self._write_chunk(f"data: {json.dumps(payload)}\n\n".encode())
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+class StubServer:
+    """Runs the stub in a background thread; use as a context manager"""
+
+    def __init__(self, config: Optional[StubConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        config = config or StubConfig()
+        handler = type("ConfiguredStubHandler", (StubHandler,),
+                       {"config": config, "rng": random.Random(config.seed)})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="stub-server", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/openai/v1"
+
+    def __enter__(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--stt-latency", type=float, default=StubConfig.stt_latency)
+    parser.add_argument("--chat-latency", type=float, default=StubConfig.chat_latency)
+    parser.add_argument("--token-interval", type=float, default=StubConfig.token_interval)
+    parser.add_argument("--jitter", type=float, default=StubConfig.jitter)
+    args = parser.parse_args()
+    config = StubConfig(stt_latency=args.stt_latency, chat_latency=args.chat_latency,
+                        token_interval=args.token_interval, jitter=args.jitter)
+    with StubServer(config, port=args.port) as server:
+        print(f"Stub API listening on {server.base_url}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,142 @@
+"""Bounded conversation memory: recent turns verbatim, older turns in a rolling summary"""
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4  # Rough English average, close enough for budgeting
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def truncate_tokens(text: str, tokens: int) -> str:
+    limit = tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    return text[:limit - 3].rsplit(" ", 1)[0] + "..."
+
+@dataclass
+class Turn:
+    user: str
+    assistant: str
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.user) + estimate_tokens(self.assistant)
+
+class ConversationMemory:
+    """Multi-turn history kept within a fixed token budget
+
+    Each request carries the rolling summary followed by as many of the most
+    recent turns as fit in budget_tokens, so prompt size stays flat however
+    long the conversation runs. Once more than recent_turns turns are held,
+    the older ones are folded into the summary by summarize(summary, turns)
+    on a background thread. Memory is bounded too: at most 4 x recent_turns
+    turns (each truncated to max_turn_tokens) and a summary of summary_tokens.
+    The session resets after idle_seconds without a turn.
+    """
+
+    def __init__(self, summarize: Optional[Callable[[str, List[Turn]], str]] = None,
+                 budget_tokens: int = 600, recent_turns: int = 3, summary_tokens: int = 150,
+                 idle_seconds: float = 300, max_turn_tokens: int = 200,
+                 clock: Callable[[], float] = time.monotonic):
+        self.summarize = summarize
+        self.budget_tokens = budget_tokens
+        self.recent_turns = recent_turns
+        self.summary_tokens = summary_tokens
+        self.idle_seconds = idle_seconds
+        self.max_turn_tokens = max_turn_tokens
+        self.summary = ""
+        self.turns: Deque[Turn] = deque(maxlen=recent_turns * 4)  # Hard bound if summaries fail
+        self.prompt_tokens = 0
+        self.summaries = 0
+        self.expirations = 0
+        self._clock = clock
+        self._last_activity = clock()
+        self._session = 0  # Bumped on reset so late summaries of an old session are dropped
+        self._summarizing = False
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory")
+
+    @property
+    def active(self) -> bool:
+        return bool(self.turns or self.summary)
+
+    def _expire(self) -> None:
+        """Reset the session if it has been idle too long. Caller holds the lock"""
+        if (self.turns or self.summary) and self._clock() - self._last_activity > self.idle_seconds:
+            logger.info("Conversation expired, starting a new session")
+            self.turns.clear()
+            self.summary = ""
+            self._session += 1
+            self.expirations += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self.turns.clear()
+            self.summary = ""
+            self._session += 1
+
+    def messages(self, system_prompt: str, prompt: str) -> List[dict]:
+        """Chat messages for prompt, with history limited to budget_tokens"""
+        with self._lock:
+            self._expire()
+            messages = [{"role": "system", "content": system_prompt}]
+            budget = self.budget_tokens
+            if self.summary:
+                messages.append({"role": "system",
+                                 "content": f"Summary of the conversation so far: {self.summary}"})
+                budget -= estimate_tokens(self.summary)
+            recent: List[Turn] = []
+            for turn in reversed(self.turns):
+                if turn.tokens > budget:
+                    break
+                recent.append(turn)
+                budget -= turn.tokens
+            for turn in reversed(recent):
+                messages.append({"role": "user", "content": turn.user})
+                messages.append({"role": "assistant", "content": turn.assistant})
+            self.prompt_tokens = self.budget_tokens - budget
+        messages.append({"role": "user", "content": prompt})
+        return messages
+
+    def add_turn(self, user: str, assistant: str) -> None:
+        """Record a completed exchange and compact older turns if needed"""
+        turn = Turn(truncate_tokens(user, self.max_turn_tokens),
+                    truncate_tokens(assistant, self.max_turn_tokens))
+        with self._lock:
+            self._expire()
+            self.turns.append(turn)
+            self._last_activity = self._clock()
+            if self.summarize and len(self.turns) > self.recent_turns and not self._summarizing:
+                self._summarizing = True
+                older = list(self.turns)[:len(self.turns) - self.recent_turns]
+                self._executor.submit(self._compact, self.summary, older, self._session)
+
+    def _compact(self, summary: str, older: List[Turn], session: int) -> None:
+        try:
+            summary = truncate_tokens(self.summarize(summary, older).strip(), self.summary_tokens)
+        except Exception as e:
+            logger.warning(f"Conversation summary failed: {e}")
+            summary = None
+        with self._lock:
+            self._summarizing = False
+            if summary is None or session != self._session:
+                return
+            self.summary = summary
+            self.summaries += 1
+            compacted = {id(turn) for turn in older}
+            remaining = [turn for turn in self.turns if id(turn) not in compacted]
+            self.turns.clear()
+            self.turns.extend(remaining)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {"turns": len(self.turns), "summary_tokens": estimate_tokens(self.summary),
+                    "prompt_tokens": self.prompt_tokens, "summaries": self.summaries,
+                    "expirations": self.expirations}
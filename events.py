@@ -0,0 +1,180 @@
+"""In-memory ring of recent daemon events, streamed to local clients over a Unix socket"""
+import os
+import json
+import time
+import socket
+import logging
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class EventLog:
+    """Bounded ring of recent events (transcripts, responses, stage timings, errors)
+
+    publish() only appends to a deque and tries to wake waiting readers
+    without blocking, so it is safe to call from the voice loop. Each event
+    gets an increasing id; readers keep their own cursor and anything older
+    than the ring is simply gone.
+    """
+
+    def __init__(self, capacity: int = 500):
+        self.capacity = capacity
+        self.published = 0
+        self._events: Deque[dict] = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._cond = threading.Condition()
+
+    @property
+    def last_id(self) -> int:
+        return self.published
+
+    def publish(self, kind: str, **data) -> None:
+        with self._lock:
+            self.published += 1
+            self._events.append({"id": self.published, "time": time.time(), "type": kind, **data})
+        if self._cond.acquire(blocking=False):
+            try:
+                self._cond.notify_all()
+            finally:
+                self._cond.release()
+
+    def since(self, last_id: int) -> List[dict]:
+        """Events newer than last_id that are still in the ring"""
+        with self._lock:
+            if last_id >= self.published:
+                return []
+            missing = min(self.published - last_id, len(self._events))
+            return list(self._events)[-missing:]
+
+    def wait(self, last_id: int, timeout: float) -> List[dict]:
+        """Like since(), but waits up to timeout for something new"""
+        deadline = time.monotonic() + timeout
+        while True:
+            events = self.since(last_id)
+            remaining = deadline - time.monotonic()
+            if events or remaining <= 0:
+                return events
+            with self._cond:
+                self._cond.wait(min(remaining, 0.5))  # Short waits cover a missed notify
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {"buffered": len(self._events), "published": self.published}
+
+class EventHandler(logging.Handler):
+    """Publishes warnings and errors from any logger as "log" events"""
+
+    def __init__(self, events: EventLog, level: int = logging.WARNING):
+        super().__init__(level)
+        self.events = events
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.events.publish("log", level=record.levelname, logger=record.name,
+                                message=record.getMessage())
+        except Exception:
+            self.handleError(record)
+
+class EventServer:
+    """Serves an EventLog over a Unix socket as newline-delimited JSON
+
+    A client may send one line with the last id it has seen; it then gets
+    the buffered events after it followed by new ones as they happen, and a
+    heartbeat line ({"type": "ping"}) when idle. Every client has its own
+    thread and cursor, so a slow client only delays itself; one that stops
+    reading for send_timeout seconds is dropped.
+    """
+
+    def __init__(self, events: EventLog, path: str, max_clients: int = 8,
+                 send_timeout: float = 5.0, heartbeat: float = 15.0):
+        self.events = events
+        self.path = path
+        self.max_clients = max_clients
+        self.send_timeout = send_timeout
+        self.heartbeat = heartbeat
+        self.dropped = 0
+        self._clients: Dict[int, socket.socket] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sock: Optional[socket.socket] = None
+
+    def start(self) -> None:
+        if self._sock is not None:
+            return
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # Left over from a previous run
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(self.path)
+        os.chmod(self.path, 0o660)
+        self._sock.listen(self.max_clients)
+        self._sock.settimeout(1.0)
+        self._stop.clear()
+        threading.Thread(target=self._accept, name="events-accept", daemon=True).start()
+        logger.info(f"Event stream on {self.path}")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+        with self._lock:
+            for conn in self._clients.values():
+                conn.close()
+
+    def _accept(self) -> None:
+        while not self._stop.is_set():
+            try:
+                conn, _ = self._sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return  # Closed by stop()
+            with self._lock:
+                if len(self._clients) >= self.max_clients:
+                    conn.close()
+                    continue
+                self._clients[conn.fileno()] = conn
+            threading.Thread(target=self._serve, args=(conn,), name="events-client", daemon=True).start()
+
+    @staticmethod
+    def _read_cursor(conn: socket.socket) -> int:
+        """The optional last-seen id the client sends first"""
+        conn.settimeout(0.5)
+        try:
+            line = conn.recv(64).split(b"\n", 1)[0].strip()
+            return int(line) if line else 0
+        except (socket.timeout, ValueError):
+            return 0
+
+    def _serve(self, conn: socket.socket) -> None:
+        key = conn.fileno()
+        try:
+            cursor = self._read_cursor(conn)
+            if cursor > self.events.last_id:
+                cursor = 0  # The daemon restarted since the client's last event
+            conn.settimeout(self.send_timeout)
+            while not self._stop.is_set():
+                events = self.events.wait(cursor, self.heartbeat)
+                lines = [json.dumps(event) for event in events] or ['{"type": "ping"}']
+                conn.sendall(("\n".join(lines) + "\n").encode())
+                if events:
+                    cursor = events[-1]["id"]
+        except socket.timeout:
+            self.dropped += 1
+            logger.debug("Dropped an event client that stopped reading")
+        except OSError:
+            pass  # Client went away
+        finally:
+            with self._lock:
+                self._clients.pop(key, None)
+            conn.close()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {"clients": len(self._clients), "dropped": self.dropped}
@@ -0,0 +1,239 @@
+"""Pooled keep-alive HTTP transport, connection pre-warming and hedged API requests"""
+import time
+import socket
+import logging
+import threading
+import httpx
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+from metrics import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+def socket_options() -> List[tuple]:
+    """TCP options for API connections: no Nagle delay, kernel keep-alive probes"""
+    options = [(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+               (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+    if hasattr(socket, "TCP_KEEPIDLE"):  # Linux only
+        options += [(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 30),
+                    (socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 10),
+                    (socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3)]
+    return options
+
+class PooledTransport(httpx.HTTPTransport):
+    """Connection-pooling transport that counts reused connections
+
+    Every request carries an httpcore trace callback, which tells whether the
+    request had to open a new connection and when its body finished sending
+    (the end of an audio upload).
+    """
+
+    def __init__(self, keepalive_expiry: float = 120.0, max_connections: int = 4):
+        super().__init__(
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections,
+                                keepalive_expiry=keepalive_expiry),
+            socket_options=socket_options(),
+            retries=1  # Reconnect once if a pooled connection was dropped
+        )
+        self.requests = 0
+        self.connections = 0
+        self.reused = 0
+        self.last_request = 0.0
+        self._upload_ends: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        opened = False
+        previous = request.extensions.get("trace")
+
+        def trace(event: str, info: dict) -> None:
+            nonlocal opened
+            if event == "connection.connect_tcp.complete":
+                opened = True
+            elif event.endswith(".send_request_body.complete"):
+                self._upload_ends[path] = time.monotonic()
+            if previous:
+                previous(event, info)
+
+        request.extensions = {**request.extensions, "trace": trace}
+        with self._lock:
+            self.requests += 1
+            self.last_request = time.monotonic()
+        response = super().handle_request(request)
+        with self._lock:
+            if opened:
+                self.connections += 1
+            else:
+                self.reused += 1
+        return response
+
+    def upload_end(self, path_suffix: str) -> Optional[float]:
+        """Monotonic time the last request to a path ending in path_suffix finished sending"""
+        times = [at for path, at in self._upload_ends.items() if path.endswith(path_suffix)]
+        return max(times) if times else None
+
+class ApiConnection:
+    """Owns the HTTP client behind the OpenAI client and keeps its connection warm
+
+    warm() opens (or refreshes) a pooled connection with a cheap request in
+    the background, so DNS, TCP and TLS setup happen while the user is still
+    speaking. While idle, a keep-alive request is sent every ping_interval
+    seconds so the pooled connection is not dropped by the server.
+    """
+
+    def __init__(self, base_url: str, api_key: Optional[str] = None,
+                 keepalive_expiry: float = 120.0, ping_interval: float = 25.0,
+                 connect_timeout: float = 3.0, max_connections: int = 4):
+        self.base_url = base_url.rstrip("/")
+        self.ping_interval = ping_interval
+        self.transport = PooledTransport(keepalive_expiry, max_connections)
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.client = httpx.Client(transport=self.transport, headers=headers,
+                                   timeout=httpx.Timeout(60.0, connect=connect_timeout))
+        self.pings = 0
+        self._warming = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _ping(self) -> None:
+        if not self._warming.acquire(blocking=False):
+            return  # Already warming
+        try:
+            self.client.get(f"{self.base_url}/models")
+            self.pings += 1
+        except httpx.HTTPError as e:
+            logger.debug(f"Connection warm-up failed: {e}")
+        finally:
+            self._warming.release()
+
+    def warm(self) -> None:
+        """Open or refresh a pooled connection without blocking the caller"""
+        threading.Thread(target=self._ping, name="api-warm", daemon=True).start()
+
+    def _keepalive(self) -> None:
+        while not self._stop.wait(self.ping_interval):
+            if time.monotonic() - self.transport.last_request >= self.ping_interval:
+                self._ping()
+
+    def start_keepalive(self) -> None:
+        if self.ping_interval <= 0 or self._thread:
+            return
+        self._thread = threading.Thread(target=self._keepalive, name="api-keepalive", daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self._stop.set()
+        self.client.close()
+
+    def upload_end(self, path_suffix: str) -> Optional[float]:
+        return self.transport.upload_end(path_suffix)
+
+    def stats(self) -> Dict[str, float]:
+        transport = self.transport
+        done = transport.connections + transport.reused
+        return {"requests": transport.requests, "connections": transport.connections,
+                "reused": transport.reused, "reuse_ratio": transport.reused / done if done else 0.0,
+                "pings": self.pings}
+
+class Hedger:
+    """Sends a duplicate request when the first is slower than a latency percentile
+
+    Latencies are tracked per stage (e.g. "stt", "chat"). Until min_samples
+    requests have completed the request runs once, unhedged. Otherwise, if
+    no answer has arrived by the percentile latency a second identical
+    request is sent and whichever succeeds first wins. discard is called
+    with the loser's result (for example to close a stream).
+
+    The latency window records the first request of every call when it
+    completes, winner or not, so slow requests that were beaten by their
+    duplicate still raise the threshold. A loser keeps its worker until its
+    response arrives, so max_workers should allow two requests for every
+    call that can be in flight at once (AIService sizes it per room).
+    """
+
+    def __init__(self, percentile: float = 0.95, min_samples: int = 20,
+                 window: int = 200, max_workers: int = 4):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window = window
+        self.calls: Dict[str, int] = {}
+        self.hedged: Dict[str, int] = {}
+        self.wins: Dict[str, int] = {}
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+        self._lock = threading.Lock()
+
+    def delay(self, stage: str) -> Optional[float]:
+        """Seconds to wait before hedging, None while there are too few samples"""
+        histogram = self._histograms.get(stage)
+        if histogram is None or histogram.count < self.min_samples:
+            return None
+        with self._lock:
+            return histogram.quantile(self.percentile)
+
+    def _observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = LatencyHistogram(self.window)
+            histogram.observe(seconds)
+
+    def call(self, stage: str, request: Callable[[], Any],
+             discard: Optional[Callable[[Any], None]] = None) -> Any:
+        delay = self.delay(stage)
+        with self._lock:
+            self.calls[stage] = self.calls.get(stage, 0) + 1
+        start = time.monotonic()
+        if delay is None:
+            response = request()
+            self._observe(stage, time.monotonic() - start)
+            return response
+
+        def timed() -> Any:
+            response = request()
+            self._observe(stage, time.monotonic() - start)
+            return response
+
+        futures = [self._executor.submit(timed)]
+        done, _ = wait(futures, timeout=delay)
+        if not done:
+            logger.info(f"Hedging {stage} request after {delay:.2f}s")
+            with self._lock:
+                self.hedged[stage] = self.hedged.get(stage, 0) + 1
+            futures.append(self._executor.submit(request))
+
+        pending = set(futures)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is not futures[0]:
+                        with self._lock:
+                            self.wins[stage] = self.wins.get(stage, 0) + 1
+                    for loser in pending:
+                        self._discard_when_done(loser, discard)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    @staticmethod
+    def _discard_when_done(future: Future, discard: Optional[Callable[[Any], None]]) -> None:
+        if not future.cancel() and discard:
+            def on_done(f: Future) -> None:
+                if f.exception() is None:
+                    try:
+                        discard(f.result())
+                    except Exception as e:
+                        logger.debug(f"Discarding hedged response failed: {e}")
+            future.add_done_callback(on_done)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            calls = sum(self.calls.values())
+            hedged = sum(self.hedged.values())
+            wins = sum(self.wins.values())
+        return {"calls": calls, "hedged": hedged, "hedge_wins": wins,
+                "hedge_rate": hedged / calls if calls else 0.0}
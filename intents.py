@@ -0,0 +1,262 @@
+"""Local intent router: answers simple commands without calling the LLM"""
+import re
+import time
+import logging
+import threading
+from datetime import datetime
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from answer_cache import normalize_question
+
+logger = logging.getLogger(__name__)
+
+POLITE_PREFIX = re.compile(r"^(?:(?:can|could|would|will) you |i want to |i'd like to |i would like to )")
+NAMED_GROUP = re.compile(r"\(\?P<(\w+)>")
+LEADING_WORD = re.compile(r"^([a-z0-9']+)(?= |$|\(\?: )")  # A literal first word in a pattern
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14,
+    "fifteen": 15, "sixteen": 16, "seventeen": 17, "eighteen": 18, "nineteen": 19, "twenty": 20,
+    "thirty": 30, "forty": 40, "fifty": 50, "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90,
+    "hundred": 100
+}
+NUMBER = r"(?:\d+|(?:(?:a|an|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|thirteen" \
+         r"|fourteen|fifteen|sixteen|seventeen|eighteen|nineteen|twenty|thirty|forty|fifty|sixty" \
+         r"|seventy|eighty|ninety|hundred)[ -]?)+)"
+
+def parse_number(text: str) -> Optional[int]:
+    """'25', 'twenty five' or 'a' -> int"""
+    text = text.strip()
+    if text.isdigit():
+        return int(text)
+    total = 0
+    for word in re.split(r"[ -]+", text):
+        if word not in NUMBER_WORDS:
+            return None
+        value = NUMBER_WORDS[word]
+        total = total * value if value == 100 and total else total + value
+    return total or None
+
+@dataclass
+class IntentMatch:
+    intent: str
+    slots: Dict[str, str]
+    text: str
+
+Handler = Callable[[IntentMatch], str]
+
+class IntentRouter:
+    """Matches a transcript against registered patterns with a first-word index
+
+    Patterns are grouped by their literal first word and each group is
+    compiled into one alternation (one named group per pattern), so a
+    transcript is only tried against the patterns that can start with its
+    first word, plus the few that start with a group. Matching cost stays
+    flat as the table grows to hundreds of patterns. Named groups inside a
+    pattern become slots. Handlers return the text to speak, or "" for a
+    silent action.
+    """
+
+    def __init__(self):
+        self._patterns: List[Tuple[str, str]] = []  # (intent, pattern)
+        self._handlers: Dict[str, Handler] = {}
+        self._examples: List[str] = []
+        self._index: Optional[Dict[str, re.Pattern]] = None  # first word ("" = any) -> regex
+        self.handled = 0
+        self.passed = 0
+
+    def add(self, intent: str, patterns: Iterable[str], handler: Handler,
+            examples: Iterable[str] = ()) -> None:
+        """Register patterns (matched against the whole normalized transcript) for an intent"""
+        self._patterns += [(intent, pattern) for pattern in patterns]
+        self._handlers[intent] = handler
+        self._examples += examples
+        self._index = None
+
+    def _compile(self) -> Dict[str, re.Pattern]:
+        buckets: Dict[str, List[str]] = {}
+        for index, (_, pattern) in enumerate(self._patterns):
+            leading = LEADING_WORD.match(pattern)
+            # Prefix slot names so the same slot can appear in several patterns
+            pattern = NAMED_GROUP.sub(lambda m: f"(?P<p{index}_{m.group(1)}>", pattern)
+            buckets.setdefault(leading.group(1) if leading else "", []).append(f"(?P<p{index}>{pattern})")
+        return {word: re.compile(f"(?:{'|'.join(alternatives)})$")
+                for word, alternatives in buckets.items()}
+
+    def _search(self, text: str) -> Optional[re.Match]:
+        first_word = text.split(" ", 1)[0]
+        for word in (first_word, ""):
+            regex = self._index.get(word)
+            found = regex.match(text) if regex else None
+            if found:
+                return found
+        return None
+
+    def match(self, text: str) -> Optional[IntentMatch]:
+        if self._index is None:
+            self._index = self._compile()
+        normalized = normalize_question(text)
+        command = POLITE_PREFIX.sub("", normalized)
+        found = self._search(command) if command else None
+        if not found:
+            return None
+        outer = found.lastgroup  # The pattern's own group closes last
+        prefix = f"{outer}_"
+        slots = {name[len(prefix):]: value for name, value in found.groupdict().items()
+                 if name.startswith(prefix) and value is not None}
+        return IntentMatch(self._patterns[int(outer[1:])][0], slots, normalized)
+
+    def handle(self, text: str) -> Optional[str]:
+        """The handler's reply for a local command, or None to ask the LLM"""
+        intent = self.match(text)
+        if intent is None:
+            self.passed += 1
+            return None
+        self.handled += 1
+        logger.info(f"Local intent: {intent.intent} {intent.slots}")
+        return self._handlers[intent.intent](intent)
+
+    def phrases(self) -> List[str]:
+        """Example phrases, e.g. for a constrained speech recognizer grammar"""
+        return list(self._examples)
+
+    def stats(self) -> Dict[str, float]:
+        return {"patterns": len(self._patterns), "handled": self.handled, "passed": self.passed}
+
+def spoken_time(moment: datetime) -> str:
+    hour = moment.hour % 12 or 12
+    minute = f"{moment.minute:02d}" if moment.minute else "o'clock"
+    return f"{hour} {minute} {'AM' if moment.hour < 12 else 'PM'}"
+
+def spoken_duration(seconds: int) -> str:
+    parts = []
+    for unit, size in (("hour", 3600), ("minute", 60), ("second", 1)):
+        count, seconds = divmod(seconds, size)
+        if count:
+            parts.append(f"{count} {unit}{'s' if count != 1 else ''}")
+    return " and ".join(parts) or "0 seconds"
+
+class LocalCommands:
+    """Built-in commands: time, date, timers, volume, stop and repeat
+
+    speak(text) plays a sentence (used when a timer rings), player() returns
+    the AudioPlayer or None, last_answer() returns the last spoken answer.
+    """
+    UNITS = {"second": 1, "sec": 1, "minute": 60, "min": 60, "hour": 3600}
+    VOLUME_STEP = 0.1
+
+    def __init__(self, speak: Callable[[str], None], player: Callable[[], object],
+                 last_answer: Callable[[], str], now: Callable[[], datetime] = datetime.now):
+        self.speak = speak
+        self.player = player
+        self.last_answer = last_answer
+        self.now = now
+        self._timers: Dict[threading.Timer, Tuple[float, str]] = {}
+        self._lock = threading.Lock()
+
+    def register(self, router: IntentRouter) -> IntentRouter:
+        duration = rf"(?P<amount>{NUMBER}|half an?) (?P<unit>second|sec|minute|min|hour)s?"
+        router.add("time", [r"what time is it(?: now)?", r"what is the time(?: now)?",
+                            r"tell me the time", r"time"],
+                   self.time, ["what time is it", "what is the time"])
+        router.add("date", [r"what is (?:the )?(?:date|day)(?: today)?", r"what is today'?s date",
+                            r"what day is it(?: today)?"],
+                   self.date, ["what is the date", "what day is it"])
+        router.add("timer_set", [rf"set (?:a |the )?timer (?:for )?{duration}",
+                                 rf"set (?:a |an )?(?P<amount2>{NUMBER}) (?P<unit2>second|minute|hour) timer",
+                                 rf"(?:start )?(?:a )?timer (?:for )?{duration}"],
+                   self.set_timer, ["set a timer for five minutes", "set a ten minute timer"])
+        router.add("timer_cancel", [r"(?:cancel|stop|delete|clear) (?:the |my |all )?timers?"],
+                   self.cancel_timers, ["cancel the timer"])
+        router.add("timer_query", [r"how (?:long|much time) (?:is )?left(?: on (?:the|my) timer)?",
+                                   r"how long until the timer"],
+                   self.timer_left, ["how long is left"])
+        router.add("volume", [r"(?:turn (?:it|the volume) |volume )(?P<direction>up|down)",
+                              r"(?P<direction>louder|quieter|softer)",
+                              r"(?:set (?:the )?)?volume (?:to )?(?P<level>\d+)(?: percent)?",
+                              r"(?P<direction>mute|unmute)"],
+                   self.volume, ["volume up", "volume down", "louder", "quieter", "mute", "unmute"])
+        router.add("stop", [r"stop(?: it| that| talking| playing)?", r"shut up", r"be quiet",
+                            r"never mind", r"nevermind", r"cancel"],
+                   self.stop, ["stop", "be quiet", "never mind"])
+        router.add("repeat", [r"(?:repeat|say) that(?: again)?", r"repeat(?: yourself| it)?",
+                              r"what did you say", r"say it again", r"pardon", r"come again"],
+                   self.repeat, ["repeat that", "say that again", "what did you say"])
+        return router
+
+    def time(self, intent: IntentMatch) -> str:
+        return f"It's {spoken_time(self.now())}."
+
+    def date(self, intent: IntentMatch) -> str:
+        today = self.now()
+        return f"It's {today.strftime('%A')}, {today.day} {today.strftime('%B %Y')}."
+
+    def _seconds(self, slots: Dict[str, str]) -> Optional[int]:
+        amount = slots.get("amount") or slots.get("amount2") or ""
+        unit = slots.get("unit") or slots.get("unit2") or ""
+        value = 0.5 if amount.startswith("half") else parse_number(amount)
+        return int(value * self.UNITS[unit]) if value else None
+
+    def set_timer(self, intent: IntentMatch) -> str:
+        seconds = self._seconds(intent.slots)
+        if not seconds:
+            return "Sorry, I didn't catch how long."
+        label = spoken_duration(seconds)
+        timer = threading.Timer(seconds, self._ring)
+        timer.args = (timer, label)
+        timer.daemon = True
+        with self._lock:
+            self._timers[timer] = (time.monotonic() + seconds, label)
+        timer.start()
+        return f"Timer set for {label}."
+
+    def _ring(self, timer: threading.Timer, label: str) -> None:
+        with self._lock:
+            self._timers.pop(timer, None)
+        try:
+            self.speak(f"Your {label} timer is done.")
+        except Exception as e:
+            logger.error(f"Could not announce timer: {e}")
+
+    def cancel_timers(self, intent: IntentMatch) -> str:
+        with self._lock:
+            timers, self._timers = self._timers, {}
+        for timer in timers:
+            timer.cancel()
+        return f"Cancelled {len(timers)} timer{'s' if len(timers) != 1 else ''}." if timers else "There are no timers."
+
+    def timer_left(self, intent: IntentMatch) -> str:
+        with self._lock:
+            ends = sorted(end for end, _ in self._timers.values())
+        if not ends:
+            return "There are no timers."
+        left = max(round(ends[0] - time.monotonic()), 0)
+        return f"{spoken_duration(left)} left."
+
+    def volume(self, intent: IntentMatch) -> str:
+        player = self.player()
+        if player is None:
+            return "Sorry, I can't change the volume."
+        direction = intent.slots.get("direction")
+        if "level" in intent.slots:
+            player.volume = min(int(intent.slots["level"]), 100) / 100
+        elif direction == "mute":
+            player.muted = True
+            return ""
+        elif direction == "unmute":
+            player.muted = False
+        elif direction in ("up", "louder"):
+            player.volume = min(player.volume + self.VOLUME_STEP, 1.0)
+        else:
+            player.volume = max(player.volume - self.VOLUME_STEP, 0.0)
+        return f"Volume {round(player.volume * 100)} percent."
+
+    def stop(self, intent: IntentMatch) -> str:
+        player = self.player()
+        if player is not None:
+            player.stop_all(fade_out=0.02)
+        return ""
+
+    def repeat(self, intent: IntentMatch) -> str:
+        return self.last_answer() or "I haven't said anything yet."
@@ -0,0 +1,58 @@
+"""Non-blocking logging: records are queued and written by a background listener"""
+import queue
+import logging
+import logging.handlers
+from typing import Dict, Iterable
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler on a bounded queue that drops records rather than block or grow
+
+    Formatting the message is the only work done on the logging thread; the
+    handlers that write to the terminal, the log file and the event ring run
+    on the listener's thread.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stats(self) -> Dict[str, float]:
+        return {"queued": self.queue.qsize(), "dropped": self.dropped}
+
+class QueueLogging:
+    """Routes the root logger through a bounded queue to handlers on a background thread
+
+    start() replaces the root logger's handlers with a DroppingQueueHandler;
+    stop() (registered at exit) flushes whatever is still queued.
+    """
+
+    def __init__(self, handlers: Iterable[logging.Handler], level: int = logging.INFO,
+                 maxsize: int = 10000):
+        self.level = level
+        self.handler = DroppingQueueHandler(queue.Queue(maxsize))
+        self.listener = logging.handlers.QueueListener(self.handler.queue, *handlers,
+                                                       respect_handler_level=True)
+        self._running = False
+
+    def start(self) -> None:
+        root = logging.getLogger()
+        for existing in root.handlers[:]:
+            root.removeHandler(existing)
+        root.addHandler(self.handler)
+        root.setLevel(self.level)
+        self.listener.start()
+        self._running = True
+
+    def stop(self) -> None:
+        if self._running:
+            self._running = False
+            self.listener.stop()
+
+    def stats(self) -> Dict[str, float]:
+        return self.handler.stats()
@@ -0,0 +1,229 @@
+"""Per-stage latency spans, rolling histograms and Prometheus/JSON export"""
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+import numpy as np
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+class LatencyHistogram:
+    """Rolling window of latency observations with percentile summaries
+
+    Percentiles cover the last window observations, while count and sum are
+    cumulative like a Prometheus summary.
+    """
+
+    def __init__(self, window: int = 500):
+        self._values = np.zeros(window, dtype=np.float64)
+        self._pos = 0
+        self._filled = 0
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self._values[self._pos] = seconds
+        self._pos = (self._pos + 1) % len(self._values)
+        self._filled = min(self._filled + 1, len(self._values))
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q: float) -> float:
+        if not self._filled:
+            return float("nan")
+        return float(np.quantile(self._values[:self._filled], q))
+
+    def quantiles(self) -> Dict[float, float]:
+        if not self._filled:
+            return {q: float("nan") for q in QUANTILES}
+        values = np.quantile(self._values[:self._filled], QUANTILES)
+        return dict(zip(QUANTILES, (float(v) for v in values)))
+
+    def summary(self) -> Dict[str, float]:
+        quantiles = self.quantiles()
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            **{f"p{int(q * 100)}": round(v, 6) for q, v in quantiles.items()}
+        }
+
+class TurnSpans:
+    """Monotonic-clock marks taken at each point of a single turn
+
+    Only the first mark of each name counts, so stages can mark freely
+    (e.g. every sentence marking first_audio). Stage durations are derived
+    from pairs of marks; missing marks simply skip the stage.
+    """
+    STAGES: Dict[str, Tuple[str, str]] = {
+        "queue": ("wake", "scheduled"),  # Multi-room daemon only: waiting for a turn worker
+        "capture": ("wake", "capture_end"),
+        "upload": ("upload_start", "upload_end"),
+        "stt": ("capture_end", "stt_done"),
+        "llm_first_token": ("stt_done", "first_token"),
+        "tts_first_byte": ("first_token", "first_tts_byte"),
+        "first_audio": ("first_tts_byte", "first_audio"),
+        "playback": ("first_audio", "turn_end"),
+        "turn": ("wake", "turn_end"),
+    }
+    SLO = ("wake", "first_audio")  # The latency the user actually feels
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self.marks: Dict[str, float] = {}
+
+    def mark(self, name: str, at: Optional[float] = None) -> None:
+        if name not in self.marks:
+            self.marks[name] = self._clock() if at is None else at
+
+    def between(self, start: str, end: str) -> Optional[float]:
+        if start in self.marks and end in self.marks:
+            return self.marks[end] - self.marks[start]
+        return None
+
+    def durations(self) -> Dict[str, float]:
+        durations = {}
+        for stage, (start, end) in self.STAGES.items():
+            value = self.between(start, end)
+            if value is not None:
+                durations[stage] = value
+        return durations
+
+    @property
+    def wake_to_first_audio(self) -> Optional[float]:
+        return self.between(*self.SLO)
+
+class Metrics:
+    """Registry of stage histograms, counters and gauges for one speaker"""
+
+    def __init__(self, prefix: str = "voxmate", window: int = 500,
+                 labels: Optional[Dict[str, str]] = None):
+        self.prefix = prefix
+        self.window = window
+        self.labels = labels or {}
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.counters: Dict[str, float] = {}
+        self._gauges: Dict[str, Callable[[], Dict[str, float]]] = {}
+        self._lock = threading.Lock()
+
+    def start_turn(self) -> TurnSpans:
+        spans = TurnSpans()
+        spans.mark("wake")
+        return spans
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram(self.window)
+            histogram.observe(seconds)
+
+    def inc(self, name: str, amount: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def register_gauges(self, name: str, collect: Callable[[], Dict[str, float]]) -> None:
+        """collect() is called at export time and returns numeric values"""
+        self._gauges[name] = collect
+
+    def record_turn(self, spans: TurnSpans, cancelled: bool = False) -> Dict[str, float]:
+        spans.mark("turn_end")
+        durations = spans.durations()
+        for stage, seconds in durations.items():
+            self.observe(stage, seconds)
+        slo = spans.wake_to_first_audio
+        if slo is not None:
+            self.observe("wake_to_first_audio", slo)
+        self.inc("turns_total")
+        if cancelled:
+            self.inc("turns_cancelled")
+        return durations
+
+    def record_budget_misses(self, stages: Iterable[str]) -> None:
+        """Count the stages of a turn that ran over their latency budget"""
+        for stage in stages:
+            self.inc("budget_misses_total")
+            self.inc(f"budget_misses_{stage}_total")
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            histograms = {name: h.summary() for name, h in self.histograms.items()}
+            counters = dict(self.counters)
+        gauges = {}
+        for name, collect in self._gauges.items():
+            try:
+                gauges[name] = {k: v for k, v in collect().items() if isinstance(v, (int, float))}
+            except Exception as e:
+                logger.debug(f"Gauge {name} failed: {e}")
+        return {"labels": self.labels, "latency_seconds": histograms,
+                "counters": counters, "gauges": gauges}
+
+    def slo_report(self) -> str:
+        histogram = self.histograms.get("wake_to_first_audio")
+        if histogram is None or not histogram.count:
+            return "wake-to-first-audio: no data"
+        q = histogram.quantiles()
+        return (f"wake-to-first-audio p50 {q[0.5]:.2f}s, p95 {q[0.95]:.2f}s, "
+                f"p99 {q[0.99]:.2f}s over {histogram.count} turns")
+
+def _label_text(labels: Dict[str, str]) -> str:
+    return ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+
+def prometheus_text(registries) -> str:
+    """Render one or more Metrics registries in the Prometheus text format"""
+    registries = list(registries)
+    if not registries:
+        return ""
+    prefix = registries[0].prefix
+    lines = [f"# HELP {prefix}_latency_seconds Per-stage turn latency (rolling quantiles)",
+             f"# TYPE {prefix}_latency_seconds summary"]
+    counters, gauges = [], []
+    for registry in registries:
+        snapshot = registry.snapshot()
+        for stage, summary in snapshot["latency_seconds"].items():
+            labels = {**registry.labels, "stage": stage}
+            for q in QUANTILES:
+                value = summary[f"p{int(q * 100)}"]
+                lines.append(f'{prefix}_latency_seconds{{{_label_text({**labels, "quantile": str(q)})}}} {value}')
+            lines.append(f"{prefix}_latency_seconds_sum{{{_label_text(labels)}}} {summary['sum']}")
+            lines.append(f"{prefix}_latency_seconds_count{{{_label_text(labels)}}} {summary['count']}")
+        for name, value in snapshot["counters"].items():
+            counters.append((f"{prefix}_{name}", registry.labels, value))
+        for group, values in snapshot["gauges"].items():
+            for name, value in values.items():
+                gauges.append((f"{prefix}_{group}_{name}", registry.labels, value))
+    for kind, samples in (("counter", counters), ("gauge", gauges)):
+        declared = set()
+        for name, labels, value in samples:
+            if name not in declared:
+                lines.append(f"# TYPE {name} {kind}")
+                declared.add(name)
+            label_text = _label_text(labels)
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+def _write_atomic(path: str, text: str) -> None:
+    directory = os.path.dirname(path) or "."
+    fd, temp_path = tempfile.mkstemp(prefix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+        os.replace(temp_path, path)
+    except Exception:
+        os.unlink(temp_path)
+        raise
+
+def export(registries, prom_path: Optional[str], json_path: Optional[str]) -> None:
+    """Write the Prometheus textfile and JSON snapshot atomically"""
+    registries = list(registries)
+    try:
+        if prom_path:
+            _write_atomic(prom_path, prometheus_text(registries))
+        if json_path:
+            _write_atomic(json_path, json.dumps([r.snapshot() for r in registries], indent=2))
+    except OSError as e:
+        logger.warning(f"Could not export metrics: {e}")
@@ -0,0 +1,53 @@
+# Compares time-to-first-sample of gTTS against the local pyttsx3 engine.
+# Run from this folder: python3 TTS-benchmark.py
+# Time-to-first-sample is when PCM is ready for the audio output: for gTTS that
+# is the network synthesis plus MP3 decode, for the local engine the render.
+
+import sys
+import time
+import statistics
+
+sys.path.append("../..")
+from tts_backends import GTTSBackend, create_local_tts_backend
+
+PHRASES = [
+    "Hi, this is a test.",
+    "It is currently twelve degrees and cloudy in London.",
+    "Sorry, I encountered an error processing your request.",
+    "The Eiffel Tower was completed in 1889 for the World's Fair in Paris.",
+]
+RUNS = 3
+
+
+def time_to_first_sample(backend, text):
+    start = time.perf_counter()
+    data, rate = backend.render(text)
+    elapsed = time.perf_counter() - start
+    return elapsed, len(data) / rate
+
+
+start = time.perf_counter()
+local = create_local_tts_backend()
+print(f"Local engine init: {time.perf_counter() - start:.3f}s (paid once at startup)")
+
+backends = [GTTSBackend()]
+if local:
+    backends.append(local)
+
+for backend in backends:
+    timings = []
+    for _ in range(RUNS):
+        for phrase in PHRASES:
+            try:
+                elapsed, duration = time_to_first_sample(backend, phrase)
+            except Exception as e:
+                print(f"{backend.name}: failed on '{phrase}': {e}")
+                continue
+            timings.append(elapsed)
+            print(f"{backend.name}: {elapsed:.3f}s for {duration:.2f}s of audio")
+
+    if timings:
+        timings.sort()
+        print(f"\n{backend.name} time-to-first-sample over {len(timings)} renders:")
+        print(f"  median {statistics.median(timings):.3f}s, "
+              f"min {timings[0]:.3f}s, max {timings[-1]:.3f}s\n")
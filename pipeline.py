@@ -0,0 +1,443 @@
+"""Turn pipeline: record, transcribe, generate, synthesize and play as overlapping stages"""
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from metrics import TurnSpans
+
+logger = logging.getLogger(__name__)
+
+POLL_SECONDS = 0.05  # How often blocked stages check for cancellation
+
+class Cancelled(Exception):
+    """Raised inside a stage when its turn has been cancelled"""
+
+class CancelToken:
+    """Thread-safe cancellation flag shared by every stage of a turn
+
+    Callbacks registered with on_cancel (for example closing an HTTP stream)
+    run once, from the thread that cancels.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks: List[Callable[[], Any]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.debug(f"Cancel callback failed: {e}")
+
+    def on_cancel(self, callback: Callable[[], Any]) -> None:
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def check(self) -> None:
+        if self._event.is_set():
+            raise Cancelled()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._event.wait(timeout)
+
+class DeadlineExceeded(Exception):
+    """Raised while waiting on a stage that has run past its budget"""
+
+class Deadline:
+    """The time by which a turn, or one stage of it, has to be done
+
+    child() starts a stage with its own budget, capped by what is left of
+    this one, so time lost in one stage is taken from the stages after it.
+    A budget of None never expires.
+    """
+
+    def __init__(self, seconds: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self.at = None if seconds is None else clock() + seconds
+
+    def child(self, seconds: Optional[float]) -> "Deadline":
+        child = Deadline(seconds, self._clock)
+        if self.at is not None and (child.at is None or self.at < child.at):
+            child.at = self.at
+        return child
+
+    def remaining(self) -> Optional[float]:
+        return None if self.at is None else max(0.0, self.at - self._clock())
+
+    def check(self) -> None:
+        if self.at is not None and self._clock() >= self.at:
+            raise DeadlineExceeded()
+
+@dataclass
+class TurnBudget:
+    """Latency budget of a turn, from the end of speech to the first audio of the reply
+
+    stt covers the transcription, llm the wait for the first sentence of
+    the reply and tts each clip; every share is capped by what is left of
+    total. A stage over its budget is abandoned for a degraded path (see
+    TurnPipeline). None means no limit.
+    """
+    total: Optional[float] = None
+    stt: Optional[float] = None
+    llm: Optional[float] = None
+    tts: Optional[float] = None
+    degraded_max_tokens: int = 40  # Shorter retry of a reply that missed its budget
+    min_retry: float = 1.0  # Seconds that must be left of total for that retry
+
+_END = object()  # Marks the end of a stage's output
+
+def put(q: queue.Queue, item: Any, token: CancelToken) -> None:
+    """Put into a bounded queue, giving up if the turn is cancelled"""
+    while True:
+        token.check()
+        try:
+            q.put(item, timeout=POLL_SECONDS)
+            return
+        except queue.Full:
+            continue
+
+def get(q: queue.Queue, token: CancelToken, deadline: Optional[Deadline] = None) -> Any:
+    """Get from a queue, giving up if the turn is cancelled or the deadline passes"""
+    while True:
+        token.check()
+        if deadline:
+            deadline.check()
+        try:
+            return q.get(timeout=POLL_SECONDS)
+        except queue.Empty:
+            continue
+
+def result(future: Future, token: CancelToken, deadline: Optional[Deadline] = None) -> Any:
+    """Wait for a future while staying responsive to cancellation and the deadline"""
+    while True:
+        token.check()
+        if deadline:
+            deadline.check()
+        try:
+            return future.result(timeout=POLL_SECONDS)
+        except FutureTimeout:
+            continue
+
+@dataclass
+class TurnResult:
+    transcript: str = ""
+    response: str = ""
+    cancelled: bool = False
+    early_stt: bool = False
+    budget_misses: List[str] = field(default_factory=list)  # Stages that ran over, in order
+    rejected: Optional[str] = None  # Why the transcript gate dropped the transcript
+    spans: TurnSpans = field(default_factory=TurnSpans)
+
+class _Reply:
+    """One LLM request streamed into TTS: generate -> sentences -> synthesize -> clips
+
+    It has its own cancel token, also cancelled with the turn, so a reply
+    that missed its budget can be abandoned while the turn goes on.
+    """
+
+    def __init__(self, pipeline: "TurnPipeline", turn: TurnResult, turn_token: CancelToken,
+                 executor: ThreadPoolExecutor, max_tokens: Optional[int] = None):
+        self.token = CancelToken()
+        turn_token.on_cancel(self.token.cancel)
+        self.clips: queue.Queue = queue.Queue(maxsize=pipeline.queue_size)
+        sentences: queue.Queue = queue.Queue(maxsize=pipeline.queue_size)
+        ai, spans, token = pipeline.ai, turn.spans, self.token
+
+        def prepare(sentence: str):
+            audio = ai._prepare_speech(sentence)
+            spans.mark("first_tts_byte")
+            return audio
+
+        def generate() -> None:
+            try:
+                stream = ai.generate_response_stream(
+                    turn.transcript, token, on_token=lambda: spans.mark("first_token"), max_tokens=max_tokens
+                )
+                for sentence in stream:
+                    put(sentences, sentence, token)
+            except Cancelled:
+                pass
+            except Exception as e:
+                logger.error(f"Response stream error: {e}")
+            finally:
+                TurnPipeline._put_end(sentences, token)
+
+        def synthesize() -> None:
+            try:
+                while (sentence := get(sentences, token)) is not _END:
+                    put(self.clips, (sentence, executor.submit(prepare, sentence)), token)
+            except Cancelled:
+                pass
+            finally:
+                TurnPipeline._put_end(self.clips, token)
+
+        self.threads = [threading.Thread(target=generate, name="turn-llm", daemon=True),
+                        threading.Thread(target=synthesize, name="turn-tts", daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+    def cancel(self) -> None:
+        """Abandon this reply; a request still connecting finishes in the background"""
+        self.token.cancel()
+
+    def join(self) -> None:
+        for thread in self.threads:
+            thread.join(timeout=1.0)
+
+class TurnPipeline:
+    """Runs one conversational turn as stages connected by bounded queues
+
+    record -> transcribe -> LLM stream -> TTS -> playback. Transcription of
+    the batch STT backend starts speculatively once the speaker pauses, so the
+    upload overlaps the endpoint hangover. Sentences are synthesized while
+    the LLM is still streaming and played while later ones are synthesized.
+    cancel() stops every stage, closing the LLM stream and fading out audio.
+
+    A transcript the AIService's transcript gate rejects as noise ends the
+    turn before any LLM or TTS work, with the reason in TurnResult.rejected.
+
+    budget, a TurnBudget, bounds the time from the end of speech to the
+    first audio. A stage over its share is abandoned and degraded: late
+    transcription falls back to the streaming STT's transcript, a late
+    first sentence to one shorter LLM request, a late clip to the local TTS
+    engine, and when none of those is possible the pre-rendered fallback
+    reply is played. Every miss is listed in TurnResult.budget_misses.
+
+    ai_service and audio are the AIService instance and AudioProcessor class
+    from voxMate.py (passed in to keep this module free of their setup).
+    barge_in, a BargeInMonitor, listens for the wake word from the end of
+    capture until the turn is over and cancels the turn when it hears it.
+    """
+
+    def __init__(self, ai_service, audio, vad, queue_size: int = 4,
+                 tts_workers: int = 2, early_stt_ms: float = 250, barge_in=None,
+                 budget: Optional[TurnBudget] = None):
+        self.ai = ai_service
+        self.audio = audio
+        self.vad = vad
+        self.queue_size = queue_size
+        self.tts_workers = tts_workers
+        self.early_stt_ms = early_stt_ms
+        self.barge_in = barge_in
+        self.budget = budget or TurnBudget()
+        self._token: Optional[CancelToken] = None
+
+    def cancel(self) -> None:
+        """Cancel the running turn, from any thread"""
+        if self._token:
+            self._token.cancel()
+
+    def run(self, reader, recording, spans: Optional[TurnSpans] = None) -> TurnResult:
+        """Run one turn; spans should already carry the wake mark"""
+        token = self._token = CancelToken()
+        turn = TurnResult(spans=spans or TurnSpans())
+        spans = turn.spans
+        executor = ThreadPoolExecutor(max_workers=self.tts_workers + 1, thread_name_prefix="turn")
+        sound = None
+        try:
+            recording, early = self._record(reader, recording, token, executor, spans)
+            spans.mark("capture_end")
+            if not recording.frames:
+                return turn
+            deadline = Deadline(self.budget.total)
+            if self.barge_in:
+                self.barge_in.start(self.cancel)
+
+            sound = self.audio.start_looping_sound()
+            turn.transcript = self._transcribe(recording, early, token, executor, turn, deadline)
+            spans.mark("stt_done")
+            turn.rejected = self.ai.screen_transcript(turn.transcript, recording)
+            if turn.rejected:
+                turn.transcript = ""  # Noise: no LLM request, no reply
+            elif turn.transcript:
+                logger.info(f"Transcription: {turn.transcript}")
+                self._respond(turn, sound, token, executor, deadline)
+            elif turn.budget_misses:
+                self._play_fallback(turn, sound, token)
+        except Cancelled:
+            turn.cancelled = True
+            logger.info("Turn cancelled")
+        finally:
+            token.cancel()  # Stops any stage still running
+            if self.barge_in:
+                self.barge_in.stop()
+            self.audio.stop_looping_sound(sound)
+            executor.shutdown(wait=False, cancel_futures=True)
+            spans.mark("turn_end")
+        return turn
+
+    def _record(self, reader, recording, token: CancelToken, executor: ThreadPoolExecutor,
+                spans: TurnSpans) -> Tuple[Any, Optional[Future]]:
+        """Record until the endpoint, uploading speculatively when the speaker pauses
+
+        At most one early upload is in flight: a stale one that already
+        started cannot be stopped, and another would only queue the final
+        transcription and TTS behind it on the turn's executor.
+        """
+        stt = self.ai.stt
+        early: Dict[str, Optional[Future]] = {"future": None, "stale": None}
+
+        def on_pause(buffer) -> None:
+            stale = early["stale"]
+            if stt.early and not (stale and stale.running()):
+                spans.marks["upload_start"] = time.monotonic()
+                early["future"] = executor.submit(stt.transcribe_early, buffer.snapshot())
+
+        def on_resume() -> None:
+            future = early["future"]
+            if future is not None:
+                future.cancel()  # Speech continued, the early upload is stale
+                early["stale"] = future
+            early["future"] = None
+            spans.marks.pop("upload_start", None)
+
+        stt.begin()
+        recording = self.audio.record_audio(
+            reader, self.vad, recording, on_frames=stt.feed,
+            on_pause=on_pause, on_resume=on_resume, pause_ms=self.early_stt_ms, token=token
+        )
+        return recording, early["future"]
+
+    def _miss(self, turn: TurnResult, stage: str) -> None:
+        turn.budget_misses.append(stage)
+        logger.warning(f"{stage.upper()} over its latency budget, degrading")
+
+    def _transcribe(self, recording, early: Optional[Future], token: CancelToken,
+                    executor: ThreadPoolExecutor, turn: TurnResult, deadline: Deadline) -> str:
+        stt_deadline = deadline.child(self.budget.stt)
+        try:
+            if early is not None:
+                try:
+                    transcript = result(early, token, stt_deadline)
+                    turn.early_stt = True
+                except (Cancelled, DeadlineExceeded):
+                    raise
+                except Exception as e:
+                    logger.warning(f"Early transcription failed, retrying: {e}")
+                    turn.spans.marks.pop("upload_start", None)
+            if not turn.early_stt:
+                turn.spans.mark("upload_start")
+                transcript = result(executor.submit(self.ai.stt.transcribe, recording), token, stt_deadline)
+            self.ai.mark_upload_end(turn.spans)
+        except DeadlineExceeded:
+            self._miss(turn, "stt")
+            try:
+                transcript = self.ai.stt.degrade(recording) or ""
+            except Exception as e:
+                logger.error(f"Degraded transcription failed: {e}")
+                transcript = ""
+        return transcript.strip()
+
+    def _respond(self, turn: TurnResult, sound, token: CancelToken,
+                 executor: ThreadPoolExecutor, deadline: Deadline) -> None:
+        budget = self.budget
+        spans = turn.spans
+        said: List[str] = []
+        player = self.audio.player
+        speech = player.queue() if player else None
+        token.on_cancel(lambda: speech and speech.stop(fade_out=0.02))
+        reply = _Reply(self, turn, token, executor)
+        first_sentence = deadline.child(budget.llm)
+        retried = False
+        try:
+            while True:
+                try:
+                    item = get(reply.clips, token, None if said else first_sentence)
+                except DeadlineExceeded:
+                    # No sentence in time: abandon the request and retry once, shorter
+                    reply.cancel()
+                    self._miss(turn, "llm")
+                    left = deadline.remaining()
+                    if retried or (left is not None and left < budget.min_retry):
+                        self._play_fallback(turn, sound, token, speech, said)
+                        break
+                    retried = True
+                    reply = _Reply(self, turn, token, executor, max_tokens=budget.degraded_max_tokens)
+                    first_sentence = deadline.child(None)
+                    continue
+                if item is _END:
+                    break
+                sentence, clip = item
+                clip_deadline = (deadline if "first_audio" not in spans.marks else Deadline()).child(budget.tts)
+                try:
+                    audio = result(clip, token, clip_deadline)
+                except Cancelled:
+                    raise
+                except DeadlineExceeded:
+                    self._miss(turn, "tts")
+                    audio = self.ai.degraded_speech(sentence)
+                    if audio is None:
+                        reply.cancel()
+                        self._play_fallback(turn, sound, token, speech, said)
+                        break
+                except Exception as e:
+                    logger.error(f"TTS Error: {e}")
+                    continue
+                self._play(audio, sound, spans, speech)
+                said.append(sentence)
+            if speech:
+                speech.close()
+                while not speech.wait(POLL_SECONDS):
+                    token.check()
+        finally:
+            turn.response = " ".join(said)
+            reply.join()
+
+    def _play(self, audio, sound, spans: TurnSpans, speech) -> None:
+        if "first_audio" not in spans.marks:
+            self.audio.stop_looping_sound(sound)
+            spans.mark("first_audio")
+        if speech:
+            speech.append(audio)
+        else:
+            self.audio.play_audio(audio)
+
+    def _play_fallback(self, turn: TurnResult, sound, token: CancelToken, speech=None,
+                       said: Optional[List[str]] = None) -> None:
+        """Apologise with the pre-rendered fallback reply, which needs no network"""
+        text, audio = self.ai.fallback_speech()
+        if audio is None:
+            logger.error("No fallback reply available")
+            self.audio.stop_looping_sound(sound)
+            return
+        if said is not None:
+            said.append(text)
+        else:
+            turn.response = text
+        if speech:
+            self._play(audio, sound, turn.spans, speech)
+            return
+        player = self.audio.player
+        self.audio.stop_looping_sound(sound)
+        turn.spans.mark("first_audio")
+        if player:
+            voice = player.play(audio)
+            token.on_cancel(lambda: voice.stop(fade_out=0.02))
+            while not voice.wait(POLL_SECONDS):
+                token.check()
+        else:
+            self.audio.play_audio(audio)
+
+    @staticmethod
+    def _put_end(q: queue.Queue, token: CancelToken) -> None:
+        try:
+            put(q, _END, token)
+        except Cancelled:
+            pass
@@ -0,0 +1,164 @@
+"""Multi-room daemon: several microphone/speaker pairs served from one process"""
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+Device = Optional[Union[int, str]]  # sounddevice index or (part of a) name, None = default
+
+@dataclass
+class RoomConfig:
+    name: str
+    input_device: Device = None
+    output_device: Device = None
+
+class Room:
+    """One room's session: its own capture, wake detector, pipeline and metrics
+
+    listen() runs on the room's own thread and only does wake detection;
+    the turn itself runs on the daemon's shared workers. A room has at most
+    one turn queued or running; a wake word during its reply is handled by
+    the room's barge-in monitor, whose position starts the next turn.
+    """
+
+    def __init__(self, name: str, listener, engine, pipeline, audio, metrics,
+                 barge_in=None, recording=None,
+                 greeting: Optional[str] = None, on_wake: Optional[Callable[["Room"], None]] = None):
+        self.name = name
+        self.listener = listener  # wake.WakeListener
+        self.engine = engine
+        self.pipeline = pipeline
+        self.audio = audio
+        self.metrics = metrics
+        self.barge_in = barge_in
+        self.greeting = greeting
+        self.on_wake = on_wake
+        self.recording = recording  # PCMBuffer reused between turns
+        self.busy = False
+        self._idle = threading.Event()
+        self._idle.set()
+
+    def listen(self, stop: threading.Event, submit: Callable[["Room", int, object], None]) -> None:
+        reader = self.engine.reader()
+        while not stop.is_set():
+            position = self.barge_in.take() if self.barge_in else None
+            if position is None:
+                position = self.listener.listen(reader, stop, timeout=0.5)
+                if position is None:
+                    continue
+            logger.info(f"[{self.name}] Wake word detected!")
+            if self.greeting:
+                self.audio.play_sound(self.greeting, wait=False)
+            if self.on_wake:
+                self.on_wake(self)
+            self.busy = True
+            self._idle.clear()
+            submit(self, position, self.metrics.start_turn())
+            while not self._idle.wait(0.5) and not stop.is_set():
+                pass
+            reader.seek_to_latest()
+
+    def run_turn(self, position: int, spans):
+        """Record and answer one turn, from the wake position in the capture ring"""
+        try:
+            spans.mark("scheduled")
+            reader = self.engine.reader(position=position)
+            turn = self.pipeline.run(reader, self.recording, spans)
+            self.metrics.record_budget_misses(turn.budget_misses)
+            if turn.transcript:
+                self.metrics.record_turn(spans, turn.cancelled)
+            return turn
+        finally:
+            self.busy = False
+            self._idle.set()
+
+class RoomDaemon:
+    """Runs rooms side by side with one shared, bounded pool of turn workers
+
+    Each room's wake detection runs on its own thread (Porcupine, the
+    capture callback and the NumPy VAD spend their time in native code with
+    the GIL released). Turns go to worker threads, one per CPU core by
+    default, in the order the wake words were heard; as a room never has
+    more than one turn waiting, no room can starve the others. A turn that
+    waits for a worker loses nothing: it records from the capture ring,
+    starting at its wake position.
+    """
+
+    def __init__(self, rooms: List[Room], workers: int = 0,
+                 on_turn: Optional[Callable[[Room, object], None]] = None):
+        self.rooms = rooms
+        self.workers = min(workers or os.cpu_count() or 1, len(rooms)) or 1
+        self.on_turn = on_turn
+        self.turns = 0
+        self.failures = 0
+        self._queued = 0
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="room-turn")
+        self._threads: List[threading.Thread] = []
+
+    def _submit(self, room: Room, position: int, spans) -> None:
+        with self._lock:
+            self._queued += 1
+        self._executor.submit(self._run, room, position, spans)
+
+    def _run(self, room: Room, position: int, spans) -> None:
+        with self._lock:
+            self._queued -= 1
+        try:
+            turn = room.run_turn(position, spans)
+            with self._lock:
+                self.turns += 1
+            if self.on_turn and turn.transcript:
+                self.on_turn(room, turn)
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+            logger.error(f"[{room.name}] Turn failed: {e}")
+
+    def start(self) -> None:
+        self._stop.clear()
+        for room in self.rooms:
+            thread = threading.Thread(target=self._listen, args=(room,),
+                                      name=f"room-{room.name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Serving {len(self.rooms)} rooms with {self.workers} turn workers: "
+                    f"{', '.join(room.name for room in self.rooms)}")
+
+    def _listen(self, room: Room) -> None:
+        while not self._stop.is_set():
+            try:
+                room.listen(self._stop, self._submit)
+            except Exception as e:
+                logger.error(f"[{room.name}] Wake detection error: {e}")
+                time.sleep(2)
+
+    def run(self) -> None:
+        """Start every room and block until stop()"""
+        self.start()
+        try:
+            while not self._stop.wait(1.0):
+                pass
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        self._stop.set()
+        for room in self.rooms:
+            room.pipeline.cancel()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        self._threads = []
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {"rooms": len(self.rooms), "workers": self.workers,
+                    "busy": sum(room.busy for room in self.rooms), "queued": self._queued,
+                    "turns": self.turns, "failures": self.failures}
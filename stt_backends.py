@@ -0,0 +1,320 @@
+"""Speech-to-text backends: Whisper via the Groq API and offline Vosk"""
+import io
+import os
+import copy
+import json
+import wave
+import logging
+import threading
+import numpy as np
+from dataclasses import dataclass
+from typing import BinaryIO, Iterable, List, Optional
+from upload_audio import PreparedUpload, prepare_upload
+
+try:
+    import vosk
+except ImportError:
+    vosk = None
+
+logger = logging.getLogger(__name__)
+
+def to_mono_bytes(frames: np.ndarray) -> bytes:
+    """Downmix int16 (frames, channels) audio to mono 16-bit PCM bytes"""
+    if frames.ndim == 2 and frames.shape[1] > 1:
+        frames = frames.mean(axis=1).astype(np.int16)
+    return np.ascontiguousarray(frames, dtype=np.int16).tobytes()
+
+def upload_file(audio) -> BinaryIO:
+    """In-memory recordings are encoded to WAV; file objects are passed through"""
+    if hasattr(audio, "to_wav_file"):
+        return audio.to_wav_file()
+    return audio
+
+def upload_payload(audio) -> tuple:
+    """(filename, bytes) for the transcription request, which can be sent more than once"""
+    upload = upload_file(audio)
+    return os.path.basename(getattr(upload, "name", None) or "recording.wav"), upload.read()
+
+@dataclass(frozen=True)
+class Segment:
+    """Whisper's confidence in one segment of a transcript"""
+    start: float
+    end: float
+    avg_logprob: float
+    no_speech_prob: float
+    compression_ratio: float = 1.0
+
+    @property
+    def duration(self) -> float:
+        return max(self.end - self.start, 0.0)
+
+class Transcript(str):
+    """A transcript that also carries the recognizer's segments, when it reports them
+
+    It is used everywhere as a plain string; strip() keeps the segments.
+    """
+    segments: tuple = ()
+
+    def __new__(cls, text: str, segments: Iterable[Segment] = ()):
+        transcript = super().__new__(cls, text)
+        transcript.segments = tuple(segments)
+        return transcript
+
+    def strip(self, chars: Optional[str] = None) -> "Transcript":
+        return Transcript(super().strip(chars), self.segments)
+
+def _field(item, name: str, default=None):
+    """A field of the verbose response, which the client returns as objects or dicts"""
+    if isinstance(item, dict):
+        return item.get(name, default)
+    return getattr(item, name, default)
+
+def parse_verbose(response) -> Transcript:
+    """Transcript with segments from a verbose_json transcription response"""
+    segments = [Segment(float(_field(s, "start", 0.0)), float(_field(s, "end", 0.0)),
+                        float(_field(s, "avg_logprob", 0.0)), float(_field(s, "no_speech_prob", 0.0)),
+                        float(_field(s, "compression_ratio", 1.0) or 1.0))
+                for s in _field(response, "segments", None) or []]
+    return Transcript((_field(response, "text", "") or "").strip(), segments)
+
+class STTBackend:
+    """Interface for speech-to-text engines
+
+    Streaming backends decode frames passed to feed() while the user is still
+    talking, between begin() and transcribe(). Batch backends ignore feed()
+    and do all their work in transcribe().
+    """
+    name = "base"
+    streaming = False
+    early = False  # Can transcribe a snapshot before the endpoint is confirmed
+    last_upload: Optional[PreparedUpload] = None  # What the last API upload sent, if any
+
+    def begin(self) -> None:
+        """Start a new utterance"""
+
+    def feed(self, frames: np.ndarray) -> None:
+        """Decode captured int16 frames incrementally"""
+
+    def transcribe(self, audio) -> str:
+        """Return the transcript for the utterance (a PCMBuffer or WAV file object)
+
+        Backends that can report their confidence return a Transcript.
+        """
+        raise NotImplementedError
+
+    def transcribe_early(self, audio) -> str:
+        """Transcribe a snapshot taken when the speaker paused, without ending the utterance"""
+        raise NotImplementedError
+
+    def degrade(self, audio) -> Optional[str]:
+        """A quicker transcript once transcribe() has run over its budget, or None if there is none"""
+        return None
+
+    def fork(self) -> "STTBackend":
+        """A backend for another concurrent session, sharing clients and models
+
+        Only per-utterance state is duplicated, so each room of the
+        multi-room daemon can begin, feed and transcribe independently.
+        """
+        forked = copy.copy(self)
+        forked.last_upload = None
+        return forked
+
+class WhisperAPIBackend(STTBackend):
+    """Whisper through an OpenAI-compatible transcription endpoint
+
+    The verbose response is requested for its per-segment no-speech
+    probability and log probability, which the transcript gate uses to
+    drop transcripts of noise.
+    """
+    name = "whisper"
+    early = True
+
+    def __init__(self, client, model: str, language: str = "en",
+                 timeout: Optional[float] = None, hedger=None,
+                 upload_format: str = "flac", trim_silence: bool = True):
+        self.client = client
+        self.model = model
+        self.language = language
+        self.timeout = timeout
+        self.hedger = hedger  # Optional http_client.Hedger for slow uploads
+        self.upload_format = upload_format
+        self.trim_silence = trim_silence
+
+    def begin(self) -> None:
+        self.last_upload = None
+
+    def _payload(self, audio) -> tuple:
+        """In-memory recordings are downmixed, trimmed and compressed; files go as they are"""
+        if not hasattr(audio, "view"):
+            return upload_payload(audio)
+        upload = prepare_upload(audio.view(), audio.sample_rate, self.upload_format, self.trim_silence)
+        self.last_upload = upload
+        return upload.name, upload.data
+
+    def transcribe(self, audio) -> Transcript:
+        payload = self._payload(audio)
+
+        def request():
+            return self.client.audio.transcriptions.create(
+                model=self.model,
+                file=payload,
+                language=self.language,
+                response_format="verbose_json",
+                timeout=self.timeout
+            )
+        response = self.hedger.call("stt", request) if self.hedger else request()
+        return parse_verbose(response)
+
+    def transcribe_early(self, audio) -> Transcript:
+        return self.transcribe(audio)
+
+class VoskBackend(STTBackend):
+    """Offline Kaldi recognizer fed incrementally from the capture stream"""
+    name = "vosk"
+    streaming = True
+
+    def __init__(self, model_path: str, sample_rate: int = 16000, grammar: Optional[List[str]] = None):
+        if vosk is None:
+            raise RuntimeError("vosk is not installed")
+        vosk.SetLogLevel(-1)
+        self.sample_rate = sample_rate
+        self.model = vosk.Model(model_path)  # Loaded once, shared by every utterance
+        # A constrained grammar only recognizes these phrases (anything else becomes [unk])
+        self.grammar = json.dumps(list(grammar) + ["[unk]"]) if grammar else None
+        self._recognizer = None
+        self._fed = False
+        logger.info(f"Vosk model loaded from {model_path}")
+
+    def begin(self) -> None:
+        if self.grammar:
+            self._recognizer = vosk.KaldiRecognizer(self.model, self.sample_rate, self.grammar)
+        else:
+            self._recognizer = vosk.KaldiRecognizer(self.model, self.sample_rate)
+        self._fed = False
+
+    def feed(self, frames: np.ndarray) -> None:
+        if self._recognizer is None:
+            self.begin()
+        self._recognizer.AcceptWaveform(to_mono_bytes(frames))
+        self._fed = True
+
+    def _feed_file(self, audio: BinaryIO) -> None:
+        with wave.open(audio, "rb") as wf:
+            if wf.getframerate() != self.sample_rate:
+                raise ValueError(f"Vosk expects {self.sample_rate} Hz audio, got {wf.getframerate()} Hz")
+            data = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+            self.feed(data.reshape(-1, wf.getnchannels()))
+
+    def fork(self) -> "VoskBackend":
+        forked = super().fork()
+        forked._recognizer = None  # The loaded model is shared, recognizers are not
+        forked._fed = False
+        return forked
+
+    def transcribe(self, audio) -> str:
+        if not self._fed:
+            # Nothing was streamed in, decode the whole recording now
+            self.begin()
+            if hasattr(audio, "view"):
+                self.feed(audio.view())
+            else:
+                self._feed_file(audio)
+        result = json.loads(self._recognizer.FinalResult())
+        self._recognizer = None
+        self._fed = False
+        return result.get("text", "").replace("[unk]", "").strip()
+
+class FallbackSTTBackend(STTBackend):
+    """Uses the primary backend and falls back to a streaming one on failure
+
+    The fallback is fed during recording too, so when the API is unreachable
+    its transcript is already available at the endpoint.
+    """
+
+    def __init__(self, primary: STTBackend, fallback: STTBackend):
+        self.primary = primary
+        self.fallback = fallback
+        self.name = f"{primary.name}+{fallback.name}"
+        self.streaming = primary.streaming or fallback.streaming
+        self.early = primary.early
+        self.fallbacks = 0
+        self._utterance = 0  # Bumped per utterance, so an abandoned request leaves the next one alone
+        self._lock = threading.Lock()
+
+    @property
+    def last_upload(self) -> Optional[PreparedUpload]:
+        return self.primary.last_upload
+
+    def fork(self) -> "FallbackSTTBackend":
+        return FallbackSTTBackend(self.primary.fork(), self.fallback.fork())
+
+    def begin(self) -> None:
+        with self._lock:
+            self._utterance += 1
+            self.primary.begin()
+            self.fallback.begin()
+
+    def feed(self, frames: np.ndarray) -> None:
+        self.primary.feed(frames)
+        self.fallback.feed(frames)
+
+    def transcribe(self, audio) -> str:
+        utterance = self._utterance
+        try:
+            transcript = self.primary.transcribe(audio)
+        except Exception as e:
+            with self._lock:
+                if utterance != self._utterance:
+                    raise  # Abandoned; the fallback's state belongs to a newer utterance
+                self.fallbacks += 1
+                logger.warning(f"{self.primary.name} transcription failed, using {self.fallback.name}: {e}")
+                if isinstance(audio, io.IOBase):
+                    audio.seek(0)
+                return self.fallback.transcribe(audio)
+        with self._lock:
+            if utterance == self._utterance:
+                # Discard the fallback's partial decode for this utterance
+                self.fallback.begin()
+        return transcript
+
+    def degrade(self, audio) -> Optional[str]:
+        """The fallback's transcript, already decoded while recording"""
+        with self._lock:
+            self._utterance += 1  # The primary's late result is ignored
+            self.fallbacks += 1
+            if isinstance(audio, io.IOBase):
+                audio.seek(0)
+            return self.fallback.transcribe(audio)
+
+    def transcribe_early(self, audio) -> str:
+        # A failure here is retried through transcribe(), which can fall back
+        return self.primary.transcribe_early(audio)
+
+def create_stt_backend(kind: str, client, whisper_model: str, vosk_model_path: str,
+                       sample_rate: int = 16000, language: str = "en",
+                       timeout: Optional[float] = None, hedger=None,
+                       grammar: Optional[List[str]] = None, upload_format: str = "flac",
+                       trim_silence: bool = True) -> STTBackend:
+    """Build the backend selected by kind: 'whisper', 'vosk' or 'auto'
+
+    'auto' prefers the Whisper API with Vosk as an offline fallback, and uses
+    Whisper alone when Vosk or its model is unavailable. grammar constrains
+    Vosk to a fixed set of command phrases.
+    """
+    whisper = WhisperAPIBackend(client, whisper_model, language, timeout, hedger,
+                                upload_format, trim_silence)
+    if kind == "whisper":
+        return whisper
+    try:
+        local: Optional[STTBackend] = VoskBackend(vosk_model_path, sample_rate, grammar)
+    except Exception as e:
+        if kind == "vosk":
+            raise
+        logger.warning(f"Vosk unavailable, using Whisper only: {e}")
+        local = None
+    if kind == "vosk":
+        return local
+    if kind != "auto":
+        raise ValueError(f"Unknown STT backend: {kind}")
+    return FallbackSTTBackend(whisper, local) if local else whisper
@@ -0,0 +1,54 @@
+"""Regression tests for matching rephrased questions in the answer cache"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from answer_cache import AnswerCache
+
+# (cached question, its answer, a different question that used to get that answer)
+WRONG_MATCHES = [
+    ("Convert 5 kilometers to miles", "5 kilometers is about 3.1 miles.", "Convert 5 miles to kilometers"),
+    ("Who was the first man on the moon?", "Neil Armstrong.", "Who was the first woman on the moon?"),
+    ("What is the population of China?", "About 1.4 billion people.", "population of Chile"),
+    ("What is the square root of two?", "About 1.414.", "square root of ten"),
+    ("How far away is the moon?", "About 384,000 kilometres.", "How far away is the sun?"),
+]
+
+# (cached question, a rephrasing that should get the same answer)
+REPHRASINGS = [
+    ("What's the tallest mountain in the world?", "um, what is the tallest mountain in the world"),
+    ("What is the difference between a crocodile and an alligator?",
+     "what's the difference between crocodile and alligator"),
+    ("Who wrote Pride and Prejudice?", "who wrote the pride and prejudice"),
+]
+
+@pytest.mark.parametrize("cached, answer, question", WRONG_MATCHES)
+def test_different_question_is_not_matched(cached, answer, question):
+    cache = AnswerCache()
+    cache.put(cached, answer)
+    assert cache.get(question) is None
+
+@pytest.mark.parametrize("cached, question", REPHRASINGS)
+def test_rephrasing_is_matched(cached, question):
+    cache = AnswerCache()
+    cache.put(cached, "The answer.")
+    assert cache.get(question).answer == "The answer."
+
+def test_least_recently_used_is_evicted():
+    cache = AnswerCache(capacity=2)
+    cache.put("capital of france", "Paris.")
+    cache.put("capital of spain", "Madrid.")
+    assert cache.get("The capital of France?")
+    cache.put("capital of italy", "Rome.")
+    assert cache.get("capital of spain") is None
+    assert cache.get("capital of france").answer == "Paris."
+    assert cache.stats()["evictions"] == 1
+
+def test_expired_answer_is_not_returned():
+    now = [0.0]
+    cache = AnswerCache(ttl=10, clock=lambda: now[0])
+    cache.put("How tall is Mount Everest?", "8,849 metres.")
+    now[0] = 11
+    assert cache.get("How tall is Mount Everest?") is None
@@ -0,0 +1,46 @@
+"""Voices in the output mixer finish, so the player does not keep them forever"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+
+try:
+    from audio_player import ClipQueue, MixScratch
+except (ImportError, OSError) as e:  # sounddevice, or the PortAudio library it loads
+    pytest.skip(f"audio output unavailable: {e}", allow_module_level=True)
+
+RATE = 48000
+
+def mix(voice, frames: int = 256) -> np.ndarray:
+    out = np.zeros((frames, 2), dtype=np.float32)
+    voice.mix_into(out, MixScratch(frames, 2))
+    return out
+
+def test_idle_queue_stays_alive_until_closed():
+    speech = ClipQueue(RATE)
+    mix(speech)
+    assert not speech.done
+    speech.close()
+    mix(speech)
+    assert speech.done
+
+def test_stopping_an_idle_unclosed_queue_finishes_it():
+    speech = ClipQueue(RATE)
+    speech.append(np.full((100, 2), 0.5, dtype=np.float32))
+    mix(speech)  # Plays the only clip, then waits for the next
+    assert not speech.done
+    speech.stop(fade_out=0.02)  # As barge-in and cancel do
+    mix(speech)
+    assert speech.done
+
+def test_fade_out_with_a_clip_playing_finishes():
+    speech = ClipQueue(RATE)
+    speech.append(np.full((RATE, 2), 0.5, dtype=np.float32))
+    mix(speech)
+    speech.stop(fade_out=0.002)
+    for _ in range(4):
+        mix(speech)
+    assert speech.done
@@ -0,0 +1,31 @@
+"""The echo reference is the output that was playing when the microphone frame was captured"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+
+try:
+    from barge_in import ReferenceTap
+except (ImportError, OSError) as e:  # sounddevice, or the PortAudio library it loads
+    pytest.skip(f"audio capture unavailable: {e}", allow_module_level=True)
+
+RATE = 16000
+
+def play(tap: ReferenceTap, blocks) -> None:
+    for value in blocks:
+        tap.write(np.full((1600, 2), value, dtype=np.float32))
+
+def test_reference_is_picked_by_age_not_recency():
+    tap = ReferenceTap(RATE)
+    play(tap, [0.1, 0.2, 0.3, 0.4, 0.5])  # 100 ms blocks
+    assert np.allclose(tap.around(0.35, 800, RATE), 0.2)
+    assert np.allclose(tap.around(0.05, 800, RATE), 0.5)
+
+def test_overwritten_output_is_silence_and_future_output_is_the_newest():
+    tap = ReferenceTap(RATE, seconds=0.5)
+    play(tap, [0.1] * 10)
+    assert not tap.around(0.8, 800, RATE).any()
+    assert np.allclose(tap.around(-1.0, 800, RATE), 0.1)
@@ -0,0 +1,34 @@
+"""Hedged requests: the latency window sees slow first requests even when their duplicate wins"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+try:
+    from http_client import Hedger
+except ImportError as e:  # httpx
+    pytest.skip(f"http client unavailable: {e}", allow_module_level=True)
+
+def test_losing_first_request_is_still_observed():
+    hedger = Hedger(percentile=0.5, min_samples=2)
+    for _ in range(2):
+        hedger.call("stt", lambda: time.sleep(0.01))
+    attempts = []
+
+    def request():
+        attempts.append(None)
+        if len(attempts) == 1:
+            time.sleep(0.3)
+            return "slow"
+        return "fast"
+
+    assert hedger.call("stt", request) == "fast"
+    assert hedger.stats()["hedge_wins"] == 1
+    deadline = time.monotonic() + 2
+    while hedger._histograms["stt"].count < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert hedger._histograms["stt"].count == 3
+    assert hedger.stats()["calls"] == 3
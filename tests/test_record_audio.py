@@ -0,0 +1,60 @@
+"""Recording starts after the wake word and keeps a pre-roll before the speech onset"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+
+try:
+    import voxMate
+except (ImportError, OSError) as e:  # Porcupine, the OpenAI client or PortAudio
+    pytest.skip(f"voxMate dependencies unavailable: {e}", allow_module_level=True)
+from audio_capture import RingBuffer
+from vad import VoiceActivityDetector
+
+RATE = voxMate.SAMPLE_RATE
+
+def speech(seconds: float, rng: np.random.Generator) -> np.ndarray:
+    """Loud voiced-sounding audio: harmonics of a 150 Hz pitch"""
+    t = np.arange(int(seconds * RATE)) / RATE
+    wave = sum(np.sin(2 * np.pi * 150 * k * t) / k for k in range(1, 8))
+    return 0.3 * wave / np.abs(wave).max() + 0.001 * rng.standard_normal(len(t))
+
+def silence(seconds: float, rng: np.random.Generator) -> np.ndarray:
+    return 0.001 * rng.standard_normal(int(seconds * RATE))
+
+def to_pcm(samples: np.ndarray) -> np.ndarray:
+    mono = np.clip(samples * 32767, -32768, 32767).astype(np.int16)
+    return np.repeat(mono[:, None], voxMate.CHANNELS, axis=1)
+
+def test_pause_after_wake_word_does_not_end_the_recording():
+    rng = np.random.default_rng(0)
+    # Tail of the wake word, a pause longer than the hangover, the request, then quiet
+    tail, pause, request = speech(0.25, rng), silence(1.0, rng), speech(1.0, rng)
+    audio = to_pcm(np.concatenate([silence(0.5, rng), tail, pause, request, silence(1.5, rng)]))
+    wake_position = int(0.75 * RATE)
+    onset = wake_position + len(pause)
+
+    ring = RingBuffer(len(audio) + RATE, voxMate.CHANNELS)
+    ring.write(audio)
+    vad = VoiceActivityDetector(sample_rate=RATE, frame_ms=voxMate.VAD_FRAME_MS,
+                                margin_db=voxMate.VAD_MARGIN_DB)
+    vad.calibrate(audio[:wake_position - len(tail)])
+    reader = ring.reader(wake_position)
+    frames = []
+
+    recording = voxMate.AudioProcessor.record_audio(reader, vad, on_frames=frames.append)
+
+    request_seconds = len(request) / RATE
+    # The request, preceded by up to PREROLL_SECONDS of the pause and followed by the hangover
+    assert recording.duration >= request_seconds
+    assert recording.duration <= (request_seconds + voxMate.PREROLL_SECONDS
+                                  + voxMate.VAD_HANGOVER_MS / 1000 + 0.1)
+    assert reader.position > onset + len(request)
+    # It starts with pre-roll from the pause, not with the wake word's tail
+    recorded = recording.view()[:, 0].astype(np.float32) / 32768
+    first_loud = int(np.argmax(np.abs(recorded) > 0.05)) / RATE
+    assert 0.1 <= first_loud <= voxMate.PREROLL_SECONDS
+    assert sum(len(f) for f in frames) == recording.frames
@@ -0,0 +1,110 @@
+"""Drops transcripts of noise and silence before they reach the LLM"""
+import re
+import logging
+import threading
+import unicodedata
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# What Whisper tends to write for silence, breathing or background noise,
+# learnt from subtitled video; compared after normalize_transcript
+HALLUCINATIONS = (
+    "you", "thank you", "thank you very much", "thanks", "thanks for watching",
+    "thank you for watching", "thank you so much for watching", "thanks for listening",
+    "thank you for listening", "please subscribe", "like and subscribe",
+    "subscribe to my channel", "see you next time", "see you in the next video",
+    "bye", "bye bye", "okay", "oh", "hmm", "uh", "um", "so", "the end",
+    "subtitles by the amara org community", "transcription by castingwords",
+    "music", "applause", "laughter", "silence", "foreign",
+)
+
+REASONS = ("empty", "no_speech", "low_confidence", "repetition", "vad", "hallucination")
+
+NOISE_TAGS = re.compile(r"\[[^\]]*\]|\([^)]*\)|\*[^*]*\*")  # [Music], (upbeat music), *sighs*
+
+def normalize_transcript(text: str) -> str:
+    """Lowercase and drop noise tags and punctuation (including '♪')"""
+    text = NOISE_TAGS.sub(" ", unicodedata.normalize("NFKC", text).lower())
+    return " ".join(re.sub(r"[^\w\s']", " ", text).replace("'", "").split())
+
+class TranscriptGate:
+    """Decides whether a transcript is worth an LLM request
+
+    check() returns why a transcript should be dropped, or None to keep it:
+
+      - empty: nothing but punctuation or bracketed noise tags
+      - no_speech: most of it (by duration) is in segments Whisper itself
+        thinks are silence, no_speech_prob over no_speech_prob and
+        avg_logprob under logprob
+      - low_confidence: duration-weighted avg_logprob under min_avg_logprob
+      - repetition: a segment compresses better than max_compression_ratio,
+        Whisper looping on a phrase
+      - vad: the VAD heard speech in less than min_speech_ratio of the
+        recording after the first speech frame
+      - hallucination: a phrase from the table, unless the recording was
+        clearly speech (speech_ratio of at least trusted_speech_ratio and no
+        segment over suspect_no_speech_prob)
+
+    Segment checks need a Transcript with segments (the Whisper backend);
+    other transcripts are judged on their text and speech ratio only.
+    """
+
+    def __init__(self, no_speech_prob: float = 0.6, logprob: float = -1.0,
+                 min_avg_logprob: float = -1.5, max_compression_ratio: float = 2.4,
+                 min_speech_ratio: float = 0.1, trusted_speech_ratio: float = 0.5,
+                 suspect_no_speech_prob: float = 0.2, phrases: Iterable[str] = HALLUCINATIONS):
+        self.no_speech_prob = no_speech_prob
+        self.logprob = logprob
+        self.min_avg_logprob = min_avg_logprob
+        self.max_compression_ratio = max_compression_ratio
+        self.min_speech_ratio = min_speech_ratio
+        self.trusted_speech_ratio = trusted_speech_ratio
+        self.suspect_no_speech_prob = suspect_no_speech_prob
+        self.phrases = frozenset(normalize_transcript(phrase) for phrase in phrases)
+        self.checked = 0
+        self.rejected: Dict[str, int] = dict.fromkeys(REASONS, 0)
+        self._lock = threading.Lock()
+
+    def _reason(self, transcript: str, speech_ratio: Optional[float]) -> Optional[str]:
+        text = normalize_transcript(transcript)
+        if not text:
+            return "empty"
+        segments = [s for s in getattr(transcript, "segments", ()) if s.duration > 0]
+        if segments:
+            total = sum(s.duration for s in segments)
+            silent = sum(s.duration for s in segments
+                         if s.no_speech_prob > self.no_speech_prob and s.avg_logprob < self.logprob)
+            if silent > total / 2:
+                return "no_speech"
+            if sum(s.avg_logprob * s.duration for s in segments) / total < self.min_avg_logprob:
+                return "low_confidence"
+            if any(s.compression_ratio > self.max_compression_ratio for s in segments):
+                return "repetition"
+        if speech_ratio is not None and speech_ratio < self.min_speech_ratio:
+            return "vad"
+        if text in self.phrases:
+            trusted = (speech_ratio is not None and speech_ratio >= self.trusted_speech_ratio
+                       and all(s.no_speech_prob <= self.suspect_no_speech_prob for s in segments))
+            if not trusted:
+                return "hallucination"
+        return None
+
+    def check(self, transcript: str, speech_ratio: Optional[float] = None) -> Optional[str]:
+        """Why transcript should be dropped, or None to pass it on"""
+        reason = self._reason(transcript, speech_ratio)
+        with self._lock:
+            self.checked += 1
+            if reason:
+                self.rejected[reason] += 1
+        return reason
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            rejected = sum(self.rejected.values())
+            return {
+                "checked": self.checked,
+                "rejected": rejected,
+                "rejection_rate": round(rejected / self.checked, 3) if self.checked else 0.0,
+                **{f"rejected_{reason}": count for reason, count in self.rejected.items()}
+            }
@@ -0,0 +1,129 @@
+"""Text-to-speech backends: gTTS (network, MP3) and a local pyttsx3 engine (offline, PCM)"""
+import io
+import os
+import wave
+import logging
+import tempfile
+import threading
+import numpy as np
+from gtts import gTTS
+from typing import Dict, Optional, Tuple
+
+try:
+    import pyttsx3
+except ImportError:
+    pyttsx3 = None
+
+logger = logging.getLogger(__name__)
+
+# RAM-backed on Linux, so rendering never touches the SD card
+SCRATCH_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+class TTSBackend:
+    """Interface for speech synthesis engines
+
+    Remote backends return encoded audio from synthesize(), which is cached on
+    disk. Local backends render PCM with render() straight into the player.
+    """
+    name = "base"
+    local = False
+    extension = "mp3"
+
+    @property
+    def voice(self) -> Dict[str, str]:
+        """Settings that change the audio, used in cache keys"""
+        return {}
+
+    def synthesize(self, text: str) -> bytes:
+        """Encoded audio file contents for text"""
+        raise NotImplementedError
+
+    def render(self, text: str) -> Tuple[np.ndarray, int]:
+        """int16 (frames, channels) PCM and its sample rate for text"""
+        raise NotImplementedError
+
+class GTTSBackend(TTSBackend):
+    """Google Translate TTS over the network, returning MP3"""
+    name = "gtts"
+
+    def __init__(self, lang: str = 'en', tld: str = 'com'):
+        self.lang = lang
+        self.tld = tld
+
+    @property
+    def voice(self) -> Dict[str, str]:
+        return {"lang": self.lang, "tld": self.tld}
+
+    def synthesize(self, text: str) -> bytes:
+        audio = io.BytesIO()
+        gTTS(text=text, lang=self.lang, tld=self.tld).write_to_fp(audio)
+        return audio.getvalue()
+
+    def render(self, text: str) -> Tuple[np.ndarray, int]:
+        from audio_player import decode_audio
+        fd, path = tempfile.mkstemp(suffix='.mp3', dir=SCRATCH_DIR)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self.synthesize(text))
+            data, rate = decode_audio(path)
+            return (data * 32767).astype(np.int16), rate
+        finally:
+            os.unlink(path)
+
+class Pyttsx3Backend(TTSBackend):
+    """Offline speech through a pyttsx3 engine that is initialized once
+
+    pyttsx3 can only render to a file, so it renders into RAM-backed scratch
+    space and the PCM is read back immediately. The engine is not thread-safe,
+    so renders are serialized.
+    """
+    name = "pyttsx3"
+    local = True
+    extension = "wav"
+
+    def __init__(self, rate: int = 150, voice_id: Optional[str] = None):
+        if pyttsx3 is None:
+            raise RuntimeError("pyttsx3 is not installed")
+        self.rate = rate
+        self.voice_id = voice_id
+        self._engine = pyttsx3.init()
+        self._engine.setProperty('rate', rate)
+        if voice_id:
+            self._engine.setProperty('voice', voice_id)
+        self._lock = threading.Lock()
+        logger.info("Local TTS engine initialized")
+
+    @property
+    def voice(self) -> Dict[str, str]:
+        return {"rate": str(self.rate), "voice": self.voice_id or "default"}
+
+    def render(self, text: str) -> Tuple[np.ndarray, int]:
+        fd, path = tempfile.mkstemp(suffix='.wav', dir=SCRATCH_DIR)
+        os.close(fd)
+        try:
+            with self._lock:
+                self._engine.save_to_file(text, path)
+                self._engine.runAndWait()
+            with wave.open(path, 'rb') as wf:
+                data = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+                return data.reshape(-1, wf.getnchannels()), wf.getframerate()
+        finally:
+            os.unlink(path)
+
+    def synthesize(self, text: str) -> bytes:
+        data, rate = self.render(text)
+        audio = io.BytesIO()
+        with wave.open(audio, 'wb') as wf:
+            wf.setnchannels(data.shape[1])
+            wf.setsampwidth(2)
+            wf.setframerate(rate)
+            wf.writeframes(data.tobytes())
+        return audio.getvalue()
+
+def create_local_tts_backend(rate: int = 150) -> Optional[TTSBackend]:
+    """The offline engine, or None when it cannot be initialized"""
+    try:
+        return Pyttsx3Backend(rate=rate)
+    except Exception as e:
+        logger.warning(f"Local TTS unavailable: {e}")
+        return None
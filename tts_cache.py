@@ -0,0 +1,143 @@
+"""Persistent content-addressed cache of synthesized speech"""
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different strings share one cache entry"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+class TTSCache:
+    """Size-bounded LRU cache of audio files keyed on text, language and voice
+
+    Entries live in one directory as <sha256>.<ext>. Recency is persisted in
+    the file modification time, so the LRU order survives restarts. Writes go
+    to a temporary file first and are moved into place atomically.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, extension: str = "mp3"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.extension = extension
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self) -> None:
+        suffix = f".{self.extension}"
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(suffix):
+                stat = os.stat(path)
+                files.append((stat.st_mtime, name[:-len(suffix)], stat.st_size))
+            elif name.startswith(".tmp"):
+                os.unlink(path)  # Left over from an interrupted write
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._size += size
+        self._evict()
+        logger.debug(f"TTS cache: {len(self._entries)} entries, {self._size / 1e6:.1f} MB")
+
+    @staticmethod
+    def make_key(text: str, **voice) -> str:
+        """Key on the normalized text plus every setting that changes the audio"""
+        payload = json.dumps({"text": normalize_text(text), **voice}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.{self.extension}")
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached file path and mark it recently used, or None"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Removed behind our back; treat as a miss
+            with self._lock:
+                self._size -= self._entries.pop(key, 0)
+                self.hits -= 1
+                self.misses += 1
+            return None
+        return path
+
+    def put(self, key: str, data: bytes) -> str:
+        """Atomically store data under key and return its path"""
+        path = self.path_for(key)
+        fd, temp_path = tempfile.mkstemp(prefix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+        except Exception:
+            os.unlink(temp_path)
+            raise
+        with self._lock:
+            self._size += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._evict()
+        return path
+
+    def _evict(self) -> None:
+        # Never evict the newest entry, even if it alone exceeds the budget
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            try:
+                os.unlink(self.path_for(key))
+            except FileNotFoundError:
+                pass
+
+    def get_or_create(self, key: str, synthesize: Callable[[], bytes]) -> str:
+        """Return the cached path for key, synthesizing and storing it on a miss"""
+        path = self.get(key)
+        if path is None:
+            path = self.put(key, synthesize())
+        return path
+
+    def prewarm(self, phrases: Iterable[str], synthesize: Callable[[str], str]) -> int:
+        """Synthesize phrases ahead of time; synthesize should go through this cache"""
+        warmed = 0
+        for phrase in phrases:
+            try:
+                synthesize(phrase)
+                warmed += 1
+            except Exception as e:
+                logger.warning(f"Could not pre-warm TTS phrase '{phrase}': {e}")
+        logger.info(f"TTS cache pre-warmed {warmed} phrases ({self.stats()})")
+        return warmed
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
@@ -0,0 +1,100 @@
+"""Upload preprocessing: mono downmix, silence trimming and compressed in-memory encoding"""
+import io
+import wave
+import logging
+import numpy as np
+from dataclasses import dataclass
+from typing import Tuple
+
+try:
+    import soundfile
+except (ImportError, OSError):  # OSError when libsndfile itself is missing
+    soundfile = None
+
+logger = logging.getLogger(__name__)
+
+EPSILON = 1e-10
+WAV_HEADER_BYTES = 44
+FORMATS = {  # name -> (soundfile format, subtype, file extension)
+    "flac": ("FLAC", "PCM_16", "flac"),
+    "opus": ("OGG", "OPUS", "ogg"),
+}
+
+@dataclass
+class PreparedUpload:
+    name: str
+    data: bytes
+    format: str
+    raw_bytes: int  # Size of the untouched WAV that used to be uploaded
+    duration: float  # Seconds of audio actually sent
+    trimmed: float  # Seconds of leading and trailing silence removed
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+def downmix(frames: np.ndarray) -> np.ndarray:
+    """int16 (frames, channels) to mono int16, averaging the channels"""
+    if frames.ndim == 1:
+        return frames
+    if frames.shape[1] == 1:
+        return frames[:, 0]
+    return (frames.sum(axis=1, dtype=np.int32) // frames.shape[1]).astype(np.int16)
+
+def speech_bounds(mono: np.ndarray, sample_rate: int, margin_db: float = 10.0,
+                  frame_ms: int = 20, pad_ms: int = 200) -> Tuple[int, int]:
+    """Sample range from the first to the last frame above the noise floor, padded
+
+    The floor is the 10th percentile of frame energies: recordings start with
+    pre-roll and end with the endpointer hangover, so their quietest frames
+    are room noise.
+    """
+    frame = sample_rate * frame_ms // 1000
+    count = len(mono) // frame
+    if count < 2:
+        return 0, len(mono)
+    frames = mono[:count * frame].reshape(count, frame).astype(np.float32) / 32768.0
+    energy_db = 10 * np.log10(np.mean(frames ** 2, axis=1) + EPSILON)
+    loud = np.flatnonzero(energy_db > np.percentile(energy_db, 10) + margin_db)
+    if not len(loud):
+        return 0, len(mono)  # Nothing stands out, send it all rather than nothing
+    pad = sample_rate * pad_ms // 1000
+    return max(loud[0] * frame - pad, 0), min((loud[-1] + 1) * frame + pad, len(mono))
+
+def encode_wav(mono: np.ndarray, sample_rate: int) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(mono.tobytes())
+    return buffer.getvalue()
+
+def encode(mono: np.ndarray, sample_rate: int, fmt: str = "flac") -> Tuple[bytes, str]:
+    """Encode mono int16 audio in memory, returning (data, format used)
+
+    FLAC is lossless and roughly halves speech; Opus is far smaller but lossy.
+    Both need soundfile; without it (or on an encoder error) WAV is used.
+    """
+    if fmt in FORMATS and soundfile is not None:
+        container, subtype, _ = FORMATS[fmt]
+        buffer = io.BytesIO()
+        try:
+            soundfile.write(buffer, mono, sample_rate, format=container, subtype=subtype)
+            return buffer.getvalue(), fmt
+        except Exception as e:
+            logger.warning(f"{fmt} encoding failed, uploading WAV: {e}")
+    elif fmt != "wav":
+        logger.debug(f"soundfile unavailable, uploading WAV instead of {fmt}")
+    return encode_wav(mono, sample_rate), "wav"
+
+def prepare_upload(frames: np.ndarray, sample_rate: int, fmt: str = "flac",
+                   trim: bool = True, name: str = "recording") -> PreparedUpload:
+    """Downmix, trim and encode captured int16 frames for the transcription API"""
+    raw_bytes = frames.nbytes + WAV_HEADER_BYTES
+    mono = downmix(frames)
+    start, end = speech_bounds(mono, sample_rate) if trim else (0, len(mono))
+    data, used = encode(np.ascontiguousarray(mono[start:end]), sample_rate, fmt)
+    extension = FORMATS[used][2] if used in FORMATS else "wav"
+    return PreparedUpload(f"{name}.{extension}", data, used, raw_bytes,
+                          (end - start) / sample_rate, (len(mono) - (end - start)) / sample_rate)
@@ -0,0 +1,199 @@
+"""Frame-level voice activity detection with an adaptive noise floor"""
+import os
+import re
+import json
+import logging
+import numpy as np
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EPSILON = 1e-10
+
+def to_mono_float(samples: np.ndarray) -> np.ndarray:
+    """Downmix int16 (frames, channels) or (frames,) audio to mono float32 in [-1, 1]"""
+    samples = np.asarray(samples)
+    if samples.ndim == 2:
+        samples = samples.mean(axis=1, dtype=np.float32)
+    return samples.astype(np.float32, copy=False) / 32768.0
+
+def frame_features(frames: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Energy (dB), zero-crossing rate and spectral flatness for each row of frames
+
+    frames is a (n_frames, frame_length) float array; every feature is
+    computed for the whole batch at once.
+    """
+    energy_db = 10 * np.log10(np.mean(frames ** 2, axis=1) + EPSILON)
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (frames.shape[1] - 1)
+    window = np.hanning(frames.shape[1]).astype(np.float32)
+    power = np.abs(np.fft.rfft(frames * window, axis=1)) ** 2 + EPSILON
+    flatness = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+    return energy_db, zcr, flatness
+
+class VoiceActivityDetector:
+    """Classifies short frames as speech or noise against a rolling noise floor
+
+    The noise floor is a low percentile of recent frame energies, so it follows
+    the room as it gets louder or quieter. A frame counts as speech when it is
+    margin_db above the floor, is not a flat (noise-like) spectrum unless it is
+    very loud, and crosses zero often enough to not be mains hum.
+    """
+
+    def __init__(self, sample_rate: int = 16000, frame_ms: int = 20,
+                 margin_db: float = 10.0, noise_percentile: float = 20.0,
+                 noise_window_s: float = 10.0, flatness_max: float = 0.5,
+                 zcr_min: float = 0.01, initial_floor_db: float = -60.0):
+        if not 10 <= frame_ms <= 30:
+            raise ValueError("VAD frames must be between 10 and 30 ms")
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.frame_length = sample_rate * frame_ms // 1000
+        self.margin_db = margin_db
+        self.noise_percentile = noise_percentile
+        self.flatness_max = flatness_max
+        self.zcr_min = zcr_min
+        self._history = np.full(int(noise_window_s * 1000 / frame_ms), initial_floor_db, dtype=np.float32)
+        self._history_pos = 0
+        self._remainder = np.zeros(0, dtype=np.float32)
+        self.noise_floor_db = initial_floor_db
+
+    def ms_to_frames(self, ms: float) -> int:
+        return max(int(round(ms / self.frame_ms)), 1)
+
+    def _update_floor(self, energy_db: np.ndarray) -> None:
+        size = len(self._history)
+        energy_db = energy_db[-size:]
+        index = (self._history_pos + np.arange(len(energy_db))) % size
+        self._history[index] = energy_db
+        self._history_pos = (self._history_pos + len(energy_db)) % size
+        self.noise_floor_db = float(np.percentile(self._history, self.noise_percentile))
+
+    def _frames(self, samples: np.ndarray) -> np.ndarray:
+        """Split mono samples into whole frames, carrying the remainder over"""
+        samples = np.concatenate((self._remainder, samples)) if len(self._remainder) else samples
+        count = len(samples) // self.frame_length
+        self._remainder = samples[count * self.frame_length:].copy()
+        return samples[:count * self.frame_length].reshape(count, self.frame_length)
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """Return one speech/non-speech decision per complete frame in samples"""
+        frames = self._frames(to_mono_float(samples))
+        if not len(frames):
+            return np.zeros(0, dtype=bool)
+        energy_db, zcr, flatness = frame_features(frames)
+        threshold = self.noise_floor_db + self.margin_db
+        speech = (
+            (energy_db > threshold)
+            & ((flatness < self.flatness_max) | (energy_db > threshold + self.margin_db))
+            & (zcr >= self.zcr_min)
+        )
+        self._update_floor(energy_db)
+        return speech
+
+    def calibrate(self, samples: np.ndarray) -> float:
+        """Seed the noise floor from ambient (speech-free) audio"""
+        self._remainder = np.zeros(0, dtype=np.float32)
+        frames = self._frames(to_mono_float(samples))
+        self._remainder = np.zeros(0, dtype=np.float32)
+        if len(frames):
+            energy_db, _, _ = frame_features(frames)
+            # Tile the ambient energies over the whole window so the floor starts from them
+            self._history[:] = np.resize(energy_db, len(self._history))
+            self._history_pos = 0
+            self.noise_floor_db = float(np.percentile(self._history, self.noise_percentile))
+        logger.info(f"VAD noise floor calibrated to {self.noise_floor_db:.1f} dBFS")
+        return self.noise_floor_db
+
+    @staticmethod
+    def profile_path(directory: str, device_name: str) -> str:
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", device_name).strip("_").lower() or "default"
+        return os.path.join(directory, f"{slug}.json")
+
+    def save_profile(self, directory: str, device_name: str) -> None:
+        """Store the calibrated noise floor for this input device"""
+        path = self.profile_path(directory, device_name)
+        os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({
+                "device": device_name,
+                "frame_ms": self.frame_ms,
+                "noise_floor_db": self.noise_floor_db
+            }, f, indent=2)
+
+    def load_profile(self, directory: str, device_name: str) -> bool:
+        """Start from a previously saved noise floor. Returns False if there is none"""
+        path = self.profile_path(directory, device_name)
+        try:
+            with open(path) as f:
+                profile = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable VAD profile {path}: {e}")
+            return False
+        self.noise_floor_db = float(profile["noise_floor_db"])
+        self._history[:] = self.noise_floor_db
+        logger.debug(f"Loaded VAD profile for '{device_name}' ({self.noise_floor_db:.1f} dBFS)")
+        return True
+
+class Endpointer:
+    """Turns frame decisions into start/end of utterance with a hangover
+
+    The utterance ends once hangover_ms of non-speech follows speech, or after
+    no_speech_ms if nobody started talking at all. Counting is done in frames,
+    so the timing is exact regardless of how late audio is processed.
+    """
+
+    def __init__(self, vad: VoiceActivityDetector, hangover_ms: float = 600,
+                 no_speech_ms: float = 5000, min_speech_ms: float = 60):
+        self.hangover_frames = vad.ms_to_frames(hangover_ms)
+        self.no_speech_frames = vad.ms_to_frames(no_speech_ms)
+        self.min_speech_frames = vad.ms_to_frames(min_speech_ms)
+        self.reset()
+
+    def reset(self) -> None:
+        self.frames = 0
+        self.speech_frames = 0
+        self.onset: Optional[int] = None  # Frame of the first speech decision
+        self.silent_run = 0
+        self.triggered = False
+        self.ended = False
+
+    @property
+    def in_speech(self) -> bool:
+        """True while speech is ongoing or within the hangover after it"""
+        return self.triggered and self.silent_run < self.hangover_frames
+
+    def update(self, decisions: np.ndarray) -> bool:
+        """Feed frame decisions; returns True once the utterance has ended"""
+        for is_speech in decisions:
+            self.frames += 1
+            if is_speech:
+                if self.onset is None:
+                    self.onset = self.frames - 1
+                self.speech_frames += 1
+                self.silent_run = 0
+                if self.speech_frames >= self.min_speech_frames:
+                    self.triggered = True
+            else:
+                self.silent_run += 1
+            if self.triggered and self.silent_run >= self.hangover_frames:
+                self.ended = True
+            elif not self.triggered and self.frames >= self.no_speech_frames:
+                self.ended = True
+            if self.ended:
+                break
+        return self.ended
+
+    @property
+    def speech_ratio(self) -> float:
+        """Fraction of the frames from the first speech on that were speech
+
+        The wait for the speaker to start is left out, so a short command
+        said after a pause scores as high as one said straight away, while
+        a click or a cough followed by the hangover scores low.
+        """
+        if self.onset is None:
+            return 0.0
+        return self.speech_frames / (self.frames - self.onset)
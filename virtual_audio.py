@@ -0,0 +1,205 @@
+"""File-backed capture: replay recorded sessions and record them from the live microphone"""
+import os
+import time
+import wave
+import struct
+import logging
+import threading
+import numpy as np
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+def map_wav(path: str) -> Tuple[np.memmap, int]:
+    """Memory-map the samples of a 16-bit PCM WAV file as a (frames, channels) array
+
+    Returns the array and the sample rate. Nothing is read up front, so
+    multi-hour captures cost no memory until they are played. A data chunk
+    whose size was never filled in (a recording that was not closed) runs
+    to the end of the file.
+    """
+    size = os.path.getsize(path)
+    channels = rate = None
+    with open(path, 'rb') as f:
+        riff, _, wave_id = struct.unpack('<4sI4s', f.read(12))
+        if riff != b'RIFF' or wave_id != b'WAVE':
+            raise ValueError(f"{path} is not a WAV file")
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{path} has no data chunk")
+            chunk_id, chunk_size = struct.unpack('<4sI', header)
+            if chunk_id == b'fmt ':
+                fmt, channels, rate, _, _, bits = struct.unpack('<HHIIHH', f.read(16))
+                if fmt not in (1, 0xFFFE) or bits != 16:
+                    raise ValueError(f"{path} is not 16-bit PCM (format {fmt}, {bits} bits)")
+                f.seek(chunk_size - 16 + chunk_size % 2, os.SEEK_CUR)
+            elif chunk_id == b'data':
+                offset = f.tell()
+                break
+            else:
+                f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+    if channels is None:
+        raise ValueError(f"{path} has no fmt chunk")
+    length = size - offset if chunk_size in (0, 0xFFFFFFFF) else min(chunk_size, size - offset)
+    frames = length // (2 * channels)
+    return np.memmap(path, dtype='<i2', mode='r', offset=offset, shape=(frames, channels)), rate
+
+class WavFileSource:
+    """Capture source that replays a WAV file into a CaptureEngine
+
+    speed 1.0 feeds frames in real time, 2.0 twice as fast and so on. speed
+    0 runs as fast as the audio is consumed: a frame is written only after a
+    reader has waited for one, so nothing is overrun and a replay gives the
+    same wake detections and endpoints however loaded the machine is.
+    Capture time then stands still while no reader is waiting (during a
+    turn's processing, for example). Mono files are replayed on every channel.
+    on_end is called once the file has been played.
+    """
+
+    def __init__(self, path: str, speed: float = 1.0, on_end: Optional[Callable[[], None]] = None):
+        self.path = path
+        self.speed = speed
+        self.on_end = on_end
+        self.position = 0  # Frames delivered so far
+        self.finished = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.data, self.sample_rate = map_wav(path)
+
+    @property
+    def name(self) -> str:
+        return f"replay {os.path.basename(self.path)}"
+
+    @property
+    def duration(self) -> float:
+        return len(self.data) / self.sample_rate
+
+    def start(self, engine, callback: Callable) -> None:
+        if self.sample_rate != engine.sample_rate:
+            raise ValueError(f"{self.path} is {self.sample_rate} Hz, capture needs {engine.sample_rate} Hz")
+        channels = self.data.shape[1]
+        if channels != 1 and channels < engine.channels:
+            raise ValueError(f"{self.path} has {channels} channels, capture needs {engine.channels}")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(engine, callback),
+                                        name="wav-replay", daemon=True)
+        self._thread.start()
+        logger.info(f"Replaying {self.path} ({self.duration / 60:.1f} min at "
+                    f"{'max' if not self.speed else f'{self.speed:g}x'} speed)")
+
+    def _run(self, engine, callback: Callable) -> None:
+        n = engine.frame_length
+        data = self.data
+        if data.shape[1] == engine.channels:
+            block = None  # Blocks are passed straight from the mapping, the ring copies them
+        else:
+            data = data[:, :1] if data.shape[1] == 1 else data[:, :engine.channels]
+            block = np.empty((n, engine.channels), dtype=engine.dtype)
+        interval = n / (self.sample_rate * self.speed) if self.speed > 0 else 0.0
+        deadline = time.monotonic()
+
+        for start in range(self.position, len(data) - n + 1, n):
+            if interval:
+                deadline += interval
+                delay = deadline - time.monotonic()
+                if delay > 0 and self._stop.wait(delay):
+                    return
+            else:
+                while not engine.ring.wait_for_demand(0.1):
+                    if self._stop.is_set():
+                        return
+            if self._stop.is_set():
+                return
+            frames = data[start:start + n]
+            if block is not None:
+                np.copyto(block, frames)  # Broadcasts a mono file over every channel
+                frames = block
+            callback(frames, n, None, None)
+            self.position = start + n
+            if not interval:
+                engine.ring.notify()  # The callback's notify is skipped if a reader holds the lock
+
+        logger.info(f"Replay of {self.path} finished")
+        self.finished.set()
+        if self.on_end:
+            self.on_end()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        self._thread = None
+
+class SessionRecorder:
+    """Saves the raw PCM a CaptureEngine hears as WAV files, for replaying later
+
+    A background thread reads from its own ring reader, so the capture
+    callback does no extra work. A new file is started every rotate_seconds
+    (about 230 MB per hour for 16 kHz stereo); files left open by a crash
+    can still be replayed, see map_wav.
+    """
+
+    def __init__(self, engine, directory: str, rotate_seconds: float = 3600,
+                 chunk_seconds: float = 0.5):
+        self.engine = engine
+        self.directory = directory
+        self.rotate_frames = int(rotate_seconds * engine.sample_rate)
+        self.chunk_frames = int(chunk_seconds * engine.sample_rate)
+        self.files = 0
+        self.frames = 0
+        self._reader = None
+        self._writer: Optional[wave.Wave_write] = None
+        self._file_frames = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        self._stop.clear()
+        self._reader = self.engine.reader()
+        self._thread = threading.Thread(target=self._run, name="session-recorder", daemon=True)
+        self._thread.start()
+
+    def _open(self) -> None:
+        self._close()
+        path = os.path.join(self.directory, time.strftime("session-%Y%m%d-%H%M%S.wav"))
+        self._writer = wave.open(path, 'wb')
+        self._writer.setnchannels(self.engine.channels)
+        self._writer.setsampwidth(np.dtype(self.engine.dtype).itemsize)
+        self._writer.setframerate(self.engine.sample_rate)
+        self._file_frames = 0
+        self.files += 1
+        logger.info(f"Recording session audio to {path}")
+
+    def _close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def _run(self) -> None:
+        chunk = np.empty((self.chunk_frames, self.engine.channels), dtype=self.engine.dtype)
+        try:
+            while not self._stop.is_set():
+                block = self._reader.read(self.chunk_frames, timeout=1.0, out=chunk)
+                if block is None:
+                    continue
+                if self._writer is None or self._file_frames >= self.rotate_frames:
+                    self._open()
+                self._writer.writeframes(block)
+                self._file_frames += len(block)
+                self.frames += len(block)
+        except OSError as e:
+            logger.error(f"Session recording stopped: {e}")
+        finally:
+            self._close()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def stats(self) -> Dict[str, float]:
+        return {"files": self.files, "seconds": round(self.frames / self.engine.sample_rate, 1),
+                "overruns": self._reader.overruns if self._reader else 0}
@@ -1,54 +1,179 @@
 #!/usr/bin/env python3
+import io
 import os
+import copy
 import re
-import struct
+import argparse
 import signal
 import atexit
 import sys
 import tempfile
+import threading
 import time
+import _thread
 import subprocess
 import wave
 import logging
 import numpy as np
-import sounddevice as sd
 import pvporcupine
-import pyaudio
 from ctypes import *
-from gtts import gTTS
 from openai import OpenAI
 from dotenv import load_dotenv
-from contextlib import contextmanager
-from typing import Optional, Tuple, Generator
+from collections import deque
+from contextlib import ExitStack, contextmanager
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Optional, Tuple, Generator, Union
+from audio_capture import CaptureEngine, RingReader
+from vad import Endpointer, VoiceActivityDetector
+from tts_cache import TTSCache
+from audio_player import AudioPlayer, Voice
+from stt_backends import create_stt_backend
+from transcript_gate import TranscriptGate
+from tts_backends import GTTSBackend, create_local_tts_backend
+from pipeline import CancelToken, TurnBudget, TurnPipeline
+from metrics import Metrics, TurnSpans, export as export_metrics
+from http_client import ApiConnection, Hedger
+from conversation import ConversationMemory, Turn
+from answer_cache import AnswerCache, CachedAnswer, refers_back
+from intents import IntentRouter, LocalCommands
+from barge_in import BargeInMonitor
+from rooms import Room, RoomConfig, RoomDaemon
+from wake import EnergyGate, WakeListener, WakeProfiler
+from events import EventHandler, EventLog, EventServer
+from log_queue import QueueLogging
+from virtual_audio import SessionRecorder, WavFileSource
+from wake_process import WakeProcess, WakeWorkerConfig
 
 # ================= CONFIGURATION =================
 # Constants
 SAMPLE_RATE = 16000
 CHANNELS = 2
 DTYPE = 'int16'
-BLOCKSIZE = 16000
-SILENCE_THRESHOLD = 14200
-SILENCE_DURATION = 1.0
+FRAME_LENGTH = 512  # 32 ms capture frames, matching Porcupine's frame length
+WAKE_LOW_POWER = True  # Skip the wake word engine during silence and read frames in batches
+WAKE_GATE_MARGIN_DB = 6.0  # Frames this far above the idle floor are passed to Porcupine
+WAKE_GATE_HANGOVER_MS = 1500  # The gate stays open this long, for the whole wake phrase
+WAKE_LOOKBACK_MS = 300  # Skipped audio replayed to Porcupine when the gate opens
+WAKE_BATCH_FRAMES = 4  # Frames read per loop wakeup in low-power mode (~128 ms)
+WAKE_PROFILE_SECONDS = 60  # Window of the wake loop CPU / frame rate / skip ratio profile
+WAKE_PROCESS = False  # Capture and detect the wake word in a separate process (also --wake-process)
+WAKE_PROCESS_STATS_SECONDS = 5  # How often the wake worker reports its CPU use and lag
+RING_SECONDS = 10  # Audio history kept by the shared capture engine
+SESSION_ROTATE_SECONDS = 3600  # --record-session starts a new WAV file this often
+PREROLL_SECONDS = 0.3  # Audio kept from before the speech onset, so the first syllable is not clipped
+VAD_FRAME_MS = 20  # VAD analysis frame, 10-30 ms
+VAD_MARGIN_DB = 10.0  # Speech must be this far above the noise floor
+VAD_HANGOVER_MS = 600  # Trailing non-speech that ends an utterance
+VAD_NO_SPEECH_MS = 5000  # Give up if nobody speaks after the wake word
+VAD_CALIBRATION_SECONDS = 1.0  # Ambient audio used to calibrate at startup
+MAX_RECORDING_SECONDS = 30  # Upper bound of the preallocated recording buffer
 NOISE_REDUCTION_ENABLED = True  # Toggle this for noise reduction
+STT_BACKEND = "auto"  # "whisper", "vosk" (offline) or "auto" (Whisper, Vosk fallback)
+STT_COMMAND_GRAMMAR = False  # Constrain Vosk to the local command phrases (offline command-only use)
 STT_MODEL = "whisper-large-v3-turbo"
+TRANSCRIPT_GATE_ENABLED = True  # Drop transcripts of noise and Whisper hallucinations before the LLM
+TRANSCRIPT_NO_SPEECH_PROB = 0.6  # Whisper segments above this (with a low log probability) are silence
+TRANSCRIPT_MIN_LOGPROB = -1.5  # Transcripts Whisper is less sure of than this are dropped
+TRANSCRIPT_MIN_SPEECH_RATIO = 0.1  # VAD speech frames from the first speech to the endpoint
+UPLOAD_FORMAT = "flac"  # "flac" (lossless, ~half), "opus" (~10x smaller, slow to encode) or "wav"
+UPLOAD_TRIM_SILENCE = True  # Drop leading and trailing silence before uploading
 AI_MODEL = "mistral-saba-24b"
+RESPONSE_MAX_TOKENS = 100
+API_BASE_URL = "https://api.groq.com/openai/v1"  # Overridable with API_BASE_URL in .env
+API_KEEPALIVE_SECONDS = 120  # Idle pooled connections to the API are kept this long
+API_PING_SECONDS = 25  # Keep-alive request interval while idle, 0 disables
+API_CONNECT_TIMEOUT = 3.0
+API_MAX_CONNECTIONS = 4  # Pooled connections per room (STT, chat stream, hedges, warm-up)
+STT_TIMEOUT = 10.0  # Seconds per transcription request
+CHAT_TIMEOUT = 8.0  # Seconds to the response, and between streamed chunks
+HEDGE_REQUESTS = True  # Duplicate STT/chat requests slower than HEDGE_PERCENTILE
+HEDGE_PERCENTILE = 0.95
+HEDGE_MIN_SAMPLES = 20  # Requests observed per stage before hedging starts
+HEDGE_WORKERS = 4  # Hedging threads per room: a request and its duplicate for STT and for chat
+STREAM_RESPONSES = True  # Run turns through the overlapping pipeline, speaking as the reply streams in
+PIPELINE_QUEUE_SIZE = 4  # Items buffered between pipeline stages
+EARLY_STT_MS = 250  # Start the Whisper upload after this much of a pause
+TURN_BUDGET_SECONDS = 6.0  # End of speech to the first audio of the reply; late stages degrade
+STT_BUDGET_SECONDS = 2.5  # Then the Vosk fallback's transcript is used (STT_BACKEND "auto")
+LLM_BUDGET_SECONDS = 3.0  # To the first sentence; then one shorter request, or FALLBACK_RESPONSE
+TTS_BUDGET_SECONDS = 1.5  # Per clip; then the local TTS engine, or FALLBACK_RESPONSE
+LLM_DEGRADED_MAX_TOKENS = 40  # max_tokens of the shorter request
+LLM_RETRY_MIN_SECONDS = 1.0  # Turn budget that must be left to make the shorter request
+MIN_SENTENCE_CHARS = 20  # Short sentences are merged so gTTS clips are not tiny
+TTS_WORKERS = 2  # Sentences synthesized ahead of playback
+TTS_BACKEND = "gtts"  # "gtts" (network, cached MP3) or "local" (offline pyttsx3, needs the player)
+TTS_LOCAL_FALLBACK = True  # Speak with the local engine when gTTS fails
+LOCAL_TTS_RATE = 150  # Words per minute for the local engine
+TTS_LANG = 'en'
+TTS_TLD = 'com'  # gTTS accent, part of the cache key
+TTS_CACHE_MAX_MB = 50
+BARGE_IN_ENABLED = True  # Listen for the wake word while replying, and interrupt
+ECHO_SUPPRESSION = True  # Subtract the known playback from the microphone during barge-in
+ECHO_DELAY_MS = None  # Speaker-to-microphone delay of the echo reference; None uses the reported stream latencies
+PLAYBACK_SAMPLE_RATE = 48000
+PLAYBACK_BLOCKSIZE = 256  # ~5 ms output blocks, bounds the start latency of a sound
+LOOP_FADE_SECONDS = 0.05  # Cross-fade from the generating loop into speech
+MEMORY_ENABLED = True  # Remember the conversation so follow-up questions work
+MEMORY_TOKEN_BUDGET = 600  # History tokens sent with each request (summary + recent turns)
+MEMORY_RECENT_TURNS = 3  # Turns kept verbatim, older ones are folded into the summary
+MEMORY_SUMMARY_TOKENS = 150
+MEMORY_IDLE_SECONDS = 300  # A new session starts after this much inactivity
+LOCAL_INTENTS_ENABLED = True  # Answer time, date, timers, volume, stop and repeat locally
+ANSWER_CACHE_ENABLED = True  # Answer repeated questions without the LLM or TTS
+ANSWER_CACHE_SIZE = 256
+ANSWER_CACHE_TTL_SECONDS = 24 * 3600
+ANSWER_CACHE_DENYLIST = [  # Time-sensitive questions, never cached
+    r"\b(time|date|day|today|tonight|tomorrow|yesterday|now|currently|current|latest|recent)\b",
+    r"\b(weather|forecast|temperature|rain|news|score|price|stock|traffic)\b",
+    r"\b(timer|alarm|remind|reminder)\b",
+    r"\b(joke|story|random)\b",
+]
+SYSTEM_PROMPT = ("You are a helpful smart speaker assistant. "
+                 "Avoid lists and give answers in concise brief sentences.")
+ERROR_RESPONSE = "Sorry, I encountered an error processing your request."
+FALLBACK_RESPONSE = "Sorry, I'm having trouble right now. Please try again."  # Played when a turn runs over budget
+SUMMARY_PROMPT = ("Summarize this conversation between a user and a smart speaker in at most "
+                  "{words} words. Keep names, facts and anything the user may refer back to.")
+TTS_PREWARM_PHRASES = [  # Synthesized into the TTS cache at startup
+    ERROR_RESPONSE,
+    FALLBACK_RESPONSE,
+    "Sorry, I didn't catch that.",
+]
 
 # Paths
 KEYWORD_PATH = 'models/porcupine_keywords/hey-bop_en_raspberry-pi_v3_0_0.ppn'
 GENERATING_SOUND = 'audio/generating.mp3'
 GREETING_SOUND = 'audio/greeting.mp3'
+VOSK_MODEL_PATH = 'models/vosk-model-small-en-us-0.15'
 ENV_PATH = '.env'
+VAD_PROFILE_DIR = 'models/vad_profiles'
+TTS_CACHE_DIR = 'audio/tts_cache'
+ROOMS = [  # Served together with --rooms; devices are sounddevice names (or parts of them) or indices
+    {"name": "kitchen", "input_device": "USB Audio Device", "output_device": None},
+    {"name": "office", "input_device": "USB PnP Sound Device", "output_device": None},
+]
+ROOM_TURN_WORKERS = 0  # Turns processed at once across rooms, 0 = one per CPU core
+EVENT_LOG_SIZE = 500  # Recent events kept in memory for the web app
+EVENT_SOCKET_PATH = '/tmp/voxmate_events.sock'  # Local socket the web app streams events from
+METRICS_PROM_PATH = '/tmp/voxmate_metrics.prom'  # node_exporter textfile collector format
+METRICS_JSON_PATH = '/tmp/voxmate_metrics.json'
 
 # ================= INITIALIZATION =================
-# Setup logging with more detailed format
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('/tmp/smart_speaker.log')
-    ]
-)
+TURN_BUDGET = TurnBudget(total=TURN_BUDGET_SECONDS, stt=STT_BUDGET_SECONDS, llm=LLM_BUDGET_SECONDS,
+                         tts=TTS_BUDGET_SECONDS, degraded_max_tokens=LLM_DEGRADED_MAX_TOKENS,
+                         min_retry=LLM_RETRY_MIN_SECONDS)
+
+# Recent events (turns, wakes, warnings and errors) for the web app's live view
+EVENTS = EventLog(EVENT_LOG_SIZE)
+
+# Setup logging with more detailed format. Callers only queue the record; a
+# background thread writes it, so a slow terminal or disk never stalls a turn
+LOG_FORMAT = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+log_handlers = [logging.StreamHandler(), logging.FileHandler('/tmp/smart_speaker.log')]
+for handler in log_handlers:
+    handler.setFormatter(LOG_FORMAT)
+LOGGING = QueueLogging(log_handlers + [EventHandler(EVENTS)], level=logging.INFO)
+LOGGING.start()
+atexit.register(LOGGING.stop)
 logger = logging.getLogger(__name__)
 
 # ALSA Error Handler Supression (Linux-only)
@@ -60,11 +185,181 @@ try:
 except Exception as e:
     logger.debug(f"Couldn't set ALSA error handler: {e}")
 
+class PCMBuffer:
+    """Preallocated, bounded int16 PCM buffer that keeps a recording in memory"""
+
+    def __init__(self, max_seconds: float = MAX_RECORDING_SECONDS,
+                 channels: int = CHANNELS, sample_rate: int = SAMPLE_RATE):
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self._data = np.zeros((int(max_seconds * sample_rate), channels), dtype=DTYPE)
+        self._length = 0
+        self.speech_ratio: Optional[float] = None  # Set by record_audio from the VAD
+
+    @property
+    def frames(self) -> int:
+        return self._length
+
+    @property
+    def capacity(self) -> int:
+        return self._data.shape[0]
+
+    @property
+    def full(self) -> bool:
+        return self._length >= self.capacity
+
+    @property
+    def duration(self) -> float:
+        return self._length / self.sample_rate
+
+    def clear(self) -> None:
+        self._length = 0
+        self.speech_ratio = None
+
+    def append(self, block: np.ndarray) -> bool:
+        """Copy a block into the buffer, truncating at capacity. Returns False once full"""
+        count = min(len(block), self.capacity - self._length)
+        if count > 0:
+            self._data[self._length:self._length + count] = block[:count]
+            self._length += count
+        return self._length < self.capacity
+
+    def view(self) -> np.ndarray:
+        """Zero-copy view of the recorded frames"""
+        return self._data[:self._length]
+
+    def snapshot(self) -> "PCMBuffer":
+        """Copy of the frames recorded so far, safe to hand to another thread"""
+        copy = PCMBuffer(max_seconds=(self._length + 1) / self.sample_rate,
+                         channels=self.channels, sample_rate=self.sample_rate)
+        copy.append(self.view())
+        return copy
+
+    def write_wav(self, target: Union[str, BinaryIO]) -> None:
+        with wave.open(target, 'wb') as wf:
+            wf.setnchannels(self.channels)
+            wf.setsampwidth(np.dtype(DTYPE).itemsize)
+            wf.setframerate(self.sample_rate)
+            wf.writeframes(self.view().tobytes())
+
+    def to_wav_file(self, name: str = 'recording.wav') -> io.BytesIO:
+        """Encode the recording as an in-memory WAV upload object"""
+        wav = io.BytesIO()
+        self.write_wav(wav)
+        wav.seek(0)
+        wav.name = name  # The OpenAI client uses the name to infer the format
+        return wav
+
+def clean_tts_text(text: str) -> str:
+    """Remove special characters that might cause TTS issues"""
+    return re.sub(r"[_*~]", "", text)
+
+class SentenceStream:
+    """Turns streamed LLM tokens into clean sentences ready for TTS
+
+    <think>...</think> blocks are dropped even when the tags are split across
+    tokens, and sentences shorter than MIN_SENTENCE_CHARS are merged forward.
+    """
+    THINK_OPEN = "<think>"
+    THINK_CLOSE = "</think>"
+    SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+    def __init__(self, min_chars: int = MIN_SENTENCE_CHARS):
+        self.min_chars = min_chars
+        self._pending = ""   # Raw tokens not yet checked for think tags
+        self._text = ""      # Visible text not yet emitted as a sentence
+        self._in_think = False
+
+    @staticmethod
+    def _partial_tag_length(text: str, tag: str) -> int:
+        """Length of the longest suffix of text that is a prefix of tag"""
+        for size in range(min(len(tag) - 1, len(text)), 0, -1):
+            if text.endswith(tag[:size]):
+                return size
+        return 0
+
+    def _consume_pending(self) -> None:
+        while self._pending:
+            tag = self.THINK_CLOSE if self._in_think else self.THINK_OPEN
+            index = self._pending.find(tag)
+            if index >= 0:
+                if not self._in_think:
+                    self._text += self._pending[:index]
+                self._pending = self._pending[index + len(tag):]
+                self._in_think = not self._in_think
+                continue
+            keep = self._partial_tag_length(self._pending, tag)
+            if not self._in_think:
+                self._text += self._pending[:len(self._pending) - keep]
+            self._pending = self._pending[len(self._pending) - keep:]
+            break
+
+    def feed(self, token: str) -> List[str]:
+        """Add a token and return any sentences it completed"""
+        self._pending += token
+        self._consume_pending()
+        parts = self.SENTENCE_END.split(self._text)
+        self._text = parts.pop()
+        sentences = []
+        current = ""
+        for part in parts:
+            current = f"{current} {part}".strip()
+            if len(current) >= self.min_chars:
+                sentences.append(clean_tts_text(current))
+                current = ""
+        if current:
+            self._text = f"{current} {self._text}"
+        return [sentence for sentence in sentences if sentence.strip()]
+
+    def flush(self) -> List[str]:
+        """Return whatever text remains once the stream has ended"""
+        if not self._in_think:
+            self._text += self._pending
+        self._pending = ""
+        remainder = clean_tts_text(self._text).strip()
+        self._text = ""
+        return [remainder] if remainder else []
+
+PlaybackHandle = Union[Voice, subprocess.Popen]
+
 class AudioProcessor:
     """Handles all audio operations with configurable noise reduction"""
-    
-    @staticmethod
-    def start_looping_sound() -> subprocess.Popen:
+
+    # In-process player; when it cannot be started playback falls back to mpg321
+    player: Optional[AudioPlayer] = None
+
+    @classmethod
+    def start_player(cls, device=None) -> Optional[AudioPlayer]:
+        """Open the output stream and decode the fixed sounds once"""
+        try:
+            player = AudioPlayer(sample_rate=PLAYBACK_SAMPLE_RATE, blocksize=PLAYBACK_BLOCKSIZE,
+                                 device=device)
+            for path in (GREETING_SOUND, GENERATING_SOUND):
+                player.load(path)
+            player.start()
+            cls.player = player
+        except Exception as e:
+            logger.warning(f"In-process audio player unavailable, using mpg321: {e}")
+        return cls.player
+
+    @classmethod
+    def for_device(cls, device) -> type:
+        """An AudioProcessor with its own player on an output device, for one room"""
+        audio = type(f"{cls.__name__}[{device}]", (cls,), {"player": None})
+        audio.start_player(device)
+        return audio
+
+    @classmethod
+    def stop_player(cls) -> None:
+        if cls.player:
+            cls.player.stop()
+            cls.player = None
+
+    @classmethod
+    def start_looping_sound(cls) -> PlaybackHandle:
+        if cls.player:
+            player = cls.player
+            return player.loop(player.load(GENERATING_SOUND))
         try:
             return subprocess.Popen(
                 ["mpg321", "-o", "pulse", "--stereo", "-q", "--loop", "-1", GENERATING_SOUND],
@@ -77,9 +372,11 @@ class AudioProcessor:
             raise
 
     @staticmethod
-    def stop_looping_sound(process: Optional[subprocess.Popen]) -> None:
+    def stop_looping_sound(process: Optional[PlaybackHandle]) -> None:
         """Stop the background looping sound"""
-        if process and process.poll() is None:
+        if isinstance(process, Voice):
+            process.stop(fade_out=LOOP_FADE_SECONDS)
+        elif process and process.poll() is None:
             try:
                 process.terminate()
                 process.wait(timeout=2)
@@ -88,9 +385,29 @@ class AudioProcessor:
             except Exception as e:
                 logger.error(f"Error stopping sound process: {e}")
 
-    @staticmethod
-    def play_sound(file_path: str) -> None:
-        """Play sound with explicit stereo output"""
+    @classmethod
+    def play_audio(cls, audio: Union[np.ndarray, str]) -> None:
+        """Play prepared PCM through the player, or a sound file"""
+        if isinstance(audio, np.ndarray):
+            cls.player.play(audio).wait()
+        else:
+            cls.play_sound(audio)
+
+    @classmethod
+    def play_sound(cls, file_path: str, wait: bool = True) -> None:
+        """Play sound with explicit stereo output
+
+        wait=False returns as soon as playback has started (in-process player only).
+        """
+        if cls.player:
+            try:
+                player = cls.player
+                voice = player.play(player.load(file_path, cache=False))
+                if wait:
+                    voice.wait()
+            except Exception as e:
+                logger.error(f"Error playing sound {file_path}: {e}")
+            return
         try:
             result = subprocess.run(
                 ["mpg321", "-o", "pulse", "--stereo", "-q", file_path],
@@ -112,63 +429,83 @@ class AudioProcessor:
                 logger.error(f"Fallback playback failed: {fallback_e}")
 
     @staticmethod
-    def record_audio_to_file() -> str:
-        """Record audio until silence is detected and save to temporary WAV file"""
-        silence_start = None
-        audio_data = []
-        consecutive_silent_chunks = 0
-        
-        def callback(indata, frames, time_info, status):
-            nonlocal silence_start, consecutive_silent_chunks
-            if status and status.input_overflow:
-                logger.warning("Input overflow in audio stream detected")
-            
-            chunk = indata.copy()
-            volume = np.linalg.norm(chunk)
-            print(f'Volume: {volume}')
-            
-            if NOISE_REDUCTION_ENABLED:
-                if volume > SILENCE_THRESHOLD:
-                    audio_data.append(chunk)
-                    consecutive_silent_chunks = 0
-                elif audio_data:
-                    consecutive_silent_chunks += 1
-                    if consecutive_silent_chunks > int(SILENCE_DURATION * SAMPLE_RATE / BLOCKSIZE):
-                        raise sd.CallbackStop()
-            else:
-                audio_data.append(chunk)
-                if volume < SILENCE_THRESHOLD:
-                    if silence_start is None:
-                        silence_start = time.time()
-                    elif time.time() - silence_start > SILENCE_DURATION:
-                        raise sd.CallbackStop()
-                else:
-                    silence_start = None
+    def record_audio(reader: RingReader, vad: VoiceActivityDetector,
+                     buffer: Optional[PCMBuffer] = None,
+                     on_frames: Optional[Callable[[np.ndarray], None]] = None,
+                     on_pause: Optional[Callable[[PCMBuffer], None]] = None,
+                     on_resume: Optional[Callable[[], None]] = None,
+                     pause_ms: float = EARLY_STT_MS,
+                     token: Optional[CancelToken] = None,
+                     preroll: float = PREROLL_SECONDS) -> PCMBuffer:
+        """Record audio from the capture engine until the VAD detects the end of speech
+
+        reader should start where the wake word ended, so the VAD never
+        mistakes its tail for the start of the request. With noise
+        reduction, nothing is kept until the endpointer triggers; the last
+        preroll seconds before that are then prepended to the recording.
+        on_frames receives every recorded frame as it arrives, so streaming
+        STT can decode while the user is still talking. on_pause is called
+        once pause_ms into a pause after speech and on_resume if speech then
+        continues, so work can start before the endpoint is confirmed.
+        """
+        buffer = buffer if buffer is not None else PCMBuffer()
+        buffer.clear()
+        endpointer = Endpointer(vad, hangover_ms=VAD_HANGOVER_MS, no_speech_ms=VAD_NO_SPEECH_MS)
+        pause_frames = vad.ms_to_frames(pause_ms)
+        paused = False
+        pending: deque = deque(maxlen=int(preroll * buffer.sample_rate / FRAME_LENGTH))
+        logger.info("\nRecording... (speak now)")
+
+        def keep(frame: np.ndarray) -> None:
+            buffer.append(frame)
+            if on_frames:
+                on_frames(frame)
 
+        while not buffer.full:
+            if token:
+                token.check()
+            frame = reader.read(FRAME_LENGTH, timeout=1.0)
+            if frame is None:
+                raise RuntimeError("Capture stream stalled while recording")
+            ended = endpointer.update(vad.process(frame))
+            # With noise reduction only speech (and its hangover) is kept
+            if NOISE_REDUCTION_ENABLED and not endpointer.triggered:
+                pending.append(frame)
+            elif not NOISE_REDUCTION_ENABLED or endpointer.in_speech or ended:
+                while pending:
+                    keep(pending.popleft())
+                keep(frame)
+            if ended:
+                break
+            if endpointer.triggered and not paused and endpointer.silent_run >= pause_frames:
+                paused = True
+                if on_pause:
+                    on_pause(buffer)
+            elif paused and endpointer.silent_run < pause_frames:
+                paused = False
+                if on_resume:
+                    on_resume()
+
+        if buffer.full:
+            logger.warning(f"Recording truncated at {MAX_RECORDING_SECONDS}s")
+        if not endpointer.triggered:
+            logger.info("No speech detected")
+            buffer.clear()
+        else:
+            buffer.speech_ratio = endpointer.speech_ratio
+        logger.debug(f"Recorded {buffer.duration:.2f}s, speech ratio {endpointer.speech_ratio:.2f} "
+                     f"(Noise reduction: {'ON' if NOISE_REDUCTION_ENABLED else 'OFF'})")
+        return buffer
+
+    @staticmethod
+    def record_audio_to_file(reader: RingReader, vad: VoiceActivityDetector) -> str:
+        """Record audio until silence is detected and save to temporary WAV file"""
+        buffer = AudioProcessor.record_audio(reader, vad)
+        temp_audio = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
         try:
-            with sd.InputStream(
-                samplerate=SAMPLE_RATE,
-                dtype=DTYPE,
-                channels=CHANNELS,
-                callback=callback,
-                blocksize=BLOCKSIZE
-            ) as stream:
-                logger.info("\nRecording... (speak now)")
-                while stream.active:
-                    time.sleep(0.1)
-
-            # Save to temp WAV file
-            temp_audio = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-            with wave.open(temp_audio.name, 'wb') as wf:
-                wf.setnchannels(CHANNELS)
-                wf.setsampwidth(2)  # 16-bit = 2 bytes
-                wf.setframerate(SAMPLE_RATE)
-                for chunk in audio_data:
-                    wf.writeframes(chunk.tobytes())
-            
-            logger.debug(f"Recorded {len(audio_data)} chunks (Noise reduction: {'ON' if NOISE_REDUCTION_ENABLED else 'OFF'})")
+            with temp_audio:
+                buffer.write_wav(temp_audio)
             return temp_audio.name
-            
         except Exception as e:
             logger.error(f"Error saving audio file: {e}")
             os.unlink(temp_audio.name)
@@ -177,73 +514,315 @@ class AudioProcessor:
 class AIService:
     """Handles all AI-related operations"""
 
-    def __init__(self):
+    def __init__(self, rooms: int = 1):
         load_dotenv(ENV_PATH)
-        self.client = OpenAI(
-            base_url="https://api.groq.com/openai/v1",
-            api_key=os.getenv("OPENAI_API_KEY")
-        )
+        base_url = os.getenv("API_BASE_URL", API_BASE_URL)
+        api_key = os.getenv("OPENAI_API_KEY")
+        self.http = ApiConnection(base_url, api_key, keepalive_expiry=API_KEEPALIVE_SECONDS,
+                                  ping_interval=API_PING_SECONDS, connect_timeout=API_CONNECT_TIMEOUT,
+                                  max_connections=API_MAX_CONNECTIONS * rooms)
+        self.hedger = Hedger(HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES,
+                             max_workers=HEDGE_WORKERS * rooms) if HEDGE_REQUESTS else None
+        self.client = OpenAI(base_url=base_url, api_key=api_key, http_client=self.http.client)
         self.access_key = os.getenv("PORCUPINE_API_KEY")
+        self.audio = AudioProcessor
+        self.last_answer = ""
+        self.intents = self._create_intents()
+        self.stt = create_stt_backend(
+            STT_BACKEND, self.client, STT_MODEL, VOSK_MODEL_PATH, sample_rate=SAMPLE_RATE,
+            timeout=STT_TIMEOUT, hedger=self.hedger,
+            grammar=self.intents.phrases() if self.intents and STT_COMMAND_GRAMMAR else None,
+            upload_format=UPLOAD_FORMAT, trim_silence=UPLOAD_TRIM_SILENCE
+        )
+        logger.info(f"STT backend: {self.stt.name}")
+        self.gtts = GTTSBackend(lang=TTS_LANG, tld=TTS_TLD)
+        self.local_tts = (create_local_tts_backend(LOCAL_TTS_RATE)
+                          if TTS_BACKEND == "local" or TTS_LOCAL_FALLBACK else None)
+        self.tts_cache = TTSCache(TTS_CACHE_DIR, TTS_CACHE_MAX_MB * 1024 * 1024)
+        self.memory = self._create_memory()
+        self.answers = AnswerCache(
+            ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL_SECONDS, denylist=ANSWER_CACHE_DENYLIST
+        ) if ANSWER_CACHE_ENABLED else None
+        self.transcript_gate = TranscriptGate(
+            no_speech_prob=TRANSCRIPT_NO_SPEECH_PROB, min_avg_logprob=TRANSCRIPT_MIN_LOGPROB,
+            min_speech_ratio=TRANSCRIPT_MIN_SPEECH_RATIO
+        ) if TRANSCRIPT_GATE_ENABLED else None
 
         if not self.access_key:
             logger.error("Porcupine API key not found in environment variables")
             raise ValueError("Missing API key")
         
-    def transcribe_audio(self, audio_path: str) -> Tuple[str, float, subprocess.Popen]:
-        """Transcribe audio using Whisper API"""
-        sound_process = AudioProcessor.start_looping_sound()
+    def _create_intents(self) -> Optional[IntentRouter]:
+        return LocalCommands(
+            self._speak, lambda: self.audio.player, lambda: self.last_answer
+        ).register(IntentRouter()) if LOCAL_INTENTS_ENABLED else None
+
+    def _create_memory(self) -> Optional[ConversationMemory]:
+        return ConversationMemory(
+            self._summarize, budget_tokens=MEMORY_TOKEN_BUDGET, recent_turns=MEMORY_RECENT_TURNS,
+            summary_tokens=MEMORY_SUMMARY_TOKENS, idle_seconds=MEMORY_IDLE_SECONDS
+        ) if MEMORY_ENABLED else None
+
+    def for_room(self, audio: type) -> "AIService":
+        """A view of this service for one room of the multi-room daemon
+
+        The API client and its connection pool, the hedger, the TTS engines,
+        the TTS and answer caches and the STT models are shared. The room
+        gets its own conversation, local commands (bound to its player) and
+        per-utterance STT state.
+        """
+        room = copy.copy(self)
+        room.audio = audio
+        room.last_answer = ""
+        room.stt = self.stt.fork()
+        room.intents = room._create_intents()
+        room.memory = room._create_memory()
+        return room
+
+    def transcribe_audio(self, audio: Union[str, PCMBuffer, BinaryIO]) -> Tuple[str, float, PlaybackHandle]:
+        """Transcribe audio with the configured STT backend
+
+        Accepts an in-memory PCMBuffer, a file-like upload object or, for older
+        callers, the path of a temporary WAV file (which is deleted afterwards).
+        """
+        sound_process = self.audio.start_looping_sound()
         start_time = time.time()
 
         try:
-            with open(audio_path, "rb") as audio_file:
-                transcript = self.client.audio.transcriptions.create(
-                    model=STT_MODEL,
-                    file=audio_file,
-                    language="en",
-                    response_format="text"
-                )
+            if isinstance(audio, str):
+                with open(audio, "rb") as audio_file:
+                    transcript = self.stt.transcribe(audio_file)
+            else:
+                transcript = self.stt.transcribe(audio)
 
             if transcript:
                 logger.info(f"Transcription: {transcript.strip()}")
             return transcript.strip(), time.time() - start_time, sound_process
         except Exception as e:
             logger.error(f"Transcription error: {e}")
-            AudioProcessor.stop_looping_sound(sound_process)
+            self.audio.stop_looping_sound(sound_process)
             raise
         finally:
-            try:
-                os.unlink(audio_path)
-            except Exception as e:
-                logger.error(f"Error deleting temp audio file: {e}")
+            if isinstance(audio, str):
+                try:
+                    os.unlink(audio)
+                except Exception as e:
+                    logger.error(f"Error deleting temp audio file: {e}")
+
+    def screen_transcript(self, transcript: str, recording=None) -> Optional[str]:
+        """Why the transcript is not worth answering (noise, silence, a hallucination), or None"""
+        if not transcript or not self.transcript_gate:
+            return None
+        reason = self.transcript_gate.check(transcript, getattr(recording, "speech_ratio", None))
+        if reason:
+            logger.info(f"Ignoring transcript ({reason}): {transcript}")
+        return reason
+
+    def mark_upload_end(self, spans: TurnSpans) -> None:
+        """Mark when the transport finished sending the transcription upload"""
+        at = self.http.upload_end("/audio/transcriptions")
+        start = spans.marks.get("upload_start")
+        if at is not None and start is not None and at >= start:
+            spans.mark("upload_end", at)
+
+    def _request(self, stage: str, request: Callable, discard: Optional[Callable] = None):
+        """Run an API request, hedged when it is slower than usual"""
+        return self.hedger.call(stage, request, discard) if self.hedger else request()
+
+    def _build_messages(self, prompt: str) -> List[dict]:
+        question = f"Answer very briefly: {prompt}"
+        if self.memory:
+            return self.memory.messages(SYSTEM_PROMPT, question)
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": question}
+        ]
+
+    def _remember(self, prompt: str, answer: str) -> None:
+        if answer:
+            self.last_answer = answer
+        if self.memory and answer:
+            self.memory.add_turn(prompt, answer)
+
+    def _local_answer(self, prompt: str) -> Optional[str]:
+        """Reply to a local command ("" for a silent one), or None to ask the LLM"""
+        if not self.intents:
+            return None
+        answer = self.intents.handle(prompt)
+        if answer:
+            self.last_answer = answer
+        return answer
+
+    def _speak(self, text: str) -> None:
+        """Speak outside a turn, e.g. when a timer rings"""
+        self.audio.play_audio(self._prepare_speech(text))
+
+    def _cached_answer(self, prompt: str) -> Optional[CachedAnswer]:
+        if not self.answers or (self.memory and self.memory.active and refers_back(prompt)):
+            return None  # Follow-ups depend on the conversation, not just their words
+        cached = self.answers.get(prompt)
+        if cached:
+            logger.info(f"Answer cache hit: {cached.question}")
+            self._remember(prompt, cached.answer)
+        return cached
+
+    def _store_answer(self, prompt: str, answer: str, sentences: List[str]) -> None:
+        if self.answers and answer != ERROR_RESPONSE and not (self.memory and refers_back(prompt)):
+            self.answers.put(prompt, answer, sentences)
+
+    def _summarize(self, summary: str, turns: List[Turn]) -> str:
+        """Fold older turns into the rolling conversation summary (runs in the background)"""
+        transcript = "\n".join(f"User: {t.user}\nSpeaker: {t.assistant}" for t in turns)
+        if summary:
+            transcript = f"Earlier summary: {summary}\n{transcript}"
+        response = self.client.chat.completions.create(
+            model=AI_MODEL,
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT.format(words=MEMORY_SUMMARY_TOKENS * 3 // 4)},
+                {"role": "user", "content": transcript}
+            ],
+            max_tokens=MEMORY_SUMMARY_TOKENS,
+            temperature=0.2,
+            timeout=CHAT_TIMEOUT
+        )
+        message = response.choices[0].message.content or ""
+        return re.sub(r"<think>.*?</think>", "", message, flags=re.DOTALL).strip()
 
     def generate_response(self, prompt: str) -> str:
         """Generate AI response using chat completion"""
+        local = self._local_answer(prompt)
+        if local is not None:
+            return local
+        cached = self._cached_answer(prompt)
+        if cached:
+            return cached.answer
         try:
-            response = self.client.chat.completions.create(
+            messages = self._build_messages(prompt)
+            response = self._request("chat", lambda: self.client.chat.completions.create(
                 model=AI_MODEL,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a helpful smart speaker assistant. "
-                                  "Avoid lists and give answers in concise brief sentences."
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Answer very briefly: {prompt}"
-                    }
-                ],
-                max_tokens=100,
-                temperature=0.7
-            )
+                messages=messages,
+                max_tokens=RESPONSE_MAX_TOKENS,
+                temperature=0.7,
+                timeout=CHAT_TIMEOUT
+            ))
             message = response.choices[0].message.content
             logger.info(f"AI Response: {message}")
             # Remove any special formatting tags
-            return re.sub(r"<think>.*?</think>", "", message, flags=re.DOTALL).strip()
+            answer = re.sub(r"<think>.*?</think>", "", message, flags=re.DOTALL).strip()
+            self._remember(prompt, answer)
+            self._store_answer(prompt, answer, [answer])
+            return answer
         except Exception as e:
             logger.error(f"AI API Error: {e}")
-            return "Sorry, I encountered an error processing your request."
+            return ERROR_RESPONSE
+
+    def generate_response_stream(self, prompt: str, token: Optional[CancelToken] = None,
+                                 on_token: Optional[Callable[[], None]] = None,
+                                 max_tokens: Optional[int] = None) -> Iterator[str]:
+        """Stream the AI response and yield cleaned sentences as they complete
+
+        Cancelling token closes the HTTP stream and ends the generator quietly.
+        on_token is called for every received token (used to time the first).
+        A cached answer is replayed sentence by sentence, so its audio comes
+        straight from the TTS cache too. An answer cut short by max_tokens
+        (the degraded retry of a late turn) is not cached.
+        """
+        local = self._local_answer(prompt)
+        if local is not None:
+            if on_token:
+                on_token()
+            if local:
+                yield local
+            return
+        cached = self._cached_answer(prompt)
+        if cached:
+            if on_token:
+                on_token()
+            yield from cached.sentences
+            return
+        sentences = SentenceStream()
+        spoken: List[str] = []
+        message = ""
+        try:
+            messages = self._build_messages(prompt)
+            stream = self._request("chat_stream", lambda: self.client.chat.completions.create(
+                model=AI_MODEL,
+                messages=messages,
+                max_tokens=max_tokens or RESPONSE_MAX_TOKENS,
+                temperature=0.7,
+                stream=True,
+                timeout=CHAT_TIMEOUT
+            ), discard=lambda losing: losing.close())
+            if token:
+                token.on_cancel(stream.close)
+            for chunk in stream:
+                if token and token.cancelled:
+                    return
+                if not chunk.choices:
+                    continue
+                text = chunk.choices[0].delta.content or ""
+                if text and on_token:
+                    on_token()
+                message += text
+                for sentence in sentences.feed(text):
+                    spoken.append(sentence)
+                    yield sentence
+            for sentence in sentences.flush():
+                spoken.append(sentence)
+                yield sentence
+            logger.info(f"AI Response: {message}")
+            answer = re.sub(r"<think>.*?</think>", "", message, flags=re.DOTALL).strip()
+            self._remember(prompt, answer)
+            if not max_tokens:
+                self._store_answer(prompt, answer, spoken)
+        except Exception as e:
+            if token and token.cancelled:
+                return
+            logger.error(f"AI API Error: {e}")
+            # Finish what was already said, then apologise
+            yield from sentences.flush()
+            yield ERROR_RESPONSE
+
+    def _synthesize(self, text: str) -> str:
+        """Return the path of an MP3 for text, synthesizing it only on a cache miss"""
+        clean_text = clean_tts_text(text)
+        key = TTSCache.make_key(clean_text, engine=self.gtts.name, **self.gtts.voice)
+        return self.tts_cache.get_or_create(key, lambda: self.gtts.synthesize(clean_text))
+
+    def prewarm_tts(self, phrases: Iterable[str] = TTS_PREWARM_PHRASES) -> int:
+        """Synthesize common phrases into the TTS cache, and decode the fallback reply"""
+        warmed = self.tts_cache.prewarm(phrases, self._synthesize)
+        self.fallback_speech()
+        return warmed
+
+    def fallback_speech(self) -> Tuple[str, Optional[Union[np.ndarray, str]]]:
+        """FALLBACK_RESPONSE and its audio, without touching the network
 
-    def text_to_speech(self, message: str, sound_process: Optional[subprocess.Popen]) -> float:
+        The clip comes from the TTS cache (it is pre-warmed) and the player
+        keeps it decoded; the local engine renders it if it was never cached.
+        """
+        clean_text = clean_tts_text(FALLBACK_RESPONSE)
+        path = self.tts_cache.get(TTSCache.make_key(clean_text, engine=self.gtts.name, **self.gtts.voice))
+        player = self.audio.player
+        if path:
+            return FALLBACK_RESPONSE, player.load(path) if player else path
+        if self.local_tts and player:
+            return FALLBACK_RESPONSE, player.prepare(*self.local_tts.render(clean_text))
+        return FALLBACK_RESPONSE, None
+
+    def degraded_speech(self, text: str) -> Optional[np.ndarray]:
+        """Speak text with the local engine when gTTS is over its budget, if there is one"""
+        player = self.audio.player
+        if not (self.local_tts and player) or TTS_BACKEND == "local":
+            return None
+        try:
+            return player.prepare(*self.local_tts.render(clean_tts_text(text)))
+        except Exception as e:
+            logger.error(f"Local TTS failed: {e}")
+            return None
+
+    def text_to_speech(self, message: str, sound_process: Optional[PlaybackHandle],
+                       spans: Optional[TurnSpans] = None) -> float:
         """Convert text to speech and play it"""
         if not message:
             return 0
@@ -251,65 +830,152 @@ class AIService:
         start_time = time.time()
 
         try:
-            with tempfile.NamedTemporaryFile(suffix='.mp3', delete=True) as f:
-                # Clean special characters that might cause TTS issues
-                clean_text = re.sub(r"[_*~]", "", message)
-                gTTS(text=clean_text, lang='en').save(f.name)
-                AudioProcessor.stop_looping_sound(sound_process)
-                stop_time = time.time()
-                AudioProcessor.play_sound(f.name)
-                return stop_time - start_time
+            audio = self._prepare_speech(message)
         except Exception as e:
             logger.error(f"TTS Error: {e}")
             return 0
 
+        self.audio.stop_looping_sound(sound_process)
+        stop_time = time.time()
+        if spans:
+            spans.mark("first_tts_byte")
+            spans.mark("first_audio")
+        self.audio.play_audio(audio)
+        return stop_time - start_time
+
+    def _prepare_speech(self, text: str) -> Union[np.ndarray, str]:
+        """Synthesize text ready for playback, off the playback path
+
+        With the in-process player this returns PCM: rendered directly by the
+        local engine, or the cached gTTS MP3 decoded. Without it, an MP3 path.
+        """
+        player = self.audio.player
+        local = self.local_tts if player else None
+        if local and TTS_BACKEND == "local":
+            return player.prepare(*local.render(clean_tts_text(text)))
+        try:
+            audio_path = self._synthesize(text)
+        except Exception as e:
+            if not local:
+                raise
+            logger.warning(f"gTTS failed, using local TTS: {e}")
+            return player.prepare(*local.render(clean_tts_text(text)))
+        return player.load(audio_path, cache=False) if player else audio_path
+
 @contextmanager
-def audio_wake_stream(access_key: str) -> Generator[Tuple[pvporcupine.Porcupine, pyaudio.PyAudio, pyaudio.Stream], None, None]:
-    """Context manager for Porcupine wake word detection"""
-    pa = None
+def audio_wake_stream(access_key: str, device=None,
+                      source=None) -> Generator[Tuple[pvporcupine.Porcupine, CaptureEngine], None, None]:
+    """Context manager for Porcupine wake word detection on the shared capture engine
+
+    source replaces the microphone, e.g. a WavFileSource replaying a recorded session.
+    """
     porcupine = None
-    stream = None
+    engine = None
 
     try:
-        pa = pyaudio.PyAudio()
         porcupine = pvporcupine.create(
             access_key=access_key,
             keyword_paths=[KEYWORD_PATH]
         )
-        stream = pa.open(
-            rate=porcupine.sample_rate,
-            channels=1,
-            format=pyaudio.paInt16,
-            input=True,
-            frames_per_buffer=porcupine.frame_length,
+        engine = CaptureEngine(
+            sample_rate=porcupine.sample_rate,
+            channels=CHANNELS,
+            frame_length=porcupine.frame_length,
+            ring_seconds=RING_SECONDS,
+            dtype=DTYPE,
+            device=device,
+            source=source
         )
-        yield porcupine, pa, stream
+        engine.start()
+        yield porcupine, engine
     except Exception as e:
         logger.error(f"Error initializing audio wake stream: {e}")
         raise
     finally:
-        if stream:
-            stream.stop_stream()
-            stream.close()
-        if pa:
-            pa.terminate()
+        if engine:
+            engine.stop()
         if porcupine:
             porcupine.delete()
 
-def wake_word_detection(porcupine: pvporcupine.Porcupine, stream: pyaudio.Stream) -> None:
-    """Listen for wake word and respond when detected"""
-    logger.info("Listening for wake word... (say 'Hey Bop')")
-    while True:
+@contextmanager
+def wake_process_stream(access_key: str, device=None, log_profile: bool = False,
+                        barge_in: bool = BARGE_IN_ENABLED) -> Generator[Tuple[Optional[pvporcupine.Porcupine], WakeProcess], None, None]:
+    """Context manager for wake word detection in a worker process
+
+    The WakeProcess takes the place of both the capture engine and the wake
+    listener. Barge-in needs the playback reference, so it keeps its own
+    Porcupine handle in this process (None without barge-in).
+    """
+    frame_ms = FRAME_LENGTH * 1000 / SAMPLE_RATE
+    config = WakeWorkerConfig(
+        access_key=access_key, keyword_path=KEYWORD_PATH, sample_rate=SAMPLE_RATE, channels=CHANNELS,
+        frame_length=FRAME_LENGTH, ring_seconds=RING_SECONDS, dtype=DTYPE, device=device,
+        low_power=WAKE_LOW_POWER, gate_margin_db=WAKE_GATE_MARGIN_DB,
+        gate_hangover_frames=round(WAKE_GATE_HANGOVER_MS / frame_ms),
+        lookback_frames=round(WAKE_LOOKBACK_MS / frame_ms), batch_frames=WAKE_BATCH_FRAMES,
+        profile_seconds=WAKE_PROFILE_SECONDS, log_profile=log_profile,
+        stats_seconds=WAKE_PROCESS_STATS_SECONDS
+    )
+    porcupine = None
+    try:
+        with WakeProcess(config) as wake:
+            if barge_in:
+                porcupine = pvporcupine.create(access_key=access_key, keyword_paths=[KEYWORD_PATH])
+            yield porcupine, wake
+    except Exception as e:
+        logger.error(f"Error initializing wake worker: {e}")
+        raise
+    finally:
+        if porcupine:
+            porcupine.delete()
+
+def calibrate_vad(engine: CaptureEngine) -> VoiceActivityDetector:
+    """Create the VAD, seeded from the device profile and recalibrated on ambient audio"""
+    vad = VoiceActivityDetector(
+        sample_rate=engine.sample_rate,
+        frame_ms=VAD_FRAME_MS,
+        margin_db=VAD_MARGIN_DB
+    )
+    device_name = engine.device_name
+    vad.load_profile(VAD_PROFILE_DIR, device_name)
+    ambient = engine.reader().read(int(VAD_CALIBRATION_SECONDS * engine.sample_rate),
+                                   timeout=VAD_CALIBRATION_SECONDS + 1.0)
+    if ambient is not None:
+        vad.calibrate(ambient)
         try:
-            pcm = stream.read(porcupine.frame_length, exception_on_overflow=False)
-            pcm = struct.unpack_from("h" * porcupine.frame_length, pcm)
-            if porcupine.process(pcm) >= 0:
-                logger.info("Wake word detected!")
-                AudioProcessor.play_sound(GREETING_SOUND)
-                break
-        except Exception as e:
-            logger.error(f"Error in wake word detection: {e}")
-            raise
+            vad.save_profile(VAD_PROFILE_DIR, device_name)
+        except OSError as e:
+            logger.warning(f"Could not save VAD profile: {e}")
+    return vad
+
+def create_wake_listener(porcupine: pvporcupine.Porcupine, engine: CaptureEngine,
+                         log_profile: bool = False) -> WakeListener:
+    """Wake word loop for engine, gated and batched in low-power mode"""
+    frame_ms = porcupine.frame_length * 1000 / porcupine.sample_rate
+    batch = WAKE_BATCH_FRAMES if WAKE_LOW_POWER else 1
+    gate = EnergyGate(porcupine.frame_length, batch, margin_db=WAKE_GATE_MARGIN_DB,
+                      hangover_frames=round(WAKE_GATE_HANGOVER_MS / frame_ms)) if WAKE_LOW_POWER else None
+    return WakeListener(porcupine, engine.channels, gate, batch,
+                        lookback_frames=round(WAKE_LOOKBACK_MS / frame_ms) if WAKE_LOW_POWER else 0,
+                        profiler=WakeProfiler(WAKE_PROFILE_SECONDS, log=log_profile))
+
+def wake_word_detection(listener: WakeListener, engine: CaptureEngine) -> int:
+    """Listen for wake word and respond when detected
+
+    Returns the capture position where the wake word ended, so the recording
+    can start from there instead of after the greeting.
+    """
+    logger.info("Listening for wake word... (say 'Hey Bop')")
+    try:
+        position = listener.listen(engine.reader())
+    except Exception as e:
+        logger.error(f"Error in wake word detection: {e}")
+        raise
+    logger.info("Wake word detected!")
+    EVENTS.publish("wake")
+    # Recording reads from the ring buffer, so it need not wait for the chime
+    AudioProcessor.play_sound(GREETING_SOUND, wait=False)
+    return position
 
 def cleanup() -> None:
     """Cleanup resources before exit"""
@@ -317,48 +983,260 @@ def cleanup() -> None:
         return
     cleanup._called = True
     logger.info("Performing cleanup...")
+    AudioProcessor.stop_player()
     # Add any additional cleanup needed here
 
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="voxMate smart speaker")
+    parser.add_argument("--prewarm-tts", action="store_true",
+                        help="synthesize the common TTS phrases into the cache and exit")
+    parser.add_argument("--rooms", action="store_true",
+                        help="serve every microphone in ROOMS from this process")
+    parser.add_argument("--profile-wake", action="store_true",
+                        help="log the wake loop's CPU use, frame rate and gate skip ratio")
+    parser.add_argument("--wake-process", action="store_true", default=WAKE_PROCESS,
+                        help="capture and detect the wake word in a separate process")
+    parser.add_argument("--replay", metavar="WAV",
+                        help="listen to a recorded session instead of the microphone, then exit")
+    parser.add_argument("--replay-speed", type=float, default=1.0, metavar="X",
+                        help="replay speed, 1 = real time, 0 = as fast as it is processed")
+    parser.add_argument("--record-session", metavar="DIR",
+                        help="save everything the microphone hears to WAV files in DIR, for --replay")
+    args = parser.parse_args()
+    if (args.replay or args.wake_process) and args.rooms:
+        parser.error("--replay and --wake-process serve a single room")
+    if args.replay and args.wake_process:
+        parser.error("--replay runs in one process, drop --wake-process")
+    return args
+
+def log_turn(metrics: Metrics, spans: TurnSpans, durations: dict, stt, transcript: str,
+             response: str, cancelled: bool = False, room: Optional[str] = None,
+             budget_misses: Iterable[str] = ()) -> None:
+    """Log a finished turn's stage timings and upload size, and publish it as an event"""
+    budget_misses = list(budget_misses)
+    EVENTS.publish("turn", room=room, transcript=transcript, response=response, cancelled=cancelled,
+                   stages={stage: round(seconds, 3) for stage, seconds in durations.items()},
+                   wake_to_first_audio=spans.wake_to_first_audio, budget_misses=budget_misses)
+    prefix = f"[{room}] " if room else ""
+    logger.info(f"\n{prefix}Performance Metrics:")
+    for stage, seconds in durations.items():
+        logger.info(f"- {stage}: {seconds:.2f}s")
+    if spans.wake_to_first_audio is not None:
+        logger.info(f"- wake to first audio: {spans.wake_to_first_audio:.2f}s")
+    if budget_misses:
+        logger.info(f"- over budget (degraded): {', '.join(budget_misses)}")
+    upload = stt.last_upload
+    if upload:
+        metrics.inc("upload_bytes_total", upload.size)
+        metrics.inc("upload_raw_bytes_total", upload.raw_bytes)
+        logger.info(f"- upload: {upload.size / 1024:.1f} KB {upload.format} "
+                    f"(raw WAV {upload.raw_bytes / 1024:.1f} KB), "
+                    f"{upload.trimmed:.2f}s silence trimmed")
+    logger.info(metrics.slo_report())
+
+def start_session_recorder(engine: CaptureEngine, directory: str, metrics: Metrics) -> SessionRecorder:
+    """Record the raw capture audio to directory until exit"""
+    recorder = SessionRecorder(engine, directory, rotate_seconds=SESSION_ROTATE_SECONDS)
+    recorder.start()
+    atexit.register(recorder.stop)
+    metrics.register_gauges("session_recording", recorder.stats)
+    return recorder
+
+def run_rooms(ai_service: AIService, shared: Metrics, profile_wake: bool = False,
+              record_session: Optional[str] = None) -> None:
+    """Multi-room daemon: one session per microphone in ROOMS, sharing ai_service
+
+    Every room has its own capture engine, Porcupine handle (they are not
+    thread-safe), VAD calibration, player, conversation and metrics
+    (labelled room=<name>); everything in AIService that is read-only or
+    thread-safe is shared. Turns always use the streaming pipeline.
+    record_session saves each room's audio in its own subdirectory.
+    """
+    def on_wake(room: Room) -> None:
+        ai_service.http.warm()  # Connect while the user is still speaking
+        EVENTS.publish("wake", room=room.name)
+
+    with ExitStack() as stack:
+        rooms: List[Room] = []
+        for config in (RoomConfig(**room) for room in ROOMS):
+            porcupine, engine = stack.enter_context(audio_wake_stream(ai_service.access_key, config.input_device))
+            audio = AudioProcessor.for_device(config.output_device)
+            stack.callback(audio.stop_player)
+            service = ai_service.for_room(audio)
+            vad = calibrate_vad(engine)
+            barge_in = BargeInMonitor(porcupine, engine, audio.player, suppress_echo=ECHO_SUPPRESSION,
+                                      echo_delay_ms=ECHO_DELAY_MS) if BARGE_IN_ENABLED else None
+            pipeline = TurnPipeline(service, audio, vad, queue_size=PIPELINE_QUEUE_SIZE,
+                                    tts_workers=TTS_WORKERS, early_stt_ms=EARLY_STT_MS, barge_in=barge_in,
+                                    budget=TURN_BUDGET)
+            metrics = Metrics(labels={"room": config.name})
+            if service.memory:
+                metrics.register_gauges("memory", service.memory.stats)
+            if service.intents:
+                metrics.register_gauges("intents", service.intents.stats)
+            if barge_in:
+                metrics.register_gauges("barge_in", lambda b=barge_in: {"detections": b.detections})
+            metrics.register_gauges("capture", engine.stats)
+            if record_session:
+                start_session_recorder(engine, os.path.join(record_session, config.name), metrics)
+            if audio.player:
+                metrics.register_gauges("playback", audio.player.stats)
+            listener = create_wake_listener(porcupine, engine, profile_wake)
+            metrics.register_gauges("wake", listener.profiler.stats)
+            rooms.append(Room(config.name, listener, engine, pipeline, audio, metrics, barge_in,
+                              recording=PCMBuffer(),
+                              greeting=GREETING_SOUND, on_wake=on_wake))
+
+        def prewarm() -> None:
+            ai_service.prewarm_tts()
+            for room in rooms:
+                room.pipeline.ai.fallback_speech()  # Decoded by each room's own player
+
+        threading.Thread(target=prewarm, name="tts-prewarm", daemon=True).start()
+
+        def on_turn(room: Room, turn) -> None:
+            log_turn(room.metrics, turn.spans, turn.spans.durations(), room.pipeline.ai.stt,
+                     turn.transcript, turn.response, turn.cancelled, room=room.name,
+                     budget_misses=turn.budget_misses)
+            export_metrics([shared] + [r.metrics for r in rooms], METRICS_PROM_PATH, METRICS_JSON_PATH)
+
+        daemon = RoomDaemon(rooms, workers=ROOM_TURN_WORKERS, on_turn=on_turn)
+        shared.register_gauges("rooms", daemon.stats)
+        daemon.run()
+
 def main() -> None:
     """Main execution loop"""
+    args = parse_args()
     signal.signal(signal.SIGTERM, lambda s, f: sys.exit(0))
     signal.signal(signal.SIGINT, lambda s, f: sys.exit(0))
     atexit.register(cleanup)
 
     try:
-        ai_service = AIService()
+        ai_service = AIService(rooms=len(ROOMS) if args.rooms else 1)
+        if args.prewarm_tts:
+            ai_service.prewarm_tts()
+            return
+        atexit.register(ai_service.http.close)
+        ai_service.http.start_keepalive()
+        events = EventServer(EVENTS, EVENT_SOCKET_PATH)
+        try:
+            events.start()
+            atexit.register(events.stop)
+        except OSError as e:
+            logger.warning(f"Event stream unavailable: {e}")
+        metrics = Metrics()
+        metrics.register_gauges("tts_cache", ai_service.tts_cache.stats)
+        metrics.register_gauges("events", lambda: {**EVENTS.stats(), **events.stats()})
+        metrics.register_gauges("logging", LOGGING.stats)
+        metrics.register_gauges("http", ai_service.http.stats)
+        if ai_service.hedger:
+            metrics.register_gauges("hedge", ai_service.hedger.stats)
+        if ai_service.answers:
+            metrics.register_gauges("answer_cache", ai_service.answers.stats)
+        if ai_service.transcript_gate:
+            metrics.register_gauges("transcript_gate", ai_service.transcript_gate.stats)
+        if args.rooms:
+            run_rooms(ai_service, metrics, args.profile_wake, args.record_session)
+            return
+        AudioProcessor.start_player()
+        # After the player starts, so the fallback reply is decoded ahead of time
+        threading.Thread(target=ai_service.prewarm_tts, name="tts-prewarm", daemon=True).start()
+        if ai_service.memory:
+            metrics.register_gauges("memory", ai_service.memory.stats)
+        if ai_service.intents:
+            metrics.register_gauges("intents", ai_service.intents.stats)
+        recording = PCMBuffer()
         logger.info(f"Noise reduction: {'ENABLED' if NOISE_REDUCTION_ENABLED else 'DISABLED'}")
         
-        with audio_wake_stream(ai_service.access_key) as (porcupine, pa, stream):
+        # A replay ends the process when the file has been played, like Ctrl+C
+        source = WavFileSource(args.replay, args.replay_speed,
+                               on_end=_thread.interrupt_main) if args.replay else None
+        if args.wake_process:
+            stream = wake_process_stream(ai_service.access_key, log_profile=args.profile_wake)
+        else:
+            stream = audio_wake_stream(ai_service.access_key, source=source)
+        with stream as (porcupine, engine):
+            if args.record_session:
+                start_session_recorder(engine, args.record_session, metrics)
+            vad = calibrate_vad(engine)
+            if args.wake_process:
+                listener = engine  # Wake words come from the worker process
+                metrics.register_gauges("wake_process", engine.stats)
+            else:
+                listener = create_wake_listener(porcupine, engine, args.profile_wake)
+                metrics.register_gauges("wake", listener.profiler.stats)
+                metrics.register_gauges("capture", engine.stats)
+            if AudioProcessor.player:
+                metrics.register_gauges("playback", AudioProcessor.player.stats)
+            barge_in = BargeInMonitor(porcupine, engine, AudioProcessor.player, suppress_echo=ECHO_SUPPRESSION,
+                                      echo_delay_ms=ECHO_DELAY_MS) if porcupine and BARGE_IN_ENABLED else None
+            if barge_in:
+                metrics.register_gauges("barge_in", lambda: {"detections": barge_in.detections})
+            pipeline = TurnPipeline(ai_service, AudioProcessor, vad, queue_size=PIPELINE_QUEUE_SIZE,
+                                    tts_workers=TTS_WORKERS, early_stt_ms=EARLY_STT_MS, barge_in=barge_in,
+                                    budget=TURN_BUDGET)
             while True:
                 try:
-                    # Wake word detection phase
-                    wake_word_detection(porcupine, stream)
-
-                    # Recording and processing phase
-                    start_total = time.time()
-                    audio_file = AudioProcessor.record_audio_to_file()
-                    transcript, stt_time, sound_process = ai_service.transcribe_audio(audio_file)
-                    total_stt = time.time() - start_total
-
-                    if transcript:
-                        # AI response generation
-                        ai_start = time.time()
-                        ai_response = ai_service.generate_response(transcript)
-                        ai_time = time.time() - ai_start
-
-                        # Text-to-speech conversion
-                        tts_start = time.time()
-                        tts_time = ai_service.text_to_speech(ai_response, sound_process)
-                        total_tts = time.time() - tts_start
-
-                        # Performance metrics
-                        logger.info("\nPerformance Metrics:")
-                        logger.info(f"- STT Processing: {stt_time:.2f}s")
-                        logger.info(f"- STT & Playback: {total_stt:.2f}s")
-                        logger.info(f"- AI Response: {ai_time:.2f}s")
-                        logger.info(f"- TTS Generation: {tts_time:.2f}s")
-                        logger.info(f"- TTS & Playback: {total_tts:.2f}s")
+                    # Wake word detection phase, unless the last reply was interrupted by one
+                    wake_position = barge_in.take() if barge_in else None
+                    if wake_position is None:
+                        wake_position = wake_word_detection(listener, engine)
+                    else:
+                        EVENTS.publish("wake", barge_in=True)
+                        AudioProcessor.play_sound(GREETING_SOUND, wait=False)
+                    spans = metrics.start_turn()
+                    ai_service.http.warm()  # Connect while the user is still speaking
+
+                    # Recording and processing phase, from the shared capture buffer
+                    reader = engine.reader(position=wake_position)
+
+                    if STREAM_RESPONSES:
+                        # Overlapping stages: upload during the pause, speak while the reply streams
+                        turn = pipeline.run(reader, recording, spans)
+                        transcript, response, cancelled = turn.transcript, turn.response, turn.cancelled
+                        budget_misses = turn.budget_misses
+                        metrics.record_budget_misses(budget_misses)
+                    else:
+                        ai_service.stt.begin()
+                        recording = AudioProcessor.record_audio(reader, vad, recording, on_frames=ai_service.stt.feed)
+                        spans.mark("capture_end")
+                        transcript, response, cancelled, budget_misses = "", "", False, []
+                        if recording.frames:
+                            spans.mark("upload_start")
+                            transcript, _, sound_process = ai_service.transcribe_audio(recording)
+                            ai_service.mark_upload_end(spans)
+                            spans.mark("stt_done")
+                            if ai_service.screen_transcript(transcript, recording):
+                                transcript = ""
+
+                        if transcript:
+                            if barge_in:
+                                barge_in.start()
+                            try:
+                                # AI response generation
+                                response = ai_service.generate_response(transcript)
+                                spans.mark("first_token")
+
+                                # Text-to-speech conversion (silent local commands have no reply)
+                                if response and not (barge_in and barge_in.interrupted):
+                                    ai_service.text_to_speech(response, sound_process, spans)
+                                else:
+                                    AudioProcessor.stop_looping_sound(sound_process)
+                            finally:
+                                if barge_in:
+                                    barge_in.stop()
+                            cancelled = bool(barge_in and barge_in.interrupted)
+                        elif recording.frames:
+                            AudioProcessor.stop_looping_sound(sound_process)
+
+                    if not transcript:
+                        continue
+
+                    # Performance metrics
+                    durations = metrics.record_turn(spans, cancelled)
+                    log_turn(metrics, spans, durations, ai_service.stt, transcript, response, cancelled,
+                             budget_misses=budget_misses)
+                    export_metrics([metrics], METRICS_PROM_PATH, METRICS_JSON_PATH)
 
                 except KeyboardInterrupt:
                     logger.info("Interrupted by user")
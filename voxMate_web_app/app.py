@@ -7,6 +7,7 @@ from datetime import timedelta
 from controllers.main import main
 from controllers.users import users
 from controllers.appSettings import appSettings
+from controllers.live import live
 
 
 load_dotenv("../.env")
@@ -34,10 +35,14 @@ def create_app():
     app.config["SESSION_PERMANENT"] = True
     app.config["PERMANENT_SESSION_LIFETIME"] = timedelta(hours=48)
     app.config["WTF_CSRF_ENABLED"] = True
+
+    # Local socket the voice daemon streams its events on
+    app.config["EVENTS_SOCKET"] = os.environ.get("VOXMATE_EVENTS_SOCKET", "/tmp/voxmate_events.sock")
     
     # Using the imported routes
     app.register_blueprint(main)
     app.register_blueprint(users)
     app.register_blueprint(appSettings)
+    app.register_blueprint(live)
 
     return app
\ No newline at end of file
@@ -0,0 +1,38 @@
+import json
+from flask import Blueprint, Response, render_template, current_app, request
+
+from models.decorators import isLoggedIn
+from models.events import read_events
+
+live = Blueprint(
+    "live", __name__, template_folder="templates", static_folder="static"
+)
+
+@live.route("/live")
+@isLoggedIn
+def dashboard():
+    return render_template("live/dashboard.html")
+
+@live.route("/live/events")
+@isLoggedIn
+def events():
+    # EventSource sends the last id it saw when it reconnects
+    last_id = request.headers.get("Last-Event-ID", "0")
+    last_id = int(last_id) if last_id.isdigit() else 0
+    path = current_app.config["EVENTS_SOCKET"]
+
+    def stream():
+        yield "retry: 3000\n\n"
+        try:
+            for event in read_events(path, last_id):
+                if event["type"] == "ping":
+                    yield ": ping\n\n"  # Comment line, keeps proxies from closing the stream
+                    continue
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        except OSError:
+            # Daemon not running; the browser retries after the delay above
+            yield 'event: status\ndata: {"online": false}\n\n'
+
+    # Each browser holds its own socket to the daemon, so a slow one only delays itself
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
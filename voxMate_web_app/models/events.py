@@ -0,0 +1,24 @@
+import json
+import socket
+
+
+def read_events(path, last_id=0, timeout=30.0):
+    """Yield events from the voxMate daemon's event socket
+
+    The daemon sends newline-delimited JSON, including {"type": "ping"}
+    heartbeats while idle. Raises OSError when the daemon is not running.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.settimeout(timeout)
+        conn.connect(path)
+        conn.sendall(f"{last_id}\n".encode())
+        buffer = b""
+        while True:
+            data = conn.recv(65536)
+            if not data:
+                return
+            buffer += data
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line:
+                    yield json.loads(line)
@@ -0,0 +1,78 @@
+// Streams daemon events from /live/events into the live dashboard
+(function () {
+    const MAX_EVENTS = 200;
+    const script = document.currentScript;
+    const status = document.getElementById("liveStatus");
+    const list = document.getElementById("liveEvents");
+    const stages = document.getElementById("liveStages");
+
+    function setStatus(text, style) {
+        status.textContent = text;
+        status.className = "badge bg-" + style;
+    }
+
+    function addItem(event, text, style) {
+        const item = document.createElement("li");
+        item.className = "list-group-item" + (style ? " list-group-item-" + style : "");
+        const time = document.createElement("small");
+        time.className = "text-muted me-2";
+        time.textContent = new Date(event.time * 1000).toLocaleTimeString();
+        item.appendChild(time);
+        if (event.room) {
+            const room = document.createElement("span");
+            room.className = "badge bg-secondary me-2";
+            room.textContent = event.room;
+            item.appendChild(room);
+        }
+        item.appendChild(document.createTextNode(text));
+        list.prepend(item);
+        while (list.children.length > MAX_EVENTS) {
+            list.removeChild(list.lastChild);
+        }
+    }
+
+    function showStages(event) {
+        stages.replaceChildren();
+        const rows = Object.entries(event.stages);
+        if (event.wake_to_first_audio !== null) {
+            rows.push(["wake to first audio", event.wake_to_first_audio]);
+        }
+        for (const [stage, seconds] of rows) {
+            const row = stages.insertRow();
+            row.insertCell().textContent = stage;
+            const value = row.insertCell();
+            value.className = "text-end";
+            value.textContent = seconds.toFixed(2) + " s";
+        }
+    }
+
+    const source = new EventSource(script.dataset.eventsUrl);
+    source.onopen = () => setStatus("Live", "success");
+    source.onerror = () => setStatus("Reconnecting...", "warning");
+
+    source.addEventListener("status", (message) => {
+        if (!JSON.parse(message.data).online) {
+            setStatus("voxMate is not running", "danger");
+        }
+    });
+    source.addEventListener("wake", (message) => {
+        const event = JSON.parse(message.data);
+        addItem(event, event.barge_in ? "Wake word (interrupted the reply)" : "Wake word", "");
+    });
+    source.addEventListener("turn", (message) => {
+        const event = JSON.parse(message.data);
+        addItem(event, "You: " + event.transcript, "light");
+        if (event.response) {
+            addItem(event, "voxMate: " + event.response + (event.cancelled ? " (interrupted)" : ""), "primary");
+        }
+        if (event.budget_misses && event.budget_misses.length) {
+            addItem(event, "Over latency budget: " + event.budget_misses.join(", "), "warning");
+        }
+        showStages(event);
+    });
+    source.addEventListener("log", (message) => {
+        const event = JSON.parse(message.data);
+        addItem(event, event.level + " " + event.logger + ": " + event.message,
+                event.level === "WARNING" ? "warning" : "danger");
+    });
+})();
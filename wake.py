@@ -0,0 +1,205 @@
+"""Low-power wake word listening: energy gate, zero-copy frames and a loop profiler"""
+import time
+import logging
+import threading
+import numpy as np
+from ctypes import POINTER, byref, c_int32, c_short
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+EPSILON = 1e-10
+
+def process_frame(porcupine, pcm: np.ndarray) -> int:
+    """porcupine.process() without building a Python sequence of the samples
+
+    The binding converts its argument with (c_short * n)(*pcm), one Python
+    int per sample. The native function only needs a pointer, so a
+    contiguous int16 frame is passed directly when the binding exposes it.
+    """
+    func = getattr(porcupine, "_process_func", None)
+    handle = getattr(porcupine, "_handle", None)
+    if func is None or handle is None:
+        return porcupine.process(pcm)
+    result = c_int32()
+    status = func(handle, pcm.ctypes.data_as(POINTER(c_short)), byref(result))
+    if getattr(status, "value", status) != 0:
+        return porcupine.process(pcm)  # Let the binding raise its own error
+    return result.value
+
+class EnergyGate:
+    """Decides which frames are loud enough to be worth running the wake word on
+
+    Frame energies are computed for a whole batch in one vectorized call.
+    The floor follows quiet frames down at once and creeps up by rise_db
+    per frame, so it tracks the room without following speech. The gate
+    opens on a frame margin_db above the floor and stays open for
+    hangover_frames so a whole wake phrase is processed.
+    """
+
+    def __init__(self, frame_length: int, batch: int = 1, margin_db: float = 6.0,
+                 hangover_frames: int = 47, rise_db: float = 0.05, initial_floor_db: float = -60.0):
+        self.margin_db = margin_db
+        self.hangover_frames = hangover_frames
+        self.rise_db = rise_db
+        self.floor_db = initial_floor_db
+        self._open_for = 0
+        self._work = np.empty((batch, frame_length), dtype=np.float32)
+        self._energy = np.empty(batch, dtype=np.float32)
+        self._gates = np.zeros(batch, dtype=bool)
+
+    @property
+    def is_open(self) -> bool:
+        return self._open_for > 0
+
+    def update(self, frames: np.ndarray) -> np.ndarray:
+        """frames is (batch, frame_length) int16; returns which to process"""
+        np.copyto(self._work, frames)
+        np.einsum("ij,ij->i", self._work, self._work, out=self._energy)
+        energy_db = 10 * np.log10(self._energy / (frames.shape[1] * 32768.0 ** 2) + EPSILON)
+        for i, level in enumerate(energy_db):
+            if level > self.floor_db + self.margin_db:
+                self._open_for = self.hangover_frames
+            elif self._open_for:
+                self._open_for -= 1
+            self._gates[i] = self._open_for > 0
+            # Quiet frames pull the floor down straight away; loud ones only nudge it up
+            self.floor_db = level if level < self.floor_db else self.floor_db + self.rise_db
+        return self._gates
+
+class WakeProfiler:
+    """CPU use, frame rate and gate skip ratio of the wake loop
+
+    frame() is called from the loop thread for every frame; at the end of
+    each window the loop thread's CPU time and the whole process's CPU time
+    are compared with wall time. stats() returns the last full window.
+    """
+
+    def __init__(self, window: float = 60.0, log: bool = False):
+        self.window = window
+        self.log = log
+        self.frames = 0
+        self.processed = 0
+        self._last: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._start = time.monotonic()
+        self._process_start = time.process_time()
+        self._thread_start = time.thread_time()
+        self._frames = 0
+        self._processed = 0
+
+    def frame(self, processed: bool) -> None:
+        self._frames += 1
+        self._processed += processed
+        if self._frames % 32 == 0 and time.monotonic() - self._start >= self.window:
+            self._roll()
+
+    def _roll(self) -> None:
+        elapsed = time.monotonic() - self._start
+        stats = {
+            "frames_per_second": round(self._frames / elapsed, 1),
+            "skip_ratio": round(1 - self._processed / self._frames, 3) if self._frames else 0.0,
+            "loop_cpu_percent": round(100 * (time.thread_time() - self._thread_start) / elapsed, 2),
+            "cpu_percent": round(100 * (time.process_time() - self._process_start) / elapsed, 2),
+        }
+        with self._lock:
+            self.frames += self._frames
+            self.processed += self._processed
+            self._last = stats
+        if self.log:
+            logger.info(self.report())
+        self._reset()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {**self._last, "frames_total": self.frames, "processed_total": self.processed}
+
+    def report(self) -> str:
+        stats = self.stats()
+        if "frames_per_second" not in stats:
+            return "wake loop: no data yet"
+        return (f"wake loop: {stats['frames_per_second']} frames/s, "
+                f"{stats['skip_ratio'] * 100:.1f}% skipped by the gate, "
+                f"loop CPU {stats['loop_cpu_percent']}%, process CPU {stats['cpu_percent']}%")
+
+class WakeListener:
+    """Wake word loop over a capture ring reader, with an optional energy gate
+
+    Frames are read batch at a time into one preallocated block, so the loop
+    thread wakes less often and nothing is allocated per frame. Gated-out
+    frames skip Porcupine; when the gate opens, up to lookback_frames of the
+    skipped audio just before it is replayed from the ring first, so a soft
+    onset ("hey") is still heard.
+    """
+
+    def __init__(self, porcupine, channels: int, gate: Optional[EnergyGate] = None,
+                 batch: int = 1, lookback_frames: int = 0,
+                 profiler: Optional[WakeProfiler] = None):
+        self.porcupine = porcupine
+        self.frame_length = porcupine.frame_length
+        self.gate = gate
+        self.batch = batch
+        self.lookback_frames = lookback_frames
+        self.profiler = profiler
+        self._block = np.empty((self.frame_length * batch, channels), dtype=np.int16)
+        self._lookback = np.empty((self.frame_length * max(lookback_frames, 1), channels), dtype=np.int16)
+        self._mono = np.empty(self.frame_length, dtype=np.int16)
+        self._seen = 0  # Capture position up to which Porcupine has been fed
+        self._all = np.ones(batch, dtype=bool)
+
+    def _detect(self, frame: np.ndarray) -> bool:
+        np.copyto(self._mono, frame)
+        return process_frame(self.porcupine, self._mono) >= 0
+
+    def _replay(self, reader, position: int) -> bool:
+        """Feed Porcupine the skipped audio just before position"""
+        n = self.frame_length
+        oldest = reader.ring.written - reader.ring.capacity
+        start = max(position - self.lookback_frames * n, self._seen, oldest)
+        count = (position - start) // n
+        if count <= 0:
+            return False
+        start = position - count * n
+        reader.ring.read_into(start, self._lookback[:count * n])
+        for i in range(count):
+            if self._detect(self._lookback[i * n:(i + 1) * n, 0]):
+                return True
+        return False
+
+    def listen(self, reader, stop: Optional[threading.Event] = None,
+               timeout: float = 1.0) -> Optional[int]:
+        """Block until the wake word and return the capture position just after it
+
+        Without stop a stalled capture stream raises; with stop, returns
+        None once it is set.
+        """
+        n = self.frame_length
+        while stop is None or not stop.is_set():
+            block = reader.read(n * self.batch, timeout=timeout, out=self._block)
+            if block is None:
+                if stop is None:
+                    raise RuntimeError("Capture stream stalled")
+                continue
+            start = reader.position - n * self.batch
+            frames = block[:, 0].reshape(self.batch, n)
+            was_open = self.gate.is_open if self.gate else True
+            gates = self.gate.update(frames) if self.gate else self._all
+            for i in range(self.batch):
+                position = start + i * n
+                run = bool(gates[i])
+                if self.profiler:
+                    self.profiler.frame(run)
+                if not run:
+                    was_open = False
+                    continue
+                if not was_open and self.lookback_frames and self._replay(reader, position):
+                    self._seen = position
+                    return position
+                was_open = True
+                self._seen = position + n
+                if self._detect(frames[i]):
+                    return position + n
+        return None
@@ -0,0 +1,243 @@
+"""Capture and wake word detection in a separate process, sharing the capture ring"""
+import os
+import time
+import queue
+import logging
+import threading
+import multiprocessing as mp
+import pvporcupine
+from dataclasses import dataclass
+from typing import Dict, Optional
+from audio_capture import CaptureEngine, RingReader, SharedRingBuffer
+from wake import EnergyGate, WakeListener, WakeProfiler
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class WakeWorkerConfig:
+    """Everything the worker needs to open the microphone and build its wake listener"""
+    access_key: str
+    keyword_path: str
+    sample_rate: int
+    channels: int
+    frame_length: int
+    ring_seconds: float
+    dtype: str = 'int16'
+    device: Optional[object] = None
+    low_power: bool = True
+    gate_margin_db: float = 6.0
+    gate_hangover_frames: int = 47
+    lookback_frames: int = 9
+    batch_frames: int = 4
+    profile_seconds: float = 60.0
+    log_profile: bool = False
+    stats_seconds: float = 5.0
+
+def run_wake_worker(config: WakeWorkerConfig, ring_name: str, conn, stop) -> None:
+    """Worker process: capture into the shared ring and report wake words over conn
+
+    Sends ("ready", device_name) once listening, ("wake", position, sent_at)
+    for every detection, ("stats", dict) every stats_seconds and
+    ("error", message) if it cannot start. Exits when stop is set or the
+    parent process goes away.
+    """
+    # A no-op when spawn re-imported voxMate.py, which sets up its own logging
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    send_lock = threading.Lock()
+    porcupine = engine = ring = None
+
+    def send(*message) -> None:
+        with send_lock:
+            conn.send(message)
+
+    try:
+        porcupine = pvporcupine.create(access_key=config.access_key, keyword_paths=[config.keyword_path])
+        if (porcupine.sample_rate, porcupine.frame_length) != (config.sample_rate, config.frame_length):
+            raise ValueError(f"Porcupine needs {porcupine.sample_rate} Hz / {porcupine.frame_length} "
+                             f"frames, capture is {config.sample_rate} Hz / {config.frame_length}")
+        ring = SharedRingBuffer(int(config.ring_seconds * config.sample_rate), config.channels,
+                                config.dtype, name=ring_name)
+        engine = CaptureEngine(config.sample_rate, config.channels, config.frame_length,
+                               config.ring_seconds, config.dtype, device=config.device, ring=ring)
+        batch = config.batch_frames if config.low_power else 1
+        gate = EnergyGate(config.frame_length, batch, margin_db=config.gate_margin_db,
+                          hangover_frames=config.gate_hangover_frames) if config.low_power else None
+        profiler = WakeProfiler(config.profile_seconds, log=config.log_profile)
+        listener = WakeListener(porcupine, config.channels, gate, batch,
+                                lookback_frames=config.lookback_frames if config.low_power else 0,
+                                profiler=profiler)
+        engine.start()
+        reader = engine.reader()
+        send("ready", engine.device_name)
+    except Exception as e:
+        conn.send(("error", str(e)))
+        _close_worker(engine, porcupine, ring)
+        return
+
+    parent = os.getppid()
+
+    def report() -> None:
+        wall, cpu = time.monotonic(), time.process_time()
+        while not stop.wait(config.stats_seconds):
+            if os.getppid() != parent:
+                stop.set()  # Orphaned: the orchestrator was killed
+                break
+            now, now_cpu = time.monotonic(), time.process_time()
+            send("stats", {**profiler.stats(), **engine.stats(),
+                           "worker_cpu_percent": round(100 * (now_cpu - cpu) / (now - wall), 2),
+                           "capture_lag_ms": round(reader.available * 1000 / config.sample_rate, 1)})
+            wall, cpu = now, now_cpu
+
+    threading.Thread(target=report, name="wake-stats", daemon=True).start()
+    try:
+        while not stop.is_set():
+            position = listener.listen(reader, stop=stop)
+            if position is not None:
+                send("wake", position, time.monotonic())
+    except (EOFError, OSError, BrokenPipeError):
+        pass  # Orchestrator closed the pipe
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Wake worker failed: {e}")
+    finally:
+        _close_worker(engine, porcupine, ring)
+
+def _close_worker(engine, porcupine, ring) -> None:
+    if engine:
+        engine.stop()
+    if porcupine:
+        porcupine.delete()
+    if ring:
+        ring.close()
+
+class WakeProcess:
+    """Orchestrator side of the wake worker
+
+    The worker process owns the microphone and Porcupine and writes every
+    frame into a SharedRingBuffer; this side reads recordings from the same
+    block without copying through a pipe, so it stands in for both the
+    CaptureEngine (reader, device_name, stats) and the WakeListener
+    (listen). Wake words arrive over a pipe and are drained by a thread;
+    ones from before the reader's position (said during a turn) are dropped.
+
+    stats() reports the worker's and this process's CPU use, the worker's
+    capture lag behind the ring head and the detection-to-dispatch lag.
+    """
+
+    def __init__(self, config: WakeWorkerConfig, start_timeout: float = 15.0):
+        self.config = config
+        self.sample_rate = config.sample_rate
+        self.channels = config.channels
+        self.frame_length = config.frame_length
+        self.dtype = config.dtype
+        self.start_timeout = start_timeout
+        self.ring: Optional[SharedRingBuffer] = None
+        self.device_name = 'default'
+        self.wakes = 0
+        self.stale_wakes = 0
+        self._wakes: "queue.Queue" = queue.Queue()
+        self._worker_stats: Dict[str, float] = {}
+        self._dispatch_lag_ms = 0.0
+        self._cpu_percent = 0.0
+        self._process = None
+        self._conn = None
+        self._stop = None
+        self._receiver: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        # spawn: forking a process with running threads (logging, HTTP keep-alive) is unsafe
+        context = mp.get_context("spawn")
+        self.ring = SharedRingBuffer(int(self.config.ring_seconds * self.sample_rate),
+                                     self.channels, self.dtype)
+        self._conn, child = context.Pipe(duplex=False)
+        self._stop = context.Event()
+        self._process = context.Process(target=run_wake_worker, name="wake-worker", daemon=True,
+                                        args=(self.config, self.ring.name, child, self._stop))
+        self._process.start()
+        child.close()
+        try:
+            if not self._conn.poll(self.start_timeout):
+                raise RuntimeError("Wake worker did not start")
+            kind, detail = self._conn.recv()
+            if kind != "ready":
+                raise RuntimeError(f"Wake worker failed to start: {detail}")
+        except (EOFError, RuntimeError):
+            self.stop()
+            raise
+        self.device_name = detail
+        self._receiver = threading.Thread(target=self._receive, name="wake-receiver", daemon=True)
+        self._receiver.start()
+        logger.info(f"Wake worker started (pid {self._process.pid}) on {self.device_name}")
+
+    def _receive(self) -> None:
+        wall, cpu = time.monotonic(), time.process_time()
+        while True:
+            try:
+                kind, *payload = self._conn.recv()
+            except (EOFError, OSError):
+                break
+            if kind == "wake":
+                self._wakes.put(payload)
+            elif kind == "stats":
+                now, now_cpu = time.monotonic(), time.process_time()
+                self._cpu_percent = round(100 * (now_cpu - cpu) / (now - wall), 2)
+                wall, cpu = now, now_cpu
+                self._worker_stats = payload[0]
+        self._wakes.put(None)  # Wake a listener so it sees the worker is gone
+
+    def listen(self, reader: RingReader, stop: Optional[threading.Event] = None,
+               timeout: float = 1.0) -> Optional[int]:
+        """Block until the worker hears the wake word and return the position just after it
+
+        Without stop a dead worker raises; with stop, returns None once it is set.
+        """
+        while stop is None or not stop.is_set():
+            try:
+                message = self._wakes.get(timeout=timeout)
+            except queue.Empty:
+                if not self._process.is_alive():
+                    raise RuntimeError("Wake worker exited")
+                continue
+            if message is None:
+                raise RuntimeError("Wake worker exited")
+            position, sent_at = message
+            if position < reader.position:
+                self.stale_wakes += 1
+                continue
+            self.wakes += 1
+            self._dispatch_lag_ms = round((time.monotonic() - sent_at) * 1000, 2)
+            reader.position = position
+            return position
+        return None
+
+    def reader(self, preroll: float = 0.0, position: Optional[int] = None) -> RingReader:
+        """Reader starting preroll seconds before position (default: now)"""
+        start = self.ring.written if position is None else position
+        return self.ring.reader(start - int(preroll * self.sample_rate))
+
+    def stats(self) -> Dict[str, float]:
+        return {**self._worker_stats, "orchestrator_cpu_percent": self._cpu_percent,
+                "dispatch_lag_ms": self._dispatch_lag_ms, "queued_wakes": self._wakes.qsize(),
+                "wakes": self.wakes, "stale_wakes": self.stale_wakes,
+                "orchestrator_overruns": self.ring.overruns if self.ring else 0}
+
+    def stop(self) -> None:
+        if self._stop is not None:
+            self._stop.set()
+        if self._process is not None:
+            self._process.join(timeout=2.0)
+            if self._process.is_alive():
+                self._process.terminate()
+            self._process = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+    def __enter__(self) -> "WakeProcess":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()